@@ -0,0 +1,192 @@
+#### Import Python Libraries #################################################################################################################
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+from clientSearch import buildClientSearch
+
+##############################################################################################################################################
+#### Aggregate Cube Functions ################################################################################################################
+##############################################################################################################################################
+
+'''
+Every view in the app (graphs 1 to 12 and their tables) is a sum, count or mean of the usd volume over some of the same 6 dimensions -
+year_month, day, hour, market_pair, status and user_id. Rather than grouping the row level updated_df once per view, the functions below
+group it once into an aggregate cube - one row per distinct combination of the 6 dimensions holding:
+
+    ~trades - number of rows (trades, plus the churned placeholder rows)
+    ~priced - number of rows with a usd volume (what a mean of usd_volume divides by)
+    ~usd_volume - sum of the usd volume
+
+Every view is then a roll-up of the cube (a groupby sum over fewer dimensions) and a mean is worked out as usd_volume / priced, so the
+views give the same numbers as grouping the rows directly. The cube grows with the number of distinct users x months x days x hours x
+pairs traded rather than the number of ledger rows, and the small per-month hourly/daily roll-ups are what the sidebar selections slice.
+
+The churned placeholder rows have no day, hour or market_pair - they are kept in the cube (dropna=False) and drop out of any roll-up over
+one of those dimensions, just like they do when the rows are grouped directly.
+
+
+Inventory of Functions:
+
+~buildCube - Groups updated_df into the aggregate cube
+
+~rollUp - Sums the cube measures over a subset of the dimensions (optionally filtered first)
+
+~shareWithin - Each row's share of a measure within its group (the usd_percentage | usd_vol_pct columns)
+
+~monthlyPairs | statusSums | clientSums | clientPairsCount | clientAverages | monthlyDistribution - The views used by the graphs
+
+~clientTotals - Total USD volume per client (ranks the clients in the client search - clientSearch.py)
+
+~clientIndex | clientRows - Per-client index over a client level table | the rows of one client, looked up in the index
+
+~cubeViews - All the dataframes used by the graphs, rolled up from the cube (used by dataPipeline.buildAggregates)
+
+'''
+
+CUBE_DIMENSIONS = ['year_month', 'day', 'hour', 'market_pair', 'status', 'user_id']
+CUBE_MEASURES = ['trades', 'priced', 'usd_volume']
+
+ClientIndex = namedtuple('ClientIndex', ['frame', 'slices'])
+
+##############################################################################################################################################
+#### buildCube | rollUp | shareWithin ########################################################################################################
+##############################################################################################################################################
+
+def buildCube(updated_df):
+
+    cube = updated_df.groupby(CUBE_DIMENSIONS, observed=True, dropna=False).agg(
+        trades=('usd_volume', 'size'),
+        priced=('usd_volume', 'count'),
+        usd_volume=('usd_volume', 'sum'),
+    )
+
+    return cube.reset_index()
+
+
+def rollUp(cube, dimensions, **filters):
+
+    for dimension, value in filters.items():
+        cube = cube[cube[dimension] == value]
+
+    return cube.groupby(dimensions, observed=True)[CUBE_MEASURES].sum().reset_index()
+
+
+def shareWithin(df, measure, by):
+    return df[measure] / df.groupby(by, observed=True)[measure].transform('sum')
+
+##############################################################################################################################################
+#### clientIndex | clientRows ################################################################################################################
+##############################################################################################################################################
+
+'''
+Selecting a client in the sidebar used to filter client_sums and clients_combined_avg with a boolean mask - a scan over the rows of every
+client on each rerun. clientIndex sorts a client level table by user_id once (stable, so each client's rows keep their order) and keeps
+the start/stop row of every client's block in a dictionary, so clientRows is a dictionary lookup and a positional slice of the sorted
+table - the same rows (and index labels) as the boolean filter, however many clients there are. A client that is not in the table gets
+an empty dataframe with the same columns.
+'''
+
+def clientIndex(df, key='user_id'):
+
+    frame = df.sort_values(key, kind='stable')
+    codes, users = pd.factorize(frame[key])
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    stops = np.r_[starts[1:], len(frame)]
+
+    return ClientIndex(frame, dict(zip(users, zip(starts.tolist(), stops.tolist()))))
+
+
+def clientRows(index, user_id):
+    start, stop = index.slices.get(user_id, (0, 0))
+    return index.frame.iloc[start:stop]
+
+##############################################################################################################################################
+#### cubeViews ###############################################################################################################################
+##############################################################################################################################################
+
+'''
+cubeViews - Rolls the cube up into the dataframes used by the graphs (same columns as they had when grouped from updated_df), one
+            function per view so each can be worked out (or benchmarked) on its own:
+
+            ~monthlyPairs - usd volume per market_pair per month (monthly_pairs_df)
+            ~statusSums | clientSums - usd volume per status | client per market_pair, with the share of the status | client total
+            ~clientPairsCount - number of clients that traded 1 market_pair, 2 market_pairs, etc... (from client_sums)
+            ~clientAverages - each client's mean usd volume per month vs. the month's status average and overall monthly average
+            ~monthlyDistribution - number of trades and usd volume per hour | day for every month, with the share of the month's
+                                   usd volume (monthly_hourly_sums | monthly_daily_sums, sliced per month in main.py)
+
+            along with a clientIndex over client_sums and clients_combined_avg for the client drilldown (graphs 9 and 11) and the
+            client search over every user id, ranked by clientTotals (the customer id search in main.py).
+'''
+
+def monthlyPairs(cube):
+    return rollUp(cube, ['market_pair', 'year_month'])[['market_pair', 'year_month', 'usd_volume']]
+
+
+def statusSums(cube):
+    status_sums = rollUp(cube, ['status', 'market_pair'])[['status', 'market_pair', 'usd_volume']]
+    status_sums['usd_vol_pct'] = shareWithin(status_sums, 'usd_volume', 'status')
+    return status_sums
+
+
+def clientSums(cube):
+    client_sums = rollUp(cube, ['user_id', 'market_pair'])[['user_id', 'market_pair', 'usd_volume']]
+    client_sums['usd_vol_pct'] = shareWithin(client_sums, 'usd_volume', 'user_id')
+    return client_sums
+
+
+def clientPairsCount(client_sums):
+    client_pairs = client_sums.groupby(['user_id'], observed=True).agg(pairs=('market_pair', 'count')).reset_index()
+    client_pairs_count = client_pairs.groupby(['pairs'], observed=True).count().reset_index()
+    return client_pairs_count.rename(columns={'user_id': 'customers'})
+
+
+def clientAverages(cube):
+
+    #### each client's mean per month (with the status average), and the overall mean per month - both from the sums and counts
+    clients_combined_avg = rollUp(cube, ['user_id', 'year_month', 'status'])
+    clients_combined_avg['avg_client_volume'] = clients_combined_avg['usd_volume'] / clients_combined_avg['priced']
+    clients_combined_avg['avg_monthlyStatus_volume'] = clients_combined_avg.groupby(['year_month', 'status'], observed=True)['avg_client_volume'].transform('mean')
+
+    monthly_totals = rollUp(cube, ['year_month'])
+    monthly_average = pd.Series((monthly_totals['usd_volume'] / monthly_totals['priced']).values, index=monthly_totals['year_month'])
+    clients_combined_avg['avg_monthly_volume'] = clients_combined_avg['year_month'].map(monthly_average)
+
+    return clients_combined_avg[['user_id', 'year_month', 'status', 'avg_client_volume', 'avg_monthlyStatus_volume', 'avg_monthly_volume']]
+
+
+def clientTotals(cube):
+    return rollUp(cube, ['user_id'])[['user_id', 'usd_volume']]
+
+
+def monthlyDistribution(cube, timeframe):
+    sums = rollUp(cube, ['year_month', timeframe])[['year_month', timeframe, 'trades', 'usd_volume']]
+    sums['usd_percentage'] = shareWithin(sums, 'usd_volume', 'year_month')
+    return sums
+
+
+def cubeViews(cube):
+
+    client_sums = clientSums(cube)
+    clients_combined_avg = clientAverages(cube)
+
+    views = {
+        'monthly_pairs_df': monthlyPairs(cube),
+        'status_sums': statusSums(cube),
+        'client_sums': client_sums,
+        'client_pairs_count': clientPairsCount(client_sums),
+        'clients_combined_avg': clients_combined_avg,
+        'monthly_hourly_sums': monthlyDistribution(cube, 'hour'),
+        'monthly_daily_sums': monthlyDistribution(cube, 'day'),
+        'client_sums_index': clientIndex(client_sums),
+        'clients_combined_avg_index': clientIndex(clients_combined_avg),
+        'client_search': buildClientSearch(clientTotals(cube)),
+    }
+
+    return views
+
+##############################################################################################################################################
+##############################################################################################################################################
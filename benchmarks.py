@@ -0,0 +1,344 @@
+#### Import Python Libraries #################################################################################################################
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from syntheticData import generateDataset, parseRows
+from columnarCache import ensureSnapshot, CATEGORICAL_COLUMNS
+from cohortEngine import churnedCustomers
+from aggregateCube import buildCube, monthlyPairs, statusSums, clientSums, clientPairsCount, clientAverages, monthlyDistribution, clientIndex, clientTotals
+from clientSearch import buildClientSearch
+from rateGrid import buildRateGrid
+from dataPipeline import (loadCsvFiles, loadCleanFiles, cleanLedger, cleanTrades, cleanRates, mergeLedgerAccounts, mergeLedgerTrades,
+                          hourlyAverageRates, mapUsdVolume, sortedRates, priceLedgerTrades, assignCustomerStatus, tradeVolumes,
+                          addChurnedCustomers, encodeIds, decodeUsers, PRICING_METHODS)
+
+##############################################################################################################################################
+#### Pipeline Benchmarks #####################################################################################################################
+##############################################################################################################################################
+
+'''
+Times and memory-profiles each stage of the pipeline separately on synthetic data (syntheticData.py) of one or more sizes, and saves
+the results as JSON so that two versions of the code can be compared:
+
+    python benchmarks.py --sizes 10k 1m --out bench_results.json
+    python benchmarks.py --sizes 10k 1m --out bench_new.json --compare bench_results.json
+
+The pricing stage is run once for each --pricing method (by default the hourly average the dashboard uses and the as-of 'nearest' join,
+so the cost of switching is in every results file) - the stages after it use the first method's priced legs.
+
+The data for each size is generated once into --data-dir (default bench_data/<size>) and re-used by later runs. Each repeat runs the whole
+pipeline once, stage by stage, so every stage gets fresh inputs from the stage before it - the reported time of a stage is the fastest of
+the repeats. One more run with tracemalloc switched on records the peak memory allocated by each stage (tracemalloc slows things down,
+so it is kept out of the timed runs). Rows in/out are the rows of the stage's main input and output dataframe.
+
+With --compare, each stage is compared with the same stage and size in an earlier results file and the run fails (exit code 1) if any
+stage got slower than --threshold times its earlier time (stages under 50ms are ignored, they are mostly noise).
+
+
+Inventory of Functions:
+
+~pipelineStages - The stages benchmarked, in pipeline order, each reading its inputs from (and writing its outputs to) a shared state
+
+~runStages - One run of all the stages, returning the time, peak memory and rows in/out per stage
+
+~benchmarkSize - Generates (if needed) the data for a size and benchmarks it
+
+~compareResults - Stage by stage comparison with an earlier results file
+
+~main - Command line entry point
+
+'''
+
+MIN_COMPARE_SECONDS = 0.05
+
+##############################################################################################################################################
+#### pipelineStages ##########################################################################################################################
+##############################################################################################################################################
+
+'''
+pipelineStages - (stage name, function) pairs. Each function takes the state dictionary, stores its outputs in it and returns the rows of
+                 its main (input, output) dataframe. The stages follow main.py's original order - load the csv files, clean them and swap
+                 the ids for integer codes, merge the ledger with the accounts and the trades, price the legs (build the hourly rate grid,
+                 look up the hourly average rates in it, then one '<method>_pricing' stage for each of the pricing methods - the first
+                 one's priced legs are used from then on), classify the customer status, collapse the legs into trades
+                 (what was transactions_vol), add the churned customers and decode the user ids, then build the aggregate cube, each of the
+                 dashboard aggregates from it and the per-client indexes.
+'''
+
+def pipelineStages(paths, pricing=('hourly', 'nearest')):
+
+    methods = [pricing] if isinstance(pricing, str) else list(pricing)
+
+    def loadCsv(state):
+        state['accounts'], state['ledger'], state['trades'], state['rates'] = loadCsvFiles(paths['accounts'], paths['ledger'], paths['trades'], paths['rates'])
+        return None, len(state['ledger'])
+
+    def loadSnapshots(state):
+        snapshots = loadCleanFiles(paths['accounts'], paths['ledger'], paths['trades'], paths['rates'])
+        return None, len(snapshots[1])
+
+    def clean(state):
+        rows = len(state['ledger'])
+        state['ledger'], state['trades'], state['rates'] = cleanLedger(state['ledger']), cleanTrades(state['trades']), cleanRates(state['rates'])
+        return rows, len(state['ledger'])
+
+    def encode(state):
+        state['accounts'], state['ledger'], state['trades'], state['dictionaries'] = encodeIds(state['accounts'], state['ledger'], state['trades'])
+        return len(state['ledger']), len(state['ledger'])
+
+    def mergeAccounts(state):
+        state['ledgerAccounts'] = mergeLedgerAccounts(state['ledger'], state['accounts'])
+        return len(state['ledger']), len(state['ledgerAccounts'])
+
+    def mergeTrades(state):
+        state['ledgerTrades'] = mergeLedgerTrades(state['ledgerAccounts'], state['trades'])
+        return len(state['ledgerAccounts']), len(state['ledgerTrades'])
+
+    def rateGrid(state):
+        state['rate_grid'] = buildRateGrid(hourlyAverageRates(state['rates']))
+        return len(state['rates']), state['rate_grid'].prices.size
+
+    def hourlyRateLookup(state):
+        hourly = mapUsdVolume(state['ledgerTrades'], state['rate_grid'])
+        return len(state['ledgerTrades']), len(hourly)
+
+    def pricingStage(method):
+        def priceLegs(state):
+            combined_df, _ = priceLedgerTrades(state['ledgerTrades'], sortedRates(state['rates'], method), method)
+            if method == methods[0]:
+                state['combined_df'] = combined_df
+            return len(state['ledgerTrades']), len(combined_df)
+        return priceLegs
+
+    def statusClassification(state):
+        rows = len(state['combined_df'])
+        state['combined_df'], state['cohorts'] = assignCustomerStatus(state['combined_df'])
+        return rows, len(state['combined_df'])
+
+    def transactionsVol(state):
+        state['users_combined'] = tradeVolumes(state['combined_df'])
+        return len(state['combined_df']), len(state['users_combined'])
+
+    def churned(state):
+        state['updated_df'] = addChurnedCustomers(state['users_combined'], churnedCustomers(state['cohorts']))
+        return len(state['users_combined']), len(state['updated_df'])
+
+    def decode(state):
+        state['users_combined'], state['updated_df'], state['cohorts'] = decodeUsers(state['users_combined'], state['updated_df'], state['cohorts'], state['dictionaries'])
+        return len(state['updated_df']), len(state['updated_df'])
+
+    def cube(state):
+        state['cube'] = buildCube(state['updated_df'])
+        return len(state['updated_df']), len(state['cube'])
+
+    def view(name, viewFunc, source='cube'):
+        def stage(state):
+            state[name] = viewFunc(state[source])
+            return len(state[source]), len(state[name])
+        return stage
+
+    def index(name, source):
+        def stage(state):
+            state[name] = clientIndex(state[source])
+            return len(state[source]), len(state[name].slices)
+        return stage
+
+    def search(state):
+        state['client_search'] = buildClientSearch(clientTotals(state['cube']))
+        return len(state['cube']), len(state['client_search'].clients)
+
+    stages = [
+        ('load_csv', loadCsv),
+        ('load_snapshots', loadSnapshots),
+        ('clean', clean),
+        ('encode_ids', encode),
+        ('merge_accounts', mergeAccounts),
+        ('merge_trades', mergeTrades),
+        ('rate_grid', rateGrid),
+        ('hourly_rate_lookup', hourlyRateLookup),
+        *[(f'{method}_pricing', pricingStage(method)) for method in methods],
+        ('status_classification', statusClassification),
+        ('transactions_vol', transactionsVol),
+        ('add_churned', churned),
+        ('decode_ids', decode),
+        ('aggregate_cube', cube),
+        ('monthly_pairs_df', view('monthly_pairs_df', monthlyPairs)),
+        ('status_sums', view('status_sums', statusSums)),
+        ('client_sums', view('client_sums', clientSums)),
+        ('client_pairs_count', view('client_pairs_count', clientPairsCount, source='client_sums')),
+        ('clients_combined_avg', view('clients_combined_avg', clientAverages)),
+        ('monthly_hourly_sums', view('monthly_hourly_sums', lambda cube: monthlyDistribution(cube, 'hour'))),
+        ('monthly_daily_sums', view('monthly_daily_sums', lambda cube: monthlyDistribution(cube, 'day'))),
+        ('client_sums_index', index('client_sums_index', 'client_sums')),
+        ('clients_combined_avg_index', index('clients_combined_avg_index', 'clients_combined_avg')),
+        ('client_search', search),
+    ]
+
+    return stages
+
+##############################################################################################################################################
+#### runStages | benchmarkSize ###############################################################################################################
+##############################################################################################################################################
+
+'''
+runStages - Runs every stage once in order. With memory=True each stage's peak allocation (tracemalloc, in MB above what was allocated
+            when the stage started) is recorded instead of its time.
+
+benchmarkSize - Generates the data for rows ledger rows in data_dir (unless it is already there), writes the columnar snapshots, runs
+                one warm-up run, repeat timed runs and one memory run, and returns the results for the size.
+'''
+
+def runStages(stages, memory=False):
+
+    results = {}
+    state = {}
+
+    for name, stageFunc in stages:
+        if memory:
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+
+        rows_in, rows_out = stageFunc(state)
+
+        seconds = time.perf_counter() - started
+        if memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = {'peak_mb': round((peak - baseline) / 2 ** 20, 3)}
+        else:
+            results[name] = {'seconds': seconds, 'rows_in': rows_in, 'rows_out': rows_out}
+
+    return results
+
+
+def benchmarkSize(rows, data_dir, repeat=3, pricing=('hourly', 'nearest'), log=print):
+
+    paths = {
+        'accounts': os.path.join(data_dir, 'accounts.csv'),
+        'ledger': os.path.join(data_dir, 'ledger_entries.csv'),
+        'trades': os.path.join(data_dir, 'trades.csv'),
+        'rates': os.path.join(data_dir, 'rates.csv'),
+    }
+    if not all(os.path.exists(path) for path in paths.values()):
+        log(f"generating {rows:,} ledger rows in {data_dir}")
+        generateDataset(data_dir, rows)
+
+    ensureSnapshot(paths['accounts'], categoricals=CATEGORICAL_COLUMNS['accounts'])
+    ensureSnapshot(paths['ledger'], cleanLedger, CATEGORICAL_COLUMNS['ledger'])
+    ensureSnapshot(paths['trades'], cleanTrades, CATEGORICAL_COLUMNS['trades'])
+    ensureSnapshot(paths['rates'], cleanRates, CATEGORICAL_COLUMNS['rates'])
+
+    pricing = [pricing] if isinstance(pricing, str) else list(pricing)
+    stages = pipelineStages(paths, pricing)
+    runStages(stages)
+    runs = [runStages(stages) for _ in range(repeat)]
+    peaks = runStages(stages, memory=True)
+
+    results = {}
+    for name, _ in stages:
+        seconds = [run[name]['seconds'] for run in runs]
+        results[name] = {
+            'seconds': min(seconds),
+            'runs': seconds,
+            'peak_mb': peaks[name]['peak_mb'],
+            'rows_in': runs[0][name]['rows_in'],
+            'rows_out': runs[0][name]['rows_out'],
+        }
+        log(f"  {name:<26} {min(seconds):>10.4f}s {peaks[name]['peak_mb']:>10.1f}MB {runs[0][name]['rows_out'] or 0:>12,} rows")
+
+    return {'ledger_rows': rows, 'data_dir': os.path.abspath(data_dir), 'repeat': repeat, 'pricing': pricing, 'stages': results}
+
+##############################################################################################################################################
+#### compareResults ##########################################################################################################################
+##############################################################################################################################################
+
+def compareResults(results, baseline, threshold=1.25, log=print):
+
+    regressions = []
+
+    for size, sizeResults in results['sizes'].items():
+        baseStages = baseline.get('sizes', {}).get(size, {}).get('stages', {})
+        for name, stage in sizeResults['stages'].items():
+            if name not in baseStages:
+                continue
+            before, after = baseStages[name]['seconds'], stage['seconds']
+            ratio = after / before if before > 0 else np.inf
+            flagged = ratio > threshold and max(before, after) >= MIN_COMPARE_SECONDS
+            if flagged:
+                regressions.append((size, name, before, after))
+            log(f"  {size:<5} {name:<26} {before:>10.4f}s -> {after:>10.4f}s  x{ratio:>6.2f}{'  REGRESSION' if flagged else ''}")
+
+    return regressions
+
+##############################################################################################################################################
+#### main ####################################################################################################################################
+##############################################################################################################################################
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Times and memory-profiles each pipeline stage on synthetic data')
+    parser.add_argument('--sizes', nargs='+', default=['10k'], help='ledger rows per run - 10k | 1m | 10m or a number')
+    parser.add_argument('--data-dir', default='bench_data', help='folder the synthetic data is generated into (one sub-folder per size)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per size (the fastest is reported)')
+    parser.add_argument('--pricing', nargs='+', default=['hourly', 'nearest'], choices=PRICING_METHODS, help='pricing methods timed (one stage each) - the first one prices the legs for the later stages')
+    parser.add_argument('--out', default='bench_results.json', help='JSON file the results are written to')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slow-down (new / old time) that counts as a regression')
+
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'created': pd.Timestamp.now(tz='UTC').isoformat(),
+            'git_commit': gitCommit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'sizes': {},
+    }
+
+    for size in args.sizes:
+        print(f"{size}:")
+        results['sizes'][size] = benchmarkSize(parseRows(size), os.path.join(args.data_dir, size), args.repeat, args.pricing)
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        print(f"compared with {args.compare} ({baseline['meta'].get('git_commit')}):")
+        regressions = compareResults(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than x{args.threshold}")
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,157 @@
+#### Import Python Libraries #################################################################################################################
+
+import time
+import threading
+
+from dataPipeline import fileFingerprint
+from instrumentation import recordedRun
+
+##############################################################################################################################################
+#### Cache Warm-Up Functions #################################################################################################################
+##############################################################################################################################################
+
+'''
+The dataset is cached once it is built (sharedDataset.py), but somebody has to build it - the first visitor after a deploy or after one
+of the data files changed sat on a blank page while the csv files were loaded, merged, priced, mapped to statuses and rolled up, and the
+page could time out before it was done. The functions below move that work onto a background thread:
+
+    ~the warm-up loads the dataset (through the same memoized loader the sessions use) and then runs a list of tasks on it - main.py
+     passes tasks that build the views and figures for the default selections (first month, market pair, status and client), so they
+     are in the figure cache (figureCache.py) by the time anybody looks at them
+    ~a warm-up is keyed on the fingerprints of the data files plus the pipeline settings, and only one runs at a time - sessions that
+     arrive while it runs are shown its progress rather than starting the pipeline themselves
+    ~with a watch interval, a watcher thread checks the file fingerprints every so often and warms the cache again as soon as one of the
+     files changes, without waiting for a visitor to notice
+
+The warm-up records its pipeline stages as a run of its own (instrumentation.recordedRun, labelled 'warmup') - they are written to the
+stage log and kept with the warm-up's status, so they can be shown by the sessions that were waiting for it.
+
+Streamlit only runs main.py once a session connects, so the first warm-up after a deploy starts with the first visitor (who is shown the
+progress straight away) - from then on the watcher keeps the cache warm for each data refresh.
+
+
+Inventory of Functions:
+
+~startWarmup - Starts the warm-up for the current data files if it hasn't been done (or is not running) and returns its status
+
+~warmupStatus - Progress of the warm-up for the current data files (ready | running | failed, current step, fraction done)
+
+~retryWarmup - Starts a failed warm-up again
+
+'''
+
+_WARMUP = {'job': None, 'key': None, 'thread': None, 'watcher': None, 'state': 'idle', 'step': None, 'done': 0, 'steps': 1,
+           'started': None, 'finished': None, 'error': None, 'records': []}
+_WARMUP_LOCK = threading.Lock()
+
+##############################################################################################################################################
+#### startWarmup | warmupStatus | retryWarmup ################################################################################################
+##############################################################################################################################################
+
+'''
+startWarmup - paths are the data files, load a function returning the dataset and tasks a list of (label, function) pairs that are each
+              called with the dataset once it is loaded. settings is anything else the dataset depends on (e.g. the pricing method), so
+              changing it warms the cache again. A warm-up is started unless one already ran, or is running, for the same files and
+              settings - a failed warm-up is not started again until retryWarmup is called (or the files change). watch is the number of
+              seconds between the watcher's checks of the files (None for no watcher).
+
+warmupStatus - ready is True once the warm-up for the current files and settings has finished. progress is the fraction of the steps
+               (loading the dataset plus each task) done so far, seconds the time the warm-up has been running and records the stages
+               it recorded (when instrumentation is on). A data file that can't be read (missing, or being replaced) makes the warm-up
+               'failed' with the error, rather than raising - it is started again once the file can be read.
+'''
+
+def _warmupKey(job):
+    paths, _, _, settings = job
+    return tuple(fileFingerprint(path) for path in paths), settings
+
+
+def _readError(error):
+    return f'{type(error).__name__}: {error}'
+
+
+def _runWarmup(job, key):
+
+    _, load, tasks, _ = job
+    outcome = {'state': 'done', 'step': None, 'done': _WARMUP['steps'], 'error': None}
+    with recordedRun('warmup') as run:
+        try:
+            _WARMUP.update(step='loading the dataset')
+            dataset = load()
+            for label, task in tasks:
+                _WARMUP.update(step=label, done=_WARMUP['done'] + 1)
+                task(dataset)
+        except Exception as error:
+            outcome = {'state': 'failed', 'error': _readError(error)}
+
+    #### the records are published along with the outcome, so a session seeing it done also sees them
+    _WARMUP.update(outcome, finished=time.time(), records=run['records'] if run else [])
+
+    #### the files may have changed while it ran
+    _startIfStale()
+
+
+def _startIfStale(retry=False):
+
+    with _WARMUP_LOCK:
+        job = _WARMUP['job']
+        if job is None or _WARMUP['state'] == 'running':
+            return
+
+        try:
+            key = _warmupKey(job)
+        except OSError as error:
+            _WARMUP.update(key=None, state='failed', step=None, error=_readError(error))
+            return
+
+        if key == _WARMUP['key'] and (_WARMUP['state'] == 'done' or (_WARMUP['state'] == 'failed' and not retry)):
+            return
+
+        _WARMUP.update(key=key, state='running', step=None, done=0, steps=len(job[2]) + 1, started=time.time(), finished=None, error=None,
+                       records=[])
+        _WARMUP['thread'] = threading.Thread(target=_runWarmup, args=(job, key), name='cache-warmup', daemon=True)
+        _WARMUP['thread'].start()
+
+
+def _watchFiles(interval):
+    while True:
+        time.sleep(interval)
+        _startIfStale()
+
+
+def startWarmup(paths, load, tasks=(), settings=(), watch=None):
+
+    with _WARMUP_LOCK:
+        _WARMUP['job'] = (tuple(paths), load, list(tasks), settings)
+        if watch and _WARMUP['watcher'] is None:
+            _WARMUP['watcher'] = threading.Thread(target=_watchFiles, args=(watch,), name='cache-warmup-watcher', daemon=True)
+            _WARMUP['watcher'].start()
+
+    _startIfStale()
+    return warmupStatus()
+
+
+def warmupStatus():
+
+    with _WARMUP_LOCK:
+        job = _WARMUP['job']
+        status = {key: _WARMUP[key] for key in ['state', 'step', 'error', 'records']}
+        try:
+            current = job is not None and _warmupKey(job) == _WARMUP['key']
+        except OSError as error:
+            current = False
+            if _WARMUP['state'] != 'running':
+                status.update(state='failed', error=_readError(error))
+        status['ready'] = current and _WARMUP['state'] == 'done'
+        status['progress'] = _WARMUP['done'] / _WARMUP['steps']
+        status['seconds'] = ((_WARMUP['finished'] or time.time()) - _WARMUP['started']) if _WARMUP['started'] else 0.0
+
+    return status
+
+
+def retryWarmup():
+    _startIfStale(retry=True)
+    return warmupStatus()
+
+##############################################################################################################################################
+##############################################################################################################################################
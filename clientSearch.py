@@ -0,0 +1,78 @@
+#### Import Python Libraries #################################################################################################################
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+##############################################################################################################################################
+#### Client Search Functions #################################################################################################################
+##############################################################################################################################################
+
+'''
+The customer id selectbox was given every unique user id - each a 64 character hash - so the whole list was sent to the browser on every
+rerun of the client section and filtered there as the user typed. That is fine for a few dozen clients but not for hundreds of thousands.
+The functions below search the user ids on the server instead, so the selectbox only ever holds the few clients that match:
+
+    ~the user ids are ranked by their total USD volume (top traders first, ties by user id) once, when the dataset is built
+    ~the ids are lower cased and sorted into a prefix index - all the ids starting with what was typed are next to each other in the
+     sorted ids, so they are found with two binary searches (np.searchsorted) however many clients there are
+    ~of the ids that match, only the limit best ranked are returned (a partial sort of their ranks), so the selectbox shows the top
+     traders matching the search - with nothing typed, the top traders overall
+
+
+Inventory of Functions:
+
+~buildClientSearch - Prefix index of the user ids ranked by total USD volume
+
+~searchClients - Top ranked user ids starting with a search string (and their USD volume)
+
+'''
+
+CLIENT_SEARCH_LIMIT = 50
+
+ClientSearch = namedtuple('ClientSearch', ['keys', 'ranks', 'clients', 'volumes'])
+
+##############################################################################################################################################
+#### buildClientSearch | searchClients #######################################################################################################
+##############################################################################################################################################
+
+'''
+buildClientSearch - client_totals has one row per user_id with its total usd_volume (aggregateCube.clientTotals). clients and volumes are
+                    in rank order, keys are the lower cased ids sorted alphabetically and ranks the rank of each key.
+
+searchClients - Returns the user ids (best ranked first), their total USD volumes and the number of ids that matched. The search is by
+                case-insensitive prefix, ignoring surrounding spaces.
+'''
+
+def buildClientSearch(client_totals):
+
+    totals = pd.DataFrame({'user_id': client_totals['user_id'].astype(str), 'usd_volume': client_totals['usd_volume'].astype(np.float64)})
+    totals = totals.sort_values(['usd_volume', 'user_id'], ascending=[False, True], na_position='last')
+
+    clients = totals['user_id'].to_numpy(dtype=object)
+    keys = np.array([client.lower() for client in clients], dtype=object)
+    order = np.argsort(keys, kind='stable')
+
+    return ClientSearch(keys[order], order.astype(np.int64), clients, totals['usd_volume'].to_numpy())
+
+
+def searchClients(search, query='', limit=CLIENT_SEARCH_LIMIT):
+
+    prefix = (query or '').strip().lower()
+
+    if prefix:
+        start = np.searchsorted(search.keys, prefix, side='left')
+        stop = np.searchsorted(search.keys, prefix + '\U0010ffff', side='right')
+        ranks = search.ranks[start:stop]
+        if len(ranks) > limit:
+            ranks = np.partition(ranks, limit - 1)[:limit]
+        ranks = np.sort(ranks)
+        matched = stop - start
+    else:
+        ranks = np.arange(min(limit, len(search.clients)))
+        matched = len(search.clients)
+
+    return search.clients[ranks], search.volumes[ranks], int(matched)
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,182 @@
+#### Import Python Libraries #################################################################################################################
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+##############################################################################################################################################
+#### Cohort (Customer Status) Engine #########################################################################################################
+##############################################################################################################################################
+
+'''
+The customer status mapping was originally hard-coded to Jan, Feb and March 2020 - a list of unique users per month, set differences
+between the lists and then one mask scan over combined_df per status per month. The functions below work for any number of months.
+
+A user x month activity matrix is built once (True where the user traded in that month) and the statuses for every month are derived
+from it with array operations:
+
+    ~New - active this month and not active in any of the preceeding months
+    ~Returning - active this month and active last month
+    ~Churned - not active this month but active last month
+    ~Reactivated - active this month, not active last month but active before that (i.e. returning after being Churned)
+
+As before, all clients trading in the first month of the data are classified as Returning, since without the previous month's data it
+is not possible to tell if they are New or Reactivated. Months in between that have no trades at all are still included in the matrix,
+so a client that skips a month is Churned in that month. Each user-month gets exactly one status (or none, when the user was inactive
+both this month and last month).
+
+
+Inventory of Functions:
+
+~buildCohorts - Builds the activity matrix and status codes from the user_id / year_month of every trade leg
+
+~statusMatrix - Status code for every user x month from the activity matrix
+
+~updateCohorts - Adds new activity to the cohorts, working the status codes out again only from the first month with new activity
+
+~cohortStatus - Status label for each row of a dataframe (user_id, year_month) by direct lookup into the status codes
+
+~churnedCustomers - The churned (user_id, year_month) pairs for every month at once
+
+~statusCounts - Number of customers per month per status
+
+'''
+
+NO_STATUS, NEW, RETURNING, CHURNED, REACTIVATED = 0, 1, 2, 3, 4
+STATUS_LABELS = np.array(['Unknown', 'New', 'Returning', 'Churned', 'Reactivated'], dtype=object)
+
+#### users (Index), months (PeriodIndex), active (bool matrix) and codes (int8 matrix) - rows are users, columns are months
+CustomerCohorts = namedtuple('CustomerCohorts', ['users', 'months', 'active', 'codes'])
+
+##############################################################################################################################################
+#### buildCohorts | statusMatrix | updateCohorts #############################################################################################
+##############################################################################################################################################
+
+'''
+statusMatrix - before is the activity of the months before the first column of active (None when active starts at the first month of
+               the data) - the status codes of a run of months only depend on it through last month's activity and whether the user
+               was active at all before.
+
+updateCohorts - A user's status codes only change from the first month in which they have new activity, so with activity appended month
+                by month (incrementalIngest.py) only the last month or two are worked out again. New users and months are added to the
+                matrix (users stay sorted, as in buildCohorts) and the result is the same as buildCohorts over all of the activity.
+                Returns the new cohorts along with the months whose status codes changed.
+'''
+
+def statusMatrix(active, before=None):
+
+    #### active last month | active in any of the preceeding months
+    previous = np.zeros_like(active)
+    previous[:, 1:] = active[:, :-1]
+    seen_before = np.zeros_like(active)
+    seen_before[:, 1:] = np.logical_or.accumulate(active, axis=1)[:, :-1]
+
+    if before is not None:
+        previous[:, 0] = before[:, -1]
+        seen_before |= before.any(axis=1)[:, None]
+
+    codes = np.full(active.shape, NO_STATUS, dtype=np.int8)
+    codes[active & ~seen_before] = NEW
+    codes[active & previous] = RETURNING
+    codes[active & ~previous & seen_before] = REACTIVATED
+    codes[~active & previous] = CHURNED
+
+    #### First month: all active users are Returning
+    if before is None:
+        codes[:, 0] = np.where(active[:, 0], RETURNING, NO_STATUS)
+
+    return codes
+
+
+def buildCohorts(activity):
+
+    user_codes, users = pd.factorize(activity['user_id'], sort=True)
+    year_months = pd.PeriodIndex(activity['year_month'], freq='M')
+    months = pd.period_range(year_months.min(), year_months.max(), freq='M')
+    month_codes = months.get_indexer(year_months)
+
+    active = np.zeros((len(users), len(months)), dtype=bool)
+    active[user_codes, month_codes] = True
+
+    return CustomerCohorts(pd.Index(users), months, active, statusMatrix(active))
+
+
+def updateCohorts(cohorts, activity):
+
+    if cohorts is None:
+        cohorts = buildCohorts(activity)
+        return cohorts, cohorts.months
+    if not len(activity):
+        return cohorts, cohorts.months[:0]
+
+    users = cohorts.users.union(pd.Index(activity['user_id'].unique()))
+    year_months = pd.PeriodIndex(activity['year_month'], freq='M')
+    months = pd.period_range(min(cohorts.months[0], year_months.min()), max(cohorts.months[-1], year_months.max()), freq='M')
+
+    #### the old matrices in the new users x months layout
+    rows, columns = np.ix_(users.get_indexer(cohorts.users), months.get_indexer(cohorts.months))
+    active = np.zeros((len(users), len(months)), dtype=bool)
+    active[rows, columns] = cohorts.active
+    old_codes = np.zeros(active.shape, dtype=np.int8)
+    old_codes[rows, columns] = cohorts.codes
+
+    month_codes = months.get_indexer(year_months)
+    active[users.get_indexer(activity['user_id']), month_codes] = True
+
+    #### from the first month with new activity or the first new month - or every month, when the data now starts earlier (the first
+    #### month rule moves)
+    start = min(month_codes.min(), len(cohorts.months)) if months[0] == cohorts.months[0] else 0
+    codes = old_codes.copy()
+    codes[:, start:] = statusMatrix(active[:, start:], active[:, :start] if start else None)
+
+    changed = (codes[:, start:] != old_codes[:, start:]).any(axis=0)
+
+    return CustomerCohorts(users, months, active, codes), months[start:][changed]
+
+##############################################################################################################################################
+#### cohortStatus | churnedCustomers | statusCounts ##########################################################################################
+##############################################################################################################################################
+
+'''
+cohortStatus - looks up the status for each row of df from its user_id and year_month. Rows whose user or month is not in the cohorts
+               come through as 'Unknown' (same as the original mapping for months outside of Jan-March).
+
+churnedCustomers - dataframe of the user_id and year_month of every Churned user-month, taken straight from the status matrix in one
+                   pass (used to add the churned customers back into updated_df).
+
+statusCounts - unique customers per month for each status (year_month x status table), used for the status distribution summary.
+'''
+
+def cohortStatus(cohorts, df):
+
+    user_codes = cohorts.users.get_indexer(df['user_id'])
+
+    #### only the distinct months are converted (year_month may be 'YYYY-MM' strings)
+    month_keys, year_months = pd.factorize(df['year_month'])
+    month_codes = np.append(cohorts.months.get_indexer(pd.PeriodIndex(year_months, freq='M')), -1)[month_keys]
+    found = (user_codes >= 0) & (month_codes >= 0)
+
+    codes = np.zeros(len(df), dtype=np.int8)
+    codes[found] = cohorts.codes[user_codes[found], month_codes[found]]
+
+    return STATUS_LABELS[codes]
+
+
+def churnedCustomers(cohorts):
+
+    user_codes, month_codes = np.nonzero(cohorts.codes == CHURNED)
+
+    return pd.DataFrame({
+        'user_id': cohorts.users.take(user_codes),
+        'year_month': cohorts.months.take(month_codes),
+    })
+
+
+def statusCounts(cohorts):
+
+    counts = np.stack([(cohorts.codes == code).sum(axis=0) for code in (NEW, RETURNING, CHURNED, REACTIVATED)], axis=1)
+
+    return pd.DataFrame(counts, index=cohorts.months.astype(str), columns=STATUS_LABELS[[NEW, RETURNING, CHURNED, REACTIVATED]])
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,155 @@
+#### Import Python Libraries #################################################################################################################
+
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow.feather as feather
+import pyarrow.dataset as ds
+
+##############################################################################################################################################
+#### Columnar Snapshot Functions #############################################################################################################
+##############################################################################################################################################
+
+'''
+Parsing the csv files from text (and converting the timestamps to datetimes) dominated the cold start of the app. The functions below
+write a typed, columnar snapshot (Arrow/Feather file) of each cleaned data file the first time it is read - datetimes already converted,
+market_pair already concatenated and the 64 character user/account hashes stored as categoricals. Later runs memory-map the snapshot
+instead of parsing the csv file.
+
+Each snapshot is stored in a .snapshots folder next to the csv file along with a small json file recording the modified time, size and
+sha256 hash of the csv file it was built from. The snapshot is only rebuilt when the csv file changes - if only the modified time changed
+(e.g. the file was copied or touched) the hash is checked and the existing snapshot is kept.
+
+
+Inventory of Functions:
+
+~fileHash - sha256 hash of a file, read in blocks so large ledger files are not loaded into memory
+
+~snapshotPaths - Paths of the feather snapshot and json metadata file for a csv file
+
+~snapshotIsCurrent - Checks the csv file against the metadata recorded when its snapshot was written
+
+~loadSnapshot - Returns the cleaned dataframe for a csv file, from its snapshot where possible (used by dataPipeline.loadCleanFiles)
+
+~ensureSnapshot | readSnapshot - (Re)writes the snapshot of a csv file if needed | reads only some of its columns/rows
+
+'''
+
+SNAPSHOT_DIR = '.snapshots'
+SNAPSHOT_VERSION = 1
+
+#### Columns stored as categoricals in each snapshot
+CATEGORICAL_COLUMNS = {
+    'accounts': ['id', 'user_id', 'currency'],
+    'ledger': ['account_id'],
+    'trades': ['bid_user_id', 'ask_user_id'],
+    'rates': ['currency'],
+}
+
+##############################################################################################################################################
+#### fileHash | snapshotPaths | snapshotIsCurrent ############################################################################################
+##############################################################################################################################################
+
+def fileHash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshotPaths(csv_path):
+    folder = os.path.join(os.path.dirname(os.path.abspath(csv_path)), SNAPSHOT_DIR)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(folder, name + '.feather'), os.path.join(folder, name + '.json')
+
+
+def snapshotIsCurrent(csv_path):
+    snapshot_path, meta_path = snapshotPaths(csv_path)
+    if not (os.path.exists(snapshot_path) and os.path.exists(meta_path)):
+        return False
+
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+
+    if meta.get('version') != SNAPSHOT_VERSION:
+        return False
+
+    csvStat = os.stat(csv_path)
+    if meta['mtime_ns'] == csvStat.st_mtime_ns and meta['size'] == csvStat.st_size:
+        return True
+
+    #### modified time changed - only rebuild if the contents changed as well
+    if meta['size'] != csvStat.st_size or meta['sha256'] != fileHash(csv_path):
+        return False
+
+    meta['mtime_ns'] = csvStat.st_mtime_ns
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+    return True
+
+##############################################################################################################################################
+#### loadSnapshot ############################################################################################################################
+##############################################################################################################################################
+
+'''
+loadSnapshot - Returns the cleaned dataframe for a csv file. If the snapshot is current it is memory-mapped and converted to pandas,
+               otherwise the csv file is read, passed through cleanFunc (cleanLedger, cleanTrades, ...), the given columns are
+               converted to categoricals and the snapshot is (re)written. Snapshots are written uncompressed so they can be memory-mapped.
+'''
+
+def loadSnapshot(csv_path, cleanFunc=None, categoricals=()):
+    snapshot_path, meta_path = snapshotPaths(csv_path)
+
+    if snapshotIsCurrent(csv_path):
+        return feather.read_table(snapshot_path, memory_map=True).to_pandas()
+
+    csvStat = os.stat(csv_path)
+    df = pd.read_csv(csv_path)
+    if cleanFunc is not None:
+        df = cleanFunc(df)
+    for column in categoricals:
+        df[column] = df[column].astype('category')
+
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    feather.write_feather(df, snapshot_path, compression='uncompressed')
+
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'source': os.path.abspath(csv_path),
+        'mtime_ns': csvStat.st_mtime_ns,
+        'size': csvStat.st_size,
+        'sha256': fileHash(csv_path),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+    return df
+
+##############################################################################################################################################
+#### ensureSnapshot | readSnapshot ###########################################################################################################
+##############################################################################################################################################
+
+'''
+ensureSnapshot - Makes sure the snapshot of a csv file is current (writing it with loadSnapshot if not) without loading it.
+
+readSnapshot - Reads only the given columns and/or the rows matching a pyarrow filter expression from the snapshot of a csv file - e.g.
+               one month of the ledger - so the rest of the (memory-mapped) snapshot is never converted to pandas. Call ensureSnapshot first.
+'''
+
+def ensureSnapshot(csv_path, cleanFunc=None, categoricals=()):
+    if not snapshotIsCurrent(csv_path):
+        loadSnapshot(csv_path, cleanFunc, categoricals)
+    return snapshotPaths(csv_path)[0]
+
+
+def readSnapshot(csv_path, columns=None, filter=None):
+    table = feather.read_table(snapshotPaths(csv_path)[0], columns=columns, memory_map=True)
+    if filter is not None:
+        table = ds.dataset(table).to_table(filter=filter)
+    return table.to_pandas()
+
+##############################################################################################################################################
+##############################################################################################################################################
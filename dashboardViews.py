@@ -0,0 +1,199 @@
+#### Import Python Libraries #################################################################################################################
+
+import pandas as pd
+import plotly.express as px
+
+from aggregateCube import clientRows
+from clientSearch import searchClients
+from plotlyGraphs import tradeDistPerMonth, volumeDistPerMonth, pieGraph, marketPairLine, marketPairVolume, clientMonthlyStatusAvg, monthlyClientVolumeNormalised
+
+##############################################################################################################################################
+#### Dashboard View Functions ################################################################################################################
+##############################################################################################################################################
+
+'''
+Each section of the dashboard (main.py) filters the cached dataset for its selected month | market-pair | status | client and draws its
+graphs from the filtered dataframes. That work was done inline in each section, so it could only happen while a session was drawing
+the page. The functions below do it for a given dataset and selection and return the dataframes, figures and statistics the section
+shows - main.py only lays them out, and the cache warm-up (cacheWarmup.py) calls the same functions for the default selections in a
+background thread so their figures are already in the figure cache when the first session draws them.
+
+
+Inventory of Functions:
+
+~sectionOptions - The choices for the month, market-pair and status inputs (clients are searched - clientSearch.py)
+
+~monthViews | currencyViews | clientViews | statusViews | clientPairsViews - Dataframes and figures of each section for a selection
+
+~defaultViewTasks - (label, function) warm-up tasks that build every section for the default selections
+
+'''
+
+# Colour Theme for Graphs
+colors = px.colors.qualitative.Vivid
+
+##############################################################################################################################################
+#### sectionOptions ##########################################################################################################################
+##############################################################################################################################################
+
+def sectionOptions(dataset):
+    updated_df = dataset['updated_df']
+    return {
+        'months': sorted(updated_df['year_month'].unique()),
+        'market_pairs': updated_df['market_pair'].dropna().unique(),
+        'statuses': dataset['users_combined']['status'].unique(),
+    }
+
+##############################################################################################################################################
+#### monthViews | currencyViews | clientViews | statusViews | clientPairsViews ###############################################################
+##############################################################################################################################################
+
+'''
+monthViews - Graphs 1-5 and 12 for a year_month. The trade distributions are drawn from the trade counts per hour/day of the aggregate
+             cube, or with raw=True from the month's trades. 'trades' is a function returning the month's trades, so they are only
+             filtered when a trades table is opened.
+
+currencyViews - Graphs 7 and 8 for a market_pair.
+
+clientViews - Graphs 9 and 11 and the client's latest status and averages, for a user_id. A client with no rows (an id that is not in the
+              data, or no client at all) gets only the empty tables, with 'stats' set to None.
+
+statusViews | clientPairsViews - Graph 10 for a status | Graph 6 (no inputs).
+'''
+
+def monthViews(dataset, singleMonth, attribute, raw=False):
+
+    users_combined = dataset['users_combined']
+    monthlyTrades = lambda: users_combined[users_combined['year_month'] == singleMonth]
+
+    monthly_hourly_sums = dataset['monthly_hourly_sums']
+    hourly_counts = monthly_hourly_sums[monthly_hourly_sums['year_month'] == singleMonth].reset_index(drop=True)
+
+    monthly_daily_sums = dataset['monthly_daily_sums']
+    daily_counts = monthly_daily_sums[monthly_daily_sums['year_month'] == singleMonth].reset_index(drop=True)
+
+    # dataframe filtered on single month
+    monthly_pairs_df = dataset['monthly_pairs_df']
+    allPairsMonthly_df = monthly_pairs_df[monthly_pairs_df['year_month'] == singleMonth]
+    allPairsMonthly_df['usd_percentage'] = (allPairsMonthly_df['usd_volume'] / allPairsMonthly_df['usd_volume'].sum())
+
+    # Dataframe 3 filtered on a specific month AND then status for all clients
+    clients_combined_avg = dataset['clients_combined_avg']
+    allClients_monthlyAverage = clients_combined_avg[clients_combined_avg['year_month'] == singleMonth]
+    allClients_monthlyAverage = allClients_monthlyAverage[allClients_monthlyAverage['status'] == 'Returning']
+
+    # Calculate Number of clients that traded below the monthly average
+    monthlyMean_value = allClients_monthlyAverage['avg_monthlyStatus_volume'].mean()
+    clientsBelow_mean_count = (allClients_monthlyAverage['avg_client_volume'] < monthlyMean_value).sum()
+    total_count = allClients_monthlyAverage['avg_client_volume'].count()
+
+    # Calculate percentage
+    percentage_below_mean = (clientsBelow_mean_count / total_count) * 100
+
+    views = {
+        'trades': monthlyTrades,
+        'hourly_sums': hourly_counts[['hour', 'usd_volume', 'usd_percentage']],
+        'daily_sums': daily_counts[['day', 'usd_volume', 'usd_percentage']],
+        'pairs': allPairsMonthly_df,
+        'clients': allClients_monthlyAverage,
+        'below_mean': f"💡 **{clientsBelow_mean_count}** out of **{total_count}** clients ({percentage_below_mean:.2f}%) are below the mean (${monthlyMean_value:,.2f})",
+    }
+
+    if raw:
+        trades = monthlyTrades()
+        views['graph1'] = tradeDistPerMonth(trades, attribute, 'hour', colors[0], 'Graph 1 - Hourly Trade Distribution Per Month', raw=True)
+        views['graph3'] = tradeDistPerMonth(trades, attribute, 'day', colors[1], 'Graph 3 - Daily Trade Distribution Per Month', raw=True)
+    else:
+        views['graph1'] = tradeDistPerMonth(hourly_counts, attribute, 'hour', colors[0], 'Graph 1 - Hourly Trade Distribution Per Month', weights='trades')
+        views['graph3'] = tradeDistPerMonth(daily_counts, attribute, 'day', colors[1], 'Graph 3 - Daily Trade Distribution Per Month', weights='trades')
+
+    views['graph2'] = volumeDistPerMonth(views['hourly_sums'], attribute, 'hour', colors[2], 'Graph 2 - Hourly USD Volume Distribution Per Month')
+    views['graph4'] = volumeDistPerMonth(views['daily_sums'], attribute, 'day', colors[3], 'Graph 4 - Daily USD Volume Distribution Per Month')
+    views['graph5'] = marketPairVolume(allPairsMonthly_df, attribute, f'Graph 5 - USD Volume Traded for {singleMonth}')
+    views['graph12'] = monthlyClientVolumeNormalised(allClients_monthlyAverage, title='Graph 12 - Distribution of Monthly Average USD Volume Traded By Returning Clients')
+
+    return views
+
+
+def currencyViews(dataset, singleCurrency):
+
+    # dataframe filtered on single market-pair
+    monthly_pairs_df = dataset['monthly_pairs_df']
+    singleMonthlyPair_df= monthly_pairs_df[monthly_pairs_df['market_pair'] == singleCurrency]
+    singleMonthlyPair_df['usd_percentage'] = (singleMonthlyPair_df['usd_volume'] / singleMonthlyPair_df['usd_volume'].sum())
+
+    return {
+        'pair': singleMonthlyPair_df,
+        'graph7': marketPairLine(singleMonthlyPair_df, f'Graph 7 - {singleCurrency} Volume Traded per Month'),
+        'graph8': pieGraph(singleMonthlyPair_df, label='year_month', value='usd_volume', gap=0, title=f'Graph 8 - {singleCurrency} Split Per Month'),
+    }
+
+
+def clientViews(dataset, client_id):
+
+    singleCustomer_df = clientRows(dataset['client_sums_index'], client_id)
+
+    # Dataframe 3 filtered for a specific client (user_id) with year_month column cleaned up for better visualization
+    singleClient_average = clientRows(dataset['clients_combined_avg_index'], client_id)
+    singleClient_average['year_month'] = pd.to_datetime(singleClient_average['year_month'], format='%Y-%m')
+    singleClient_average = singleClient_average.sort_values('year_month')
+    singleClient_average['year_month'] = singleClient_average['year_month'].dt.strftime('%b %Y')
+
+    if singleClient_average.empty:
+        return {'customer': singleCustomer_df, 'client': singleClient_average, 'stats': None}
+
+    # Caluclate Statistics for selected client
+    latest = singleClient_average.iloc[-1]
+
+    return {
+        'customer': singleCustomer_df,
+        'client': singleClient_average,
+        'stats': [
+            f"💡 Current Client Status: **{latest['status']}**",
+            f"💡 Latest Client Monthly Average: **${latest['avg_client_volume']:,.2f}**",
+            f"💡 Monthly Status Average: **${latest['avg_monthlyStatus_volume']:,.2f}**",
+            f"💡 Latest Month Average: **${latest['avg_monthly_volume']:,.2f}**",
+        ],
+        'graph9': marketPairVolume(singleCustomer_df, 'usd_volume', 'Graph 9 - USD Volume Traded by Selected Client'),
+        'graph11': clientMonthlyStatusAvg(singleClient_average, title='Graph 11 - Average USD Volume Traded by Client vs. Monthly Average vs. Status Average',),
+    }
+
+
+def statusViews(dataset, status):
+
+    # Dataframe filtered by customer status
+    status_sums = dataset['status_sums']
+    status_df = status_sums[status_sums['status'] == status]
+
+    return {'status': status_df, 'graph10': marketPairVolume(status_df, 'usd_volume', 'Graph 10 - USD Volume Traded By Status')}
+
+
+def clientPairsViews(dataset):
+
+    client_pairs_count = dataset['client_pairs_count']
+
+    return {'pairs': client_pairs_count, 'graph6': pieGraph(client_pairs_count, label='pairs', value='customers', gap=0.3, title='Graph 6 - Client Pairs Traded')}
+
+##############################################################################################################################################
+#### defaultViewTasks ########################################################################################################################
+##############################################################################################################################################
+
+'''
+defaultViewTasks - Warm-up tasks (cacheWarmup.startWarmup) that build each section for the selections a new session starts with - the
+                   first month (both attributes), market-pair and status, and the top ranked client.
+'''
+
+def defaultViewTasks(raw=False):
+
+    first = lambda dataset, name: sectionOptions(dataset)[name][0]
+
+    return [
+        ('month views', lambda dataset: [monthViews(dataset, first(dataset, 'months'), attribute, raw) for attribute in ['Count', 'Percent']]),
+        ('currency views', lambda dataset: currencyViews(dataset, first(dataset, 'market_pairs'))),
+        ('client views', lambda dataset: clientViews(dataset, next(iter(searchClients(dataset['client_search'], limit=1)[0]), None))),
+        ('status views', lambda dataset: statusViews(dataset, first(dataset, 'statuses'))),
+        ('client pairs views', clientPairsViews),
+    ]
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,191 @@
+#### Import Python Libraries #################################################################################################################
+
+import os
+import atexit
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from figureCache import frameFingerprint
+
+##############################################################################################################################################
+#### Dataframe Export Functions ##############################################################################################################
+##############################################################################################################################################
+
+'''
+The download buttons used convert_df, which turned the whole dataframe into one csv string and then encoded it - two full copies of the
+csv in memory for every button on every rerun - and kept every result in st.cache_data for good. The functions below replace it:
+
+    ~the dataframe is written in chunks of rows to a file on disk, so only one chunk of csv text is held in memory at a time
+    ~the file can be a plain csv, a gzip or zstd compressed csv (compressed as it is written, with pyarrow's compressed streams) or a
+     parquet file (written one row group per chunk)
+    ~the files are kept in an LRU cache bounded by the number of files and their total size on disk - the least recently downloaded
+     files are deleted once either limit is passed
+    ~the download buttons are given a function rather than the file contents, so the file is only written when a button is clicked -
+     streamlit runs it in its own thread, so an export of the full final_df does not hold up the rerun or the other sessions
+
+The cache key is the fingerprint of the dataframe (figureCache.frameFingerprint) and the format, so clicking the same download again, or
+from another session, sends the file that was already written.
+
+
+Inventory of Functions:
+
+~exportName - File name (with the extension of the format) for an export
+
+~writeExport - Writes a dataframe to a file in chunks as csv | gzip/zstd csv | parquet
+
+~cachedExport | exportBytes - Path of the cached export of a dataframe (written if needed) | the contents of that file
+
+~downloadArgs - data (a function), file_name and mime arguments for st.download_button
+
+~exportCacheInfo | clearExportCache - Files and bytes in the export cache | deletes them
+
+'''
+
+#### format: (file extension, mime type)
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'csv.zst': ('.csv.zst', 'application/zstd'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+EXPORT_CODECS = {'csv.gz': 'gzip', 'csv.zst': 'zstd'}
+
+EXPORT_CHUNKSIZE = 100000
+EXPORT_CACHE_FILES = 16
+EXPORT_CACHE_BYTES = 256 * 2 ** 20
+
+_EXPORTS = OrderedDict()
+_EXPORT_LOCK = threading.Lock()
+_EXPORT_DIR = {'path': None}
+
+##############################################################################################################################################
+#### exportName | writeExport ################################################################################################################
+##############################################################################################################################################
+
+'''
+writeExport - Writes df to path in chunks of chunksize rows. The csv formats write the same text as df.to_csv(index=False) (the header
+              only with the first chunk). Parquet takes its schema from the first chunk so every row group has the same column types.
+'''
+
+def exportName(name, fmt='csv'):
+    return name + EXPORT_FORMATS[fmt][0]
+
+
+def frameChunks(df, chunksize=EXPORT_CHUNKSIZE):
+    for start in range(0, max(len(df), 1), chunksize):
+        yield start == 0, df.iloc[start:start + chunksize]
+
+
+def writeExport(df, path, fmt='csv', chunksize=EXPORT_CHUNKSIZE):
+
+    if fmt == 'parquet':
+        writer = None
+        for first, chunk in frameChunks(df, chunksize):
+            table = pa.Table.from_pandas(chunk, schema=None if first else writer.schema, preserve_index=False)
+            if first:
+                writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+            writer.write_table(table)
+        writer.close()
+        return path
+
+    with pa.OSFile(path, 'wb') as raw:
+        stream = pa.CompressedOutputStream(raw, EXPORT_CODECS[fmt]) if fmt in EXPORT_CODECS else raw
+        for first, chunk in frameChunks(df, chunksize):
+            stream.write(chunk.to_csv(index=False, header=first).encode('utf-8'))
+        if stream is not raw:
+            stream.close()
+
+    return path
+
+##############################################################################################################################################
+#### cachedExport | exportBytes | downloadArgs ###############################################################################################
+##############################################################################################################################################
+
+'''
+cachedExport - Returns the path of the export of df in fmt from the cache, or writes it (outside the lock, so sessions exporting other
+               dataframes are not held up) and adds it to the cache, evicting the least recently used files while there are more than
+               EXPORT_CACHE_FILES or they take up more than EXPORT_CACHE_BYTES. The export just written is never evicted straight away.
+
+exportBytes - Contents of the cached export. The file is opened under the lock, so it can still be read if it is evicted meanwhile.
+
+downloadArgs - Keyword arguments for st.download_button - the data is a function that exports the dataframe when the button is clicked,
+               and clicking it doesn't rerun the app (on_click='ignore').
+'''
+
+def exportDir():
+    if _EXPORT_DIR['path'] is None:
+        _EXPORT_DIR['path'] = tempfile.mkdtemp(prefix='luno_exports_')
+        atexit.register(shutil.rmtree, _EXPORT_DIR['path'], True)
+    return _EXPORT_DIR['path']
+
+
+def _evict(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def cachedExport(df, fmt='csv'):
+
+    key = (frameFingerprint(df), fmt)
+    with _EXPORT_LOCK:
+        if key in _EXPORTS:
+            _EXPORTS.move_to_end(key)
+            return _EXPORTS[key][0]
+        folder = exportDir()
+
+    handle, path = tempfile.mkstemp(suffix=EXPORT_FORMATS[fmt][0], dir=folder)
+    os.close(handle)
+    writeExport(df, path, fmt)
+
+    with _EXPORT_LOCK:
+        if key in _EXPORTS:
+            _evict(path)
+            _EXPORTS.move_to_end(key)
+            return _EXPORTS[key][0]
+
+        _EXPORTS[key] = (path, os.path.getsize(path))
+        while len(_EXPORTS) > 1 and (len(_EXPORTS) > EXPORT_CACHE_FILES or sum(size for _, size in _EXPORTS.values()) > EXPORT_CACHE_BYTES):
+            _evict(_EXPORTS.popitem(last=False)[1][0])
+
+    return path
+
+
+def exportBytes(df, fmt='csv'):
+
+    while True:
+        path = cachedExport(df, fmt)
+        with _EXPORT_LOCK:
+            if os.path.exists(path):
+                f = open(path, 'rb')
+                break
+
+    with f:
+        return f.read()
+
+
+def downloadArgs(df, name, fmt='csv'):
+    return {'data': lambda: exportBytes(df, fmt), 'file_name': exportName(name, fmt), 'mime': EXPORT_FORMATS[fmt][1], 'on_click': 'ignore'}
+
+##############################################################################################################################################
+#### exportCacheInfo | clearExportCache ######################################################################################################
+##############################################################################################################################################
+
+def exportCacheInfo():
+    with _EXPORT_LOCK:
+        return {'files': len(_EXPORTS), 'bytes': sum(size for _, size in _EXPORTS.values()),
+                'max_files': EXPORT_CACHE_FILES, 'max_bytes': EXPORT_CACHE_BYTES}
+
+
+def clearExportCache():
+    with _EXPORT_LOCK:
+        while _EXPORTS:
+            _evict(_EXPORTS.popitem()[1][0])
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,599 @@
+#### Import Python Libraries #################################################################################################################
+
+import os
+from functools import lru_cache
+import pandas as pd
+
+from columnarCache import loadSnapshot, CATEGORICAL_COLUMNS
+from cohortEngine import buildCohorts, cohortStatus, churnedCustomers
+from aggregateCube import buildCube, cubeViews
+from instrumentation import instrumented
+from idEncoding import buildDictionaries, encodeTable, decodeTable, decodeCohorts
+from rateGrid import GRID_FILLS, buildRateGrid, lookupRates, loadRateGrid
+
+##############################################################################################################################################
+#### Data Pipeline Functions #################################################################################################################
+##############################################################################################################################################
+
+'''
+The cleaning, joining and status mapping stages used to run at the top of main.py, which meant that every widget interaction in the
+streamlit app re-read the csv files and re-did all of the merges. I moved those stages into this seperate python file as functions
+so that they run once and the results are re-used until one of the data files changes. main.py then only has to work out the small
+per-selection filters (month, market-pair, status, client) on each rerun.
+
+The functions are memoized on the file fingerprints (path, modified time and size) of the 4 csv files - if any of the files is replaced
+or edited the fingerprint changes and the whole pipeline is re-run, otherwise the cached dataframes are returned straight away.
+
+
+Inventory of Functions:
+
+~fileFingerprint - Returns the (path, modified time, size) fingerprint used as the cache key for a data file
+
+~loadCsvFiles - Reads the accounts, ledger, trades and rates csv files as pandas dataframes
+
+~loadCleanFiles - Cleaned accounts, ledger, trades and rates dataframes, memory-mapped from their columnar snapshots (columnarCache.py)
+
+~cleanLedger | cleanTrades | cleanRates - Adds the datetime/market_pair columns needed for the joins and the analysis
+
+~encodeIds | decodeUsers - User/account hashes -> integer codes before the joins | user ids of the trades -> hashes (idEncoding.py)
+
+~mergeLedgerAccounts - Joins the ledger to the accounts file (ledgerAccounts)
+
+~mergeLedgerTrades - Joins ledgerAccounts to the trades file and keeps only trading activity (ledgerTrades)
+
+~hourlyAverageRates - Hourly average usd rate for each currency
+
+~mapUsdVolume - Looks up the hourly average usd rate of each ledger leg in the rate grid and calculates the usd_volume (combined_df)
+
+~priceLedgerTrades - Prices each ledger leg with the nearest | previous | interpolated rate snapshot (sorted as-of join) and reports
+                     how many legs were priced, interpolated or left unpriced
+
+~assignCustomerStatus - Classifies each client as New | Returning | Churned | Reactivated per month (using cohortEngine.py)
+
+~tradeVolumes - Collapses the ledger legs into one row per trade with the absolute usd volume (users_combined)
+
+~addChurnedCustomers - Adds back the churned customers for each month with a zero usd volume (updated_df)
+
+~buildAggregates - Selection independent groupings used by the dashboard graphs, rolled up from the aggregate cube
+
+~loadDataset - Runs the full pipeline for the 4 file paths, memoized on the file fingerprints
+
+'''
+
+##############################################################################################################################################
+#### fileFingerprint #########################################################################################################################
+##############################################################################################################################################
+
+'''
+fileFingerprint - returns a tuple of the absolute path, the modified time (in nanoseconds) and the size of a file. Stat'ing a file is
+                  cheap compared to reading it, so this is what the pipeline cache is keyed on.
+'''
+
+def fileFingerprint(path):
+    fileStat = os.stat(path)
+    return (os.path.abspath(path), fileStat.st_mtime_ns, fileStat.st_size)
+
+##############################################################################################################################################
+#### loadCsvFiles ############################################################################################################################
+##############################################################################################################################################
+
+@instrumented()
+def loadCsvFiles(accounts_path, ledger_path, trades_path, rates_path):
+    accounts = pd.read_csv(accounts_path)
+    ledger = pd.read_csv(ledger_path)
+    trades = pd.read_csv(trades_path)
+    rates = pd.read_csv(rates_path)
+
+    return accounts, ledger, trades, rates
+
+##############################################################################################################################################
+#### loadCleanFiles ##########################################################################################################################
+##############################################################################################################################################
+
+'''
+loadCleanFiles - Same as loadCsvFiles followed by the cleaning functions below, except that the cleaned dataframes are stored as columnar
+                 snapshots the first time and memory-mapped from there on (see columnarCache.py). The user/account hashes come back as
+                 categoricals, which is why the groupbys further down are all run with observed=True.
+'''
+
+@instrumented()
+def loadCleanFiles(accounts_path, ledger_path, trades_path, rates_path):
+    accounts = loadSnapshot(accounts_path, categoricals=CATEGORICAL_COLUMNS['accounts'])
+    ledger = loadSnapshot(ledger_path, cleanLedger, CATEGORICAL_COLUMNS['ledger'])
+    trades = loadSnapshot(trades_path, cleanTrades, CATEGORICAL_COLUMNS['trades'])
+    rates = loadSnapshot(rates_path, cleanRates, CATEGORICAL_COLUMNS['rates'])
+
+    return accounts, ledger, trades, rates
+
+##############################################################################################################################################
+#### Data Cleaning ###########################################################################################################################
+##############################################################################################################################################
+
+'''
+cleanLedger - For the ledger File, I converted the timestamp to datetime addded columns for the year-month, day and hour of transaction.
+              The timestamp_at file was converted to datetime to make it easier to merge with the rates file - which contained the historical
+              currency/usd values. For this I specifically created the hourly column, which contained the transaction hour along with the date.
+              The day and hour columns were added to get a better understanding of the distribution of transactions/trades over the days of
+              the month as well as hours in a day i.e. for each month analysed - which days/hours were the most active.
+
+cleanTrades - For this file I concatenated the base_currency with the counter_currency to get a column should the market_pair traded.
+
+cleanRates - For the rates I converted the reference_at trade to datetime to make it consistent with the legder file timestamp_at column,
+             which helped merge the the files and get the hourly average rate for the traded currency pair.
+'''
+
+#### columns cleanLedger works out from timestamp_at
+LEDGER_TIME_COLUMNS = ['timestamp_at_date', 'year_month', 'day', 'hourly', 'hour']
+
+
+@instrumented()
+def cleanLedger(ledger):
+    ledger['timestamp_at_date'] = pd.to_datetime(ledger['timestamp_at'], format='ISO8601')
+    ledger['year_month'] = ledger['timestamp_at_date'].dt.tz_localize(None).dt.to_period('M')
+    ledger['day'] = ledger['timestamp_at_date'].dt.day
+    ledger['hourly'] = ledger['timestamp_at_date'].dt.round('h')
+    ledger['hour'] = ledger['timestamp_at_date'].dt.hour
+
+    return ledger
+
+
+def dropDuplicateRows(df):
+
+    #### rows that match on every other column (timestamp_at included) match on the columns worked out from it as well - leaving them out
+    #### of the comparison gives the same rows and avoids pandas boxing every year_month Period into a python object
+    return df.drop_duplicates(subset=[column for column in df.columns if column not in LEDGER_TIME_COLUMNS])
+
+
+@instrumented()
+def cleanTrades(trades):
+    trades['market_pair'] = trades['base_currency'] +'/'+ trades['counter_currency']
+
+    return trades
+
+
+@instrumented()
+def cleanRates(rates):
+    rates['reference_at_date'] = pd.to_datetime(rates['reference_at'], format='ISO8601')
+
+    return rates
+
+##############################################################################################################################################
+#### encodeIds | decodeUsers #################################################################################################################
+##############################################################################################################################################
+
+'''
+encodeIds - Builds the user and account id dictionaries from the accounts and trades and swaps the 64 character hashes in the accounts,
+            ledger and trades for integer codes, so the merges, de-duplication and groupbys below run on integer keys (see idEncoding.py).
+
+decodeUsers - Once the trades and churned customers are worked out, the user ids of users_combined, updated_df and the cohorts are turned
+              back into the hashes (a categorical over the user dictionary) for the tables shown in the app and the downloads.
+'''
+
+@instrumented()
+def encodeIds(accounts, ledger, trades):
+
+    dictionaries = buildDictionaries(accounts, trades)
+
+    accounts = encodeTable(accounts, 'accounts', dictionaries)
+    ledger = encodeTable(ledger, 'ledger', dictionaries)
+    trades = encodeTable(trades, 'trades', dictionaries)
+
+    return accounts, ledger, trades, dictionaries
+
+
+@instrumented()
+def decodeUsers(users_combined, updated_df, cohorts, dictionaries):
+    return decodeTable(users_combined, dictionaries), decodeTable(updated_df, dictionaries), decodeCohorts(cohorts, dictionaries)
+
+##############################################################################################################################################
+#### mergeLedgerAccounts #####################################################################################################################
+##############################################################################################################################################
+
+'''
+mergeLedgerAccounts - I first merged the ledger and accounts files based on account id's from the ledger and the id's from the account files.
+                      By merging these two data files, a link could then be made from the transacting account in the ledger file (account id)
+                      and the corresponding customer in the account file (user_id)
+'''
+
+@instrumented()
+def mergeLedgerAccounts(ledger, accounts):
+    ledgerAccounts = pd.merge(
+        ledger.sort_values('timestamp_at'),
+        accounts,
+        left_on='account_id',
+        right_on='id',
+        how='left',
+        suffixes=('_ledger', '_account')
+    )
+
+    ledgerAccounts = dropDuplicateRows(ledgerAccounts)
+
+    return ledgerAccounts
+
+##############################################################################################################################################
+#### mergeLedgerTrades #######################################################################################################################
+##############################################################################################################################################
+
+'''
+mergeLedgerTrades - Following this, I then merged this file with the trades file based on the foreign_id (from the accounts file) and the id
+                    (from the trades file) fields. This allowed essentially gave me a view of those transactions that were due specifically to
+                    trading activity from the client or or other transactions namely: sending/receiving crypto, withdrawing fiat, placing/cancelling
+                    limit orders. I then cleaned up the merged dataframe by dropping any duplicate rows/columns. I also removed the transactions
+                    which were not due any trading activities.
+
+                    My reasoning for this was that since Luno operates primarily as an exchange, the primary source of revenue is from trading
+                    activity either through the exchange or broker and so with this in mind, I focused my study on analysing and drawing insights
+                    specifically from clients trading activities.
+'''
+
+@instrumented()
+def mergeLedgerTrades(ledgerAccounts, trades):
+    ledgerTrades = pd.merge(
+        ledgerAccounts,
+        trades,
+        left_on='foreign_id',
+        right_on='id',
+        how='left',
+        suffixes=('_ledger', '_trade')
+    )
+
+    ledgerTrades = dropDuplicateRows(ledgerTrades)
+    ledgerTrades = ledgerTrades.dropna(subset=['user_id'])
+    ledgerTrades = ledgerTrades.dropna(subset=['market_pair'])
+
+    return ledgerTrades
+
+##############################################################################################################################################
+#### mapUsdVolume ############################################################################################################################
+##############################################################################################################################################
+
+'''
+mapUsdVolume - Lastly, in order to calculate the usd_volume,  I calculated the hourly average rate (usd price) for each currency for each hour.
+               I could have done more to get more accurate price in terms of time - like trying to map exact trade/transaction times with the
+               rates from the rates file. However since the times were not exact, it would have resulted in a lot trades not coming through with
+               a price and so I decided to use the hourly average - I felt that this would be fine and would still provide a fair analysis of the data.
+
+               For this I mapped the hourly column (created earlier) with the trasaction hour + date. This was to ensure that the correct average
+               rates were being mapped to the correct date and hour. From this I was able to calculate the usd volume trade by multiplying the
+               balance_delta (ledger file) with the corresponding average usd price.
+
+               The hourly averages are laid out as a dense currency x hour grid (rateGrid.py), saved next to the rates file, so each leg's
+               rate is a position lookup into a numpy array rather than a merge on the hour + currency - the gaps in the grid (hours with
+               no rate) are either left unpriced ('hourly') or filled forward from the last hour with a rate ('hourly_ffill').
+
+hourlyAverageRates - the hourly average rate per currency, worked out seperately so that it can be re-used for each chunk of the ledger
+                     when the ledger is streamed (see streamingIngest.py).
+'''
+
+@instrumented()
+def hourlyAverageRates(rates):
+
+    #### Calculate hourly average per currency per reference data hour
+    hourly_avg = rates.set_index('reference_at_date').groupby(['currency', pd.Grouper(freq='h')], observed=True)['average_price_per_usd'].mean().reset_index()
+
+    return hourly_avg
+
+
+@instrumented()
+def mapUsdVolume(ledgerTrades, rate_grid):
+
+    #### look up the usd rate for the currency for that hour (and the hour the rate was taken from)
+    prices, sources = lookupRates(rate_grid, ledgerTrades['currency'], ledgerTrades['hourly'])
+    combined_df = ledgerTrades.assign(reference_at_date=sources, average_price_per_usd=prices)
+
+    #### calculate the usd_volumne per trade
+    combined_df['usd_volume'] = combined_df['balance_delta'] * combined_df['average_price_per_usd']
+
+    return combined_df
+
+##############################################################################################################################################
+#### priceLedgerTrades #######################################################################################################################
+##############################################################################################################################################
+
+'''
+priceLedgerTrades - The hourly average rate above misses any trade made in an hour with no rate snapshot for its currency (the usd_volume
+                    silently comes through as NaN) and the merge has to hash the hour + currency keys for every ledger leg. Following the
+                    assignment notes (use the closest available rate), the ledger legs are instead priced with a sorted as-of join per
+                    currency (pd.merge_asof with by='currency') - a single pass over the legs and the rate snapshots, both sorted by time.
+
+                    The pricing method can be:
+                    ~nearest - the closest rate snapshot before or after the transaction, within the tolerance
+                    ~previous - the latest rate snapshot at or before the transaction, within the tolerance
+                    ~interpolate - linear interpolation between the snapshots either side of the transaction, falling back to the one
+                                   snapshot that is within the tolerance when only one side is available
+                    ~hourly - the original hourly average rate (mapUsdVolume) - the default, as the figures quoted in the analysis
+                              of the dashboard were worked out with it
+                    ~hourly_ffill - the hourly average rate, carried forward over hours with no rate for the currency
+
+                    Along with the combined_df the function returns a pricing report counting the legs that were priced directly from a
+                    snapshot, priced by interpolation or left unpriced (no snapshot within the tolerance).
+
+sortedRates - rate snapshots sorted by time (and for the hourly methods, the rate grid) - prepared once so each chunk of a streamed
+              ledger can be priced against them. Given the path of the rates file, the rate grid is loaded from (or saved to) disk.
+'''
+
+PRICING_METHODS = ['nearest', 'previous', 'interpolate', 'hourly', 'hourly_ffill']
+RATE_TOLERANCE = '1h'
+
+
+def sortedRates(rates, method='hourly', rates_path=None):
+
+    if method in GRID_FILLS:
+        if rates_path is None:
+            return buildRateGrid(hourlyAverageRates(rates), GRID_FILLS[method])
+        return loadRateGrid(rates_path, lambda: hourlyAverageRates(rates), GRID_FILLS[method])
+
+    rates = rates[['reference_at_date', 'currency', 'average_price_per_usd']].dropna()
+
+    return rates.sort_values('reference_at_date', kind='stable')
+
+
+def pricingReport(combined_df, interpolated=0):
+    priced = int(combined_df['average_price_per_usd'].notna().sum())
+    return {'priced': priced - interpolated, 'interpolated': interpolated, 'unpriced': len(combined_df) - priced}
+
+
+@instrumented()
+def priceLedgerTrades(ledgerTrades, rates_sorted, method='hourly', tolerance=RATE_TOLERANCE):
+
+    if method not in PRICING_METHODS:
+        raise ValueError(f"pricing method must be one of {PRICING_METHODS}, got '{method}'")
+
+    if method in GRID_FILLS:
+        combined_df = mapUsdVolume(ledgerTrades, rates_sorted)
+        return combined_df, pricingReport(combined_df)
+
+    tolerance = pd.Timedelta(tolerance)
+    legs = ledgerTrades.sort_values('timestamp_at_date', kind='stable')
+
+    #### match the rate currencies to the ledger's categories so merge_asof can group on them
+    rates_sorted = rates_sorted.copy()
+    if isinstance(legs['currency'].dtype, pd.CategoricalDtype):
+        rates_sorted['currency'] = pd.Categorical(rates_sorted['currency'], categories=legs['currency'].cat.categories)
+    elif isinstance(rates_sorted['currency'].dtype, pd.CategoricalDtype):
+        rates_sorted['currency'] = rates_sorted['currency'].astype(legs['currency'].dtype)
+
+    def asof(direction, suffix):
+        matched = pd.merge_asof(
+            legs[['timestamp_at_date', 'currency']],
+            rates_sorted,
+            left_on='timestamp_at_date',
+            right_on='reference_at_date',
+            by='currency',
+            direction=direction,
+            tolerance=tolerance
+        )
+        return matched[['reference_at_date', 'average_price_per_usd']].add_suffix(suffix).set_index(legs.index)
+
+    if method in ('nearest', 'previous'):
+        matched = asof('nearest' if method == 'nearest' else 'backward', '')
+        combined_df = legs.join(matched)
+        interpolated = 0
+    else:
+        matched = asof('backward', '_prev').join(asof('forward', '_next'))
+        both = matched['average_price_per_usd_prev'].notna() & matched['average_price_per_usd_next'].notna()
+        between = both & (matched['reference_at_date_next'] > matched['reference_at_date_prev'])
+
+        #### linear weight of the transaction time between the two snapshots (0 where there is nothing to interpolate)
+        span = (matched['reference_at_date_next'] - matched['reference_at_date_prev']).where(between)
+        weight = ((legs['timestamp_at_date'] - matched['reference_at_date_prev']) / span).fillna(0)
+
+        price = matched['average_price_per_usd_prev'] + weight * (matched['average_price_per_usd_next'] - matched['average_price_per_usd_prev'])
+        price = price.where(both, matched['average_price_per_usd_prev'].fillna(matched['average_price_per_usd_next']))
+
+        combined_df = legs.copy()
+        combined_df['reference_at_date'] = matched['reference_at_date_prev'].fillna(matched['reference_at_date_next'])
+        combined_df['average_price_per_usd'] = price
+        interpolated = int(between.sum())
+
+    #### calculate the usd_volumne per trade
+    combined_df['usd_volume'] = combined_df['balance_delta'] * combined_df['average_price_per_usd']
+
+    return combined_df, pricingReport(combined_df, interpolated)
+
+##############################################################################################################################################
+#### assignCustomerStatus ####################################################################################################################
+##############################################################################################################################################
+
+'''
+assignCustomerStatus - Next I had to work out the transacting segment for each customer for each month - ensuring that clients received only
+                       one status per month. We were given 4 client status to map nemely: New, Returning, Churned and Ractivated. Since we were
+                       only given 3 months worth of data (Jan-2020 to March-2020), I made the assumption the clients trading in first month would
+                       all be classified as returning - without December-2019 data, it was not possible to identify New, Churned or Reactivated
+                       clients and as such, I made the assumption that all clients traded before and were returning (Luno was established in 2013).
+
+                       The statuses are worked out for every month in the data by the cohort engine (cohortEngine.py) from a user x month
+                       activity matrix built once from combined_df, and mapped back onto each row by a direct lookup into the status matrix.
+
+                       The function returns the combined_df with the status mapped along with the cohorts, from which the churned customers
+                       are added back later on.
+'''
+
+@instrumented()
+def assignCustomerStatus(combined_df):
+
+    cohorts = buildCohorts(combined_df[['user_id', 'year_month']])
+    combined_df['status'] = cohortStatus(cohorts, combined_df)
+
+    #### cleaned dataframe to have ONLY the required columns for our analysis (timestamp_at kept as a UTC datetime)
+    combined_df = combined_df[['timestamp_at_date', 'year_month', 'day', 'hour', 'foreign_id', 'user_id', 'status', 'usd_volume', 'market_pair']]
+    combined_df = combined_df.rename(columns={'timestamp_at_date': 'timestamp_at'})
+
+    return combined_df, cohorts
+
+##############################################################################################################################################
+#### tradeVolumes ############################################################################################################################
+##############################################################################################################################################
+
+'''
+tradeVolumes - Finally, since each trade had both a debit and a credit amount, the resulting dataframe produced a positive and negative amount
+               for the same trade come through in the usd_volume column.
+
+               I could have dropped the negative values but picked up that there were some trades that had more than one leg - so to be safe, I
+               grouped trades and calculated the |absolute| mean usd volume per trade.
+
+               This is done in a single groupby over the trade legs with built-in reductions - the absolute usd volume is worked out once for
+               all legs, then each trade takes the mean of it along with the details (timestamp, month, day, hour, user, status, market-pair)
+               of its earliest leg. The result is one row per trade (ordered by foreign_id), so there is nothing to merge back or de-duplicate.
+'''
+
+TRADE_DETAIL_COLUMNS = ['timestamp_at', 'year_month', 'day', 'hour', 'user_id', 'status', 'market_pair']
+
+
+@instrumented()
+def tradeVolumes(combined_df):
+
+    legs = combined_df[['foreign_id'] + TRADE_DETAIL_COLUMNS].copy()
+    legs['abs_volume'] = combined_df['usd_volume'].abs()
+
+    #### the legs come out of the pricing stage in time order - only sort if they don't, so 'first' is the earliest leg
+    if not legs['timestamp_at'].is_monotonic_increasing:
+        legs = legs.sort_values('timestamp_at', kind='stable')
+
+    aggregations = {column: (column, 'first') for column in TRADE_DETAIL_COLUMNS}
+    aggregations['usd_volume'] = ('abs_volume', 'mean')
+
+    users_combined = legs.groupby('foreign_id', observed=True).agg(**aggregations).reset_index(drop=True)
+
+    return users_combined
+
+##############################################################################################################################################
+#### addChurnedCustomers #####################################################################################################################
+##############################################################################################################################################
+
+'''
+addChurnedCustomers - Next for completeness, I wanted to add back the customers that were identified as churned in each month.
+                      These customers would not have traded in these months and so would have had a usd_volume amout of zero BUT
+                      I want to included them so we could keep track and see the Churned clients.
+
+                      The churned rows for every month are built in one go from the cohorts (user_id and year_month of each Churned
+                      user-month) with the same column types as the trades - timestamp_at, day, hour and market_pair are left empty
+                      (NaT/NA) rather than filled with '-', so the timestamp stays a datetime and day/hour stay integers. The trades
+                      and churned rows are then joined with a single concat.
+
+                      The updated_df was then used as the foundational dataframe and basis from which further analysis was done.
+'''
+
+@instrumented()
+def addChurnedCustomers(users_combined, churned):
+
+    #### trades in time order, year_month as a string to make it easier to analyse and work with
+    trades_df = users_combined.sort_values('timestamp_at', kind='stable')
+    trades_df['year_month'] = trades_df['year_month'].astype(str)
+    trades_df['day'] = trades_df['day'].astype('Int64')
+    trades_df['hour'] = trades_df['hour'].astype('Int64')
+
+    churned_df = pd.DataFrame({
+        'timestamp_at': pd.Series(pd.NaT, index=churned.index, dtype=trades_df['timestamp_at'].dtype),
+        'year_month': churned['year_month'].astype(str),
+        'day': pd.Series(pd.NA, index=churned.index, dtype='Int64'),
+        'hour': pd.Series(pd.NA, index=churned.index, dtype='Int64'),
+        'user_id': churned['user_id'],
+        'status': 'Churned',
+        'market_pair': pd.Series(pd.NA, index=churned.index, dtype=trades_df['market_pair'].dtype),
+        'usd_volume': 0.0,
+    })
+
+    updated_df = pd.concat([trades_df, churned_df[trades_df.columns]], ignore_index=True)
+
+    return updated_df
+
+##############################################################################################################################################
+#### buildAggregates #########################################################################################################################
+##############################################################################################################################################
+
+'''
+buildAggregates - The groupings below do not depend on any of the sidebar inputs, so they are worked out once along with the rest of the
+                  pipeline. updated_df is grouped once into the aggregate cube (aggregateCube.py) and every grouping is rolled up from
+                  the cube rather than from the rows. main.py then only slices them for the selected month | market-pair | status | client.
+
+                  ~cube - trades, priced trades and usd volume per year_month, day, hour, market_pair, status and user_id
+                  ~monthly_pairs_df - grouped by market_pair + year_month & aggregated by usd_volume
+                  ~status_sums - grouped by client status + market_pair & aggregated by usd_volume
+                  ~client_sums - grouped by user_id + market_pair & aggregated by usd_volume
+                  ~client_pairs_count - number of clients that only traded 1 market_pair, 2 market_pairs, etc...
+                  ~clients_combined_avg - each clients average monthly volume along with the average monthly volume and the
+                                          average monthly volume for that months client status
+                  ~monthly_hourly_sums | monthly_daily_sums - trades and usd volume per hour | day for every month
+'''
+
+@instrumented()
+def buildAggregates(updated_df):
+
+    cube = buildCube(updated_df)
+
+    aggregates = {'cube': cube}
+    aggregates.update(cubeViews(cube))
+
+    return aggregates
+
+##############################################################################################################################################
+#### loadDataset #############################################################################################################################
+##############################################################################################################################################
+
+'''
+loadDataset - Runs the full pipeline for the 4 file paths and returns a dictionary of the dataframes used by the app. The work is done in
+              _runPipeline which is memoized (lru_cache) on the file fingerprints, so calling loadDataset again with unchanged files only
+              costs 4 os.stat calls. The returned dataframes are shared between calls and should be treated as read-only by the caller.
+              With snapshots=True (default) the cleaned files are read from their columnar snapshots rather than parsed from the csv files.
+              pricing and tolerance are passed on to priceLedgerTrades and the pricing report is returned under 'pricing_report'.
+              The ids in the row level ledger dataframes (ledgerAccounts, ledgerTrades, combined_df) are the integer codes - they can
+              be decoded with the dictionaries returned under 'id_dictionaries' (idEncoding.decodeTable).
+'''
+
+@lru_cache(maxsize=2)
+def _runPipeline(accounts_fp, ledger_fp, trades_fp, rates_fp, snapshots=True, pricing='hourly', tolerance=RATE_TOLERANCE):
+
+    if snapshots:
+        accounts, ledger, trades, rates = loadCleanFiles(accounts_fp[0], ledger_fp[0], trades_fp[0], rates_fp[0])
+    else:
+        accounts, ledger, trades, rates = loadCsvFiles(accounts_fp[0], ledger_fp[0], trades_fp[0], rates_fp[0])
+
+        ledger = cleanLedger(ledger)
+        trades = cleanTrades(trades)
+        rates = cleanRates(rates)
+
+    accounts, ledger, trades, dictionaries = encodeIds(accounts, ledger, trades)
+
+    ledgerAccounts = mergeLedgerAccounts(ledger, accounts)
+    ledgerTrades = mergeLedgerTrades(ledgerAccounts, trades)
+    combined_df, pricing_report = priceLedgerTrades(ledgerTrades, sortedRates(rates, pricing, rates_fp[0] if snapshots else None), pricing, tolerance)
+
+    combined_df, cohorts = assignCustomerStatus(combined_df)
+    users_combined = tradeVolumes(combined_df)
+    updated_df = addChurnedCustomers(users_combined, churnedCustomers(cohorts))
+    users_combined, updated_df, cohorts = decodeUsers(users_combined, updated_df, cohorts, dictionaries)
+
+    #### final dataframe for submission
+    final_df = updated_df[['timestamp_at', 'year_month', 'user_id', 'status', 'market_pair', 'usd_volume']]
+
+    dataset = {
+        'ledgerAccounts': ledgerAccounts,
+        'ledgerTrades': ledgerTrades,
+        'combined_df': combined_df,
+        'users_combined': users_combined,
+        'updated_df': updated_df,
+        'final_df': final_df,
+        'pricing_report': pricing_report,
+        'cohorts': cohorts,
+        'id_dictionaries': dictionaries,
+    }
+    dataset.update(buildAggregates(updated_df))
+
+    return dataset
+
+
+@instrumented()
+def loadDataset(accounts_path, ledger_path, trades_path, rates_path, snapshots=True, pricing='hourly', tolerance=RATE_TOLERANCE):
+    return _runPipeline(
+        fileFingerprint(accounts_path),
+        fileFingerprint(ledger_path),
+        fileFingerprint(trades_path),
+        fileFingerprint(rates_path),
+        snapshots,
+        pricing,
+        tolerance
+    )
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,421 @@
+#### Import Python Libraries #################################################################################################################
+
+from functools import lru_cache
+import pandas as pd
+
+from cohortEngine import buildCohorts
+from aggregateCube import CUBE_DIMENSIONS, cubeViews
+from instrumentation import instrumented, stage
+from idEncoding import buildDictionaries
+from dataPipeline import fileFingerprint, PRICING_METHODS, RATE_TOLERANCE, addChurnedCustomers
+
+##############################################################################################################################################
+#### DuckDB Query Backend ####################################################################################################################
+##############################################################################################################################################
+
+'''
+The pandas pipeline (dataPipeline.py) is eager - every stage materialises a full, wide intermediate dataframe (ledgerAccounts, ledgerTrades,
+combined_df) before the next one starts, on a single thread. The functions below express the same stages as SQL run by DuckDB, an
+in-process, multithreaded query engine, so the whole pipeline is one lazy query plan:
+
+    ~only the columns that are needed are read from the csv files (projection pushdown into DuckDB's csv reader)
+    ~the cleaning, joins, de-duplication and pricing are views, planned and run together across all cores - the first table written is
+     the narrow table of priced trade legs (trade id, time, user, market_pair, usd volume), which the (much smaller) activity, status
+     and trade tables are worked out from
+    ~the status assignment, collapsing the legs into trades and the aggregate cube are GROUP BY/window queries over that table
+
+The results are brought back to pandas as the same dataset dictionary as dataPipeline.loadDataset (apart from the row level ledger
+dataframes, which are never materialised) and the dashboard views are rolled up from the cube with the same aggregateCube.cubeViews.
+The pandas pipeline stays the reference implementation - the queries follow it step by step:
+
+    ~the left joins followed by dropna(user_id | market_pair) are inner joins, and the drop_duplicates after the joins is a DISTINCT over
+     the rows of each file (two joined rows are only equal when the ledger, account and trade rows they came from are equal)
+    ~nearest | previous | interpolate pricing are DuckDB ASOF joins per currency with the same rules as pd.merge_asof - the last of
+     several snapshots at the same time is used looking backward and the first looking forward, a tie in distance goes to the earlier
+     snapshot and a snapshot further away than the tolerance is not used
+    ~hourly pricing rounds the transaction time to the hour half-to-even (same as pandas' dt.round) and joins the hourly average rates
+     (hourly_ffill as-of joins the last hour with a rate, up to the last hour of the rates - same as the forward filled rate grid)
+    ~the statuses are the cohort rules (cohortEngine.py) written as window functions over the (user, month) activity
+    ~each trade takes the details of its earliest leg - legs at exactly the same time are taken in ledger file order
+
+DuckDB is an optional dependency (pip install duckdb) - it is only imported when this backend is used (pipeline_backend in main.py).
+
+
+Inventory of Functions:
+
+~connect - New in-memory DuckDB connection, set to UTC
+
+~createLegViews | priceLegs - Views for the cleaned files and their joins | the table of priced trade legs
+
+~idDictionaries - The users | accounts dictionaries of the files (the same as the pandas pipeline's - idEncoding.py)
+
+~statusQueries | tradeQueries - Queries for the statuses and churned customers | the trades (users_combined) and aggregate cube
+
+~runDuckdbPipeline - Runs the pipeline for the 4 files and returns the dataset dictionary
+
+~loadDatasetDuckdb - runDuckdbPipeline memoized on the file fingerprints (same as dataPipeline.loadDataset)
+
+'''
+
+#### columns read from each csv file (everything else is left unread)
+CSV_COLUMNS = {
+    'accounts': ['id', 'user_id', 'currency'],
+    'ledger': ['id', 'account_id', 'timestamp_at', 'balance_delta', 'foreign_id'],
+    'trades': ['id', 'created_at', 'base_currency', 'counter_currency', 'bid_user_id', 'ask_user_id', 'volume'],
+    'rates': ['currency', 'reference_at', 'average_price_per_usd'],
+}
+
+##############################################################################################################################################
+#### connect | createLegViews | priceLegs | idDictionaries ###################################################################################
+##############################################################################################################################################
+
+'''
+readCsv - The csv file as a subquery of its CSV_COLUMNS. The path is written into the query as a quoted string literal (DuckDB doesn't
+          take bound parameters in a view), with any quote in it doubled.
+
+createLegViews - Registers the cleaned files as views (only CSV_COLUMNS are read, timestamps parsed as UTC, year_month/day/hour worked
+                 out) and the joined legs - the ledger joined to the accounts and trades, keeping only trading activity. row_id is the
+                 position of the row in the ledger file, used to break ties between legs at the same time. The trades' columns are
+                 all read (not only the market_pair ones) so duplicate rows are dropped the same way as the pandas drop_duplicates.
+
+priceLegs - Writes the table of priced legs for the pricing method (see the description above), along with the pricing report counts.
+            ts is the transaction time in microseconds since the epoch (UTC), which keeps the as-of joins and interpolation on integers.
+
+idDictionaries - The ids stay as hashes in the queries (DuckDB hashes them on all cores), but the dictionaries are built from the distinct
+                 ids of the files the same way as the pandas pipeline builds them from the categorical snapshots - so the user_id
+                 categoricals have the same categories, in the same order, as the pandas pipeline's and the dataset carries the same
+                 'id_dictionaries'.
+'''
+
+def connect():
+
+    try:
+        import duckdb
+    except ImportError as error:
+        raise ImportError("pipeline_backend 'duckdb' needs the duckdb package - pip install duckdb") from error
+
+    con = duckdb.connect()
+    con.execute("SET TimeZone = 'UTC'")
+
+    return con
+
+
+def sqlString(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def readCsv(path, table):
+    columns = ', '.join(CSV_COLUMNS[table])
+    return f"(SELECT {columns} FROM read_csv({sqlString(path)}, header = true, all_varchar = true))"
+
+
+def createLegViews(con, accounts_path, ledger_path, trades_path, rates_path):
+
+    con.execute(f"""
+        CREATE OR REPLACE TEMP VIEW ledger AS
+        SELECT CAST(id AS BIGINT) AS id, account_id, CAST(balance_delta AS DOUBLE) AS balance_delta, CAST(foreign_id AS BIGINT) AS foreign_id,
+            epoch_us(CAST(timestamp_at AS TIMESTAMPTZ)) AS ts, row_id
+        FROM (
+            SELECT id, account_id, timestamp_at, balance_delta, foreign_id, min(row_id) AS row_id
+            FROM (SELECT *, row_number() OVER () AS row_id FROM {readCsv(ledger_path, 'ledger')})
+            GROUP BY ALL
+        )
+    """)
+
+    con.execute(f"CREATE OR REPLACE TEMP VIEW accounts AS SELECT DISTINCT * FROM {readCsv(accounts_path, 'accounts')}")
+
+    con.execute(f"""
+        CREATE OR REPLACE TEMP VIEW trades AS
+        SELECT DISTINCT id, created_at, base_currency, counter_currency, bid_user_id, ask_user_id, volume,
+            base_currency || '/' || counter_currency AS market_pair
+        FROM {readCsv(trades_path, 'trades')}
+    """)
+
+    con.execute(f"""
+        CREATE OR REPLACE TEMP VIEW rates AS
+        SELECT currency, epoch_us(CAST(reference_at AS TIMESTAMPTZ)) AS ref, CAST(average_price_per_usd AS DOUBLE) AS price,
+            row_number() OVER () AS rate_id
+        FROM {readCsv(rates_path, 'rates')}
+    """)
+
+    con.execute("""
+        CREATE OR REPLACE TEMP VIEW legs AS
+        SELECT l.foreign_id, l.ts, l.row_id, l.balance_delta, a.user_id, a.currency, t.market_pair
+        FROM ledger l
+        JOIN accounts a ON l.account_id = a.id
+        JOIN trades t ON l.foreign_id = CAST(t.id AS BIGINT)
+        WHERE a.user_id IS NOT NULL AND t.market_pair IS NOT NULL
+    """)
+
+
+def priceLegs(con, pricing='hourly', tolerance=RATE_TOLERANCE):
+
+    if pricing not in PRICING_METHODS:
+        raise ValueError(f"pricing method must be one of {PRICING_METHODS}, got '{pricing}'")
+
+    tolerance_us = int(pd.Timedelta(tolerance) / pd.Timedelta(microseconds=1))
+    hour_us = 3600 * 10 ** 6
+
+    if pricing in ('hourly', 'hourly_ffill'):
+        #### hourly average per currency (floor of the snapshot time), looked up from the leg time rounded half-to-even to the hour
+        con.execute(f"""
+            CREATE OR REPLACE TEMP VIEW hourly_rates AS
+            SELECT currency, (ref // {hour_us}) * {hour_us} AS hourly, avg(price) AS price FROM rates WHERE ref IS NOT NULL GROUP BY ALL
+        """)
+        hourly_legs = f"""
+            SELECT *, (ts // {hour_us} + CASE WHEN ts % {hour_us} > {hour_us // 2} THEN 1
+                                             WHEN ts % {hour_us} = {hour_us // 2} THEN (ts // {hour_us}) % 2 ELSE 0 END) * {hour_us} AS hourly
+            FROM legs
+        """
+
+        if pricing == 'hourly':
+            price = f"""
+                SELECT l.* EXCLUDE (hourly), h.price, 0 AS interpolated
+                FROM ({hourly_legs}) l LEFT JOIN hourly_rates h ON l.currency = h.currency AND l.hourly = h.hourly
+            """
+        else:
+            #### last hour with a rate at or before the leg's hour, within the hours of the rate grid (rateGrid.py)
+            price = f"""
+                SELECT l.* EXCLUDE (hourly), CASE WHEN l.hourly <= (SELECT max(hourly) FROM hourly_rates) THEN h.price END AS price,
+                    0 AS interpolated
+                FROM ({hourly_legs}) l
+                ASOF LEFT JOIN (SELECT * FROM hourly_rates WHERE price IS NOT NULL) h ON l.currency = h.currency AND l.hourly >= h.hourly
+            """
+    else:
+        #### the last snapshot at each time for backward matches, the first for forward matches (same as merge_asof)
+        con.execute("""
+            CREATE OR REPLACE TEMP VIEW rates_last AS
+            SELECT currency, ref, arg_max(price, rate_id) AS price FROM rates WHERE ref IS NOT NULL AND price IS NOT NULL GROUP BY ALL
+        """)
+        con.execute("""
+            CREATE OR REPLACE TEMP VIEW rates_first AS
+            SELECT currency, ref, arg_min(price, rate_id) AS price FROM rates WHERE ref IS NOT NULL AND price IS NOT NULL GROUP BY ALL
+        """)
+
+        matched = f"""
+            SELECT l.*,
+                CASE WHEN l.ts - b.ref <= {tolerance_us} THEN b.ref END AS prev_ref,
+                CASE WHEN l.ts - b.ref <= {tolerance_us} THEN b.price END AS prev_price,
+                CASE WHEN f.ref - l.ts <= {tolerance_us} THEN f.ref END AS next_ref,
+                CASE WHEN f.ref - l.ts <= {tolerance_us} THEN f.price END AS next_price
+            FROM legs l
+            ASOF LEFT JOIN rates_last b ON l.currency = b.currency AND l.ts >= b.ref
+            ASOF LEFT JOIN rates_first f ON l.currency = f.currency AND l.ts <= f.ref
+        """
+
+        if pricing == 'previous':
+            price = f"SELECT * EXCLUDE (prev_ref, prev_price, next_ref, next_price), prev_price AS price, 0 AS interpolated FROM ({matched})"
+        elif pricing == 'nearest':
+            price = f"""
+                SELECT * EXCLUDE (prev_ref, prev_price, next_ref, next_price),
+                    CASE WHEN prev_ref IS NULL THEN next_price
+                         WHEN next_ref IS NULL THEN prev_price
+                         WHEN ts - prev_ref <= next_ref - ts THEN prev_price
+                         ELSE next_price END AS price,
+                    0 AS interpolated
+                FROM ({matched})
+            """
+        else:
+            price = f"""
+                SELECT * EXCLUDE (prev_ref, prev_price, next_ref, next_price),
+                    CASE WHEN prev_price IS NOT NULL AND next_price IS NOT NULL
+                         THEN prev_price + (CASE WHEN next_ref > prev_ref THEN CAST(ts - prev_ref AS DOUBLE) / (next_ref - prev_ref) ELSE 0 END)
+                                           * (next_price - prev_price)
+                         ELSE coalesce(prev_price, next_price) END AS price,
+                    CASE WHEN prev_price IS NOT NULL AND next_price IS NOT NULL AND next_ref > prev_ref THEN 1 ELSE 0 END AS interpolated
+                FROM ({matched})
+            """
+
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE priced_legs AS
+        SELECT foreign_id, ts, row_id, user_id, market_pair, balance_delta * price AS usd_volume, price IS NOT NULL AS priced, interpolated,
+            strftime(make_timestamp(ts), '%Y-%m') AS year_month
+        FROM ({price})
+    """)
+
+    priced, interpolated, legs = con.execute("SELECT count(*) FILTER (priced), sum(interpolated), count(*) FROM priced_legs").fetchone()
+    interpolated = int(interpolated or 0)
+
+    return {'priced': int(priced) - interpolated, 'interpolated': interpolated, 'unpriced': int(legs - priced)}
+
+
+def idDictionaries(con):
+
+    distinct = lambda column, view: pd.Series(pd.Categorical(con.execute(f"SELECT DISTINCT {column} FROM {view}").df()[column].dropna()))
+
+    return buildDictionaries(
+        {'id': distinct('id', 'accounts'), 'user_id': distinct('user_id', 'accounts')},
+        {'bid_user_id': distinct('bid_user_id', 'trades'), 'ask_user_id': distinct('ask_user_id', 'trades')},
+    )
+
+##############################################################################################################################################
+#### statusQueries | tradeQueries ############################################################################################################
+##############################################################################################################################################
+
+'''
+statusQueries - The (user, month) activity of the priced legs and the status of every active user-month (cohortEngine.statusMatrix):
+                ~the first month of the data - Returning
+                ~the user's first month - New
+                ~active the month before - Returning, otherwise Reactivated
+                plus a Churned row for the month after each active month in which the user was not active (up to the last month).
+                Months are counted as year * 12 + month so the month before/after is -1/+1.
+
+tradeQueries - users_combined (one row per trade, ordered by foreign_id, with the details and status of its earliest leg and the mean
+               absolute usd volume of its legs) and the aggregate cube over the trades and churned rows (aggregateCube.buildCube).
+'''
+
+def statusQueries(con):
+
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE activity AS
+        SELECT DISTINCT user_id, year_month, CAST(left(year_month, 4) AS INTEGER) * 12 + CAST(right(year_month, 2) AS INTEGER) AS month_number
+        FROM priced_legs
+    """)
+
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE statuses AS
+        WITH bounds AS (SELECT min(month_number) AS first_month, max(month_number) AS last_month FROM activity),
+        ordered AS (
+            SELECT *,
+                lag(month_number) OVER (PARTITION BY user_id ORDER BY month_number) AS previous_month,
+                lead(month_number) OVER (PARTITION BY user_id ORDER BY month_number) AS next_month
+            FROM activity
+        )
+        SELECT user_id, month_number,
+            CASE WHEN month_number = first_month THEN 'Returning'
+                 WHEN previous_month IS NULL THEN 'New'
+                 WHEN previous_month = month_number - 1 THEN 'Returning'
+                 ELSE 'Reactivated' END AS status
+        FROM ordered, bounds
+        UNION ALL
+        SELECT user_id, month_number + 1, 'Churned'
+        FROM ordered, bounds
+        WHERE month_number < last_month AND (next_month IS NULL OR next_month > month_number + 1)
+    """)
+
+    churned = con.execute("""
+        SELECT user_id, printf('%04d-%02d', (month_number - 1) // 12, (month_number - 1) % 12 + 1) AS year_month
+        FROM statuses WHERE status = 'Churned' ORDER BY user_id, month_number
+    """).df()
+
+    return con.execute("SELECT user_id, year_month FROM activity").df(), churned
+
+
+def tradeQueries(con):
+
+    con.execute("""
+        CREATE OR REPLACE TEMP TABLE trade_rows AS
+        SELECT t.*, s.status
+        FROM (
+            SELECT foreign_id,
+                first(ts ORDER BY ts, row_id) AS ts,
+                first(year_month ORDER BY ts, row_id) AS year_month,
+                first(user_id ORDER BY ts, row_id) AS user_id,
+                first(market_pair ORDER BY ts, row_id) AS market_pair,
+                avg(abs(usd_volume)) AS usd_volume
+            FROM priced_legs
+            GROUP BY foreign_id
+        ) t
+        JOIN statuses s ON s.user_id = t.user_id AND s.status != 'Churned'
+            AND s.month_number = CAST(left(t.year_month, 4) AS INTEGER) * 12 + CAST(right(t.year_month, 2) AS INTEGER)
+    """)
+
+    users_combined = con.execute("""
+        SELECT make_timestamp(ts) AS timestamp_at, year_month, CAST(day(make_timestamp(ts)) AS INTEGER) AS day,
+            CAST(hour(make_timestamp(ts)) AS INTEGER) AS hour, user_id, status, market_pair, usd_volume
+        FROM trade_rows ORDER BY foreign_id
+    """).df()
+
+    cube = con.execute("""
+        SELECT year_month, day, hour, market_pair, status, user_id, count(*) AS trades, count(usd_volume) AS priced,
+            coalesce(sum(usd_volume), 0) AS usd_volume
+        FROM (
+            SELECT year_month, day(make_timestamp(ts)) AS day, hour(make_timestamp(ts)) AS hour, market_pair, status, user_id, usd_volume
+            FROM trade_rows
+            UNION ALL
+            SELECT printf('%04d-%02d', (month_number - 1) // 12, (month_number - 1) % 12 + 1), NULL, NULL, NULL, status, user_id, 0.0
+            FROM statuses WHERE status = 'Churned'
+        )
+        GROUP BY ALL
+    """).df()
+
+    return users_combined, cube
+
+##############################################################################################################################################
+#### runDuckdbPipeline | loadDatasetDuckdb ###################################################################################################
+##############################################################################################################################################
+
+'''
+runDuckdbPipeline - Runs the queries above and converts the results to the same dtypes as the pandas pipeline (UTC timestamps, Period
+                    year_month in users_combined, Int64 day/hour and a categorical user_id over the user dictionary in updated_df
+                    and the cube, with the cube's rows in the pandas groupby order), then adds the churned rows
+                    (dataPipeline.addChurnedCustomers), builds the cohorts from the activity and rolls the views up from the cube - so
+                    every dataframe of the dataset equals the pandas pipeline's. Each query is recorded as a stage when instrumentation
+                    is on.
+
+loadDatasetDuckdb - runDuckdbPipeline memoized on the file fingerprints, so reruns of the app with unchanged files cost 4 os.stat calls.
+'''
+
+@instrumented()
+def runDuckdbPipeline(accounts_path, ledger_path, trades_path, rates_path, pricing='hourly', tolerance=RATE_TOLERANCE):
+
+    con = connect()
+
+    with stage('duckdb_price_legs'):
+        createLegViews(con, accounts_path, ledger_path, trades_path, rates_path)
+        dictionaries = idDictionaries(con)
+        pricing_report = priceLegs(con, pricing, tolerance)
+
+    with stage('duckdb_statuses'):
+        activity, churned = statusQueries(con)
+
+    with stage('duckdb_trades_cube'):
+        users_combined, cube = tradeQueries(con)
+
+    con.close()
+
+    users = pd.CategoricalDtype(dictionaries.users)
+    users_combined['timestamp_at'] = users_combined['timestamp_at'].dt.tz_localize('UTC')
+    users_combined['year_month'] = pd.PeriodIndex(users_combined['year_month'], freq='M')
+    users_combined['user_id'] = users_combined['user_id'].astype(users)
+    churned['user_id'] = churned['user_id'].astype(users)
+
+    #### rows in the order of the pandas groupby (sorted on the dimensions, missing day/hour/market_pair last)
+    cube = cube.astype({'day': 'Int64', 'hour': 'Int64', 'trades': 'int64', 'priced': 'int64', 'user_id': users})
+    cube = cube.sort_values(CUBE_DIMENSIONS, kind='stable', na_position='last', ignore_index=True)
+
+    updated_df = addChurnedCustomers(users_combined, churned)
+    final_df = updated_df[['timestamp_at', 'year_month', 'user_id', 'status', 'market_pair', 'usd_volume']]
+
+    dataset = {
+        'users_combined': users_combined,
+        'updated_df': updated_df,
+        'final_df': final_df,
+        'pricing_report': pricing_report,
+        'cohorts': buildCohorts(activity),
+        'id_dictionaries': dictionaries,
+        'cube': cube,
+    }
+    dataset.update(cubeViews(cube))
+
+    return dataset
+
+
+@lru_cache(maxsize=2)
+def _runDuckdbCached(accounts_fp, ledger_fp, trades_fp, rates_fp, pricing, tolerance):
+    return runDuckdbPipeline(accounts_fp[0], ledger_fp[0], trades_fp[0], rates_fp[0], pricing, tolerance)
+
+
+@instrumented()
+def loadDatasetDuckdb(accounts_path, ledger_path, trades_path, rates_path, pricing='hourly', tolerance=RATE_TOLERANCE):
+    return _runDuckdbCached(
+        fileFingerprint(accounts_path),
+        fileFingerprint(ledger_path),
+        fileFingerprint(trades_path),
+        fileFingerprint(rates_path),
+        pricing,
+        tolerance
+    )
+
+##############################################################################################################################################
+##############################################################################################################################################
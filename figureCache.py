@@ -0,0 +1,117 @@
+#### Import Python Libraries #################################################################################################################
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+import pandas as pd
+
+##############################################################################################################################################
+#### Figure Cache Functions ##################################################################################################################
+##############################################################################################################################################
+
+'''
+Every rerun of the app (i.e. a sidebar click) used to rebuild all 12 plotly figures from scratch, even the ones whose inputs had not
+changed - graph 6 (client_pairs_count) for example does not depend on any of the sidebar inputs at all. The functions below keep the
+most recently built figures in a size bounded LRU cache, keyed on a fingerprint of the dataframe(s) passed to the graph function along
+with its other arguments. A graph function is only run again when its data or arguments change.
+
+The fingerprint is a hash of the dataframe's values (pandas' vectorised row hashes), column names and dtypes - the index is left out,
+since a filtered dataframe with the same rows draws the same figure whatever its index. Hashing a dataframe is far cheaper than building
+(and validating) a plotly figure from it, and the dataframes passed to the graphs are the small aggregated ones.
+
+Cached figures are shared between reruns and sessions, so they should be treated as read-only by the caller (st.plotly_chart does not
+modify the figure it is given).
+
+
+Inventory of Functions:
+
+~frameFingerprint - Hash of the values, columns and dtypes of a dataframe
+
+~argumentKey - Cache key for the arguments of a graph function call (dataframes replaced by their fingerprints)
+
+~cachedFigure - Decorator that memoizes a graph function in an LRU cache of at most maxsize figures
+
+'''
+
+FIGURE_CACHE_SIZE = 32
+
+##############################################################################################################################################
+#### frameFingerprint | argumentKey ##########################################################################################################
+##############################################################################################################################################
+
+def frameFingerprint(df):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((df.shape, list(df.columns), [str(dtype) for dtype in df.dtypes])).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def argumentKey(args, kwargs):
+
+    def keyOf(value):
+        if isinstance(value, pd.DataFrame):
+            return ('DataFrame', frameFingerprint(value))
+        if isinstance(value, pd.Series):
+            return ('Series', frameFingerprint(value.to_frame()))
+        return value
+
+    return tuple(keyOf(value) for value in args), tuple(sorted((name, keyOf(value)) for name, value in kwargs.items()))
+
+##############################################################################################################################################
+#### cachedFigure ############################################################################################################################
+##############################################################################################################################################
+
+'''
+cachedFigure - Decorator for the graph functions in plotlyGraphs.py. Returns the cached figure for the same data and arguments, otherwise
+               builds the figure, stores it and evicts the least recently used figure once there are more than maxsize. The cache is
+               shared by all the sessions of the app, so it is guarded by a lock. The hits, misses and current size are available
+               from the decorated function's cache_info() (same as functools.lru_cache) and cache_clear() empties the cache.
+'''
+
+def cachedFigure(maxsize=FIGURE_CACHE_SIZE):
+
+    def decorator(graphFunc):
+        figures = OrderedDict()
+        stats = {'hits': 0, 'misses': 0}
+        lock = threading.Lock()
+
+        @wraps(graphFunc)
+        def wrapper(*args, **kwargs):
+            key = argumentKey(args, kwargs)
+
+            with lock:
+                if key in figures:
+                    figures.move_to_end(key)
+                    stats['hits'] += 1
+                    return figures[key]
+
+            figure = graphFunc(*args, **kwargs)
+
+            with lock:
+                stats['misses'] += 1
+                figures[key] = figure
+                figures.move_to_end(key)
+                while len(figures) > maxsize:
+                    figures.popitem(last=False)
+
+            return figure
+
+        def cache_info():
+            with lock:
+                return {'hits': stats['hits'], 'misses': stats['misses'], 'maxsize': maxsize, 'currsize': len(figures)}
+
+        def cache_clear():
+            with lock:
+                figures.clear()
+                stats['hits'], stats['misses'] = 0, 0
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+
+        return wrapper
+
+    return decorator
+
+##############################################################################################################################################
+##############################################################################################################################################
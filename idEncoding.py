@@ -0,0 +1,131 @@
+#### Import Python Libraries #################################################################################################################
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+##############################################################################################################################################
+#### ID Encoding Functions ###################################################################################################################
+##############################################################################################################################################
+
+'''
+The user and account ids are 64 character hex hashes. Even stored as categoricals in the snapshots, every merge of the ledger with the
+accounts (and every drop_duplicates/groupby after it) ended up hashing the strings - the categories of the ledger's account_id and the
+accounts' id are different, so pandas falls back to comparing the strings themselves. The functions below swap the hashes for compact
+integer codes as soon as the files are loaded, so the joins, de-duplication, status lookups and groupbys all run on integers:
+
+    ~users - user_id (accounts), bid_user_id and ask_user_id (trades)
+    ~accounts - id (accounts) and account_id (ledger)
+
+Each kind of id has a dictionary - a pandas Index of the hashes, where a hash's code is its position - built from the accounts and trades
+files (the ledger only refers to accounts that are in the accounts file). An id that is not in the dictionary (e.g. a ledger row for an
+account that is not in the accounts file) gets a missing code, so it drops out of the joins exactly like it did before. The codes are
+stored as nullable Int32 (Int64 for more than 2 billion ids) so the left joins don't turn them into floats.
+
+Once the trades are worked out, the user ids are decoded back into a categorical over the dictionary (no hashing - the codes are used as
+they are), so the tables shown in the app and downloaded still show the hashes while their groupbys keep running on integer codes.
+
+
+Inventory of Functions:
+
+~buildDictionaries - The users | accounts dictionaries for a set of accounts and trades
+
+~encodeColumn | encodeTable - Hashes -> integer codes for a column | all of the id columns of a table
+
+~decodeColumn | decodeTable | decodeCohorts - Integer codes -> hashes (as a categorical) for a column | table | the cohorts' users
+
+'''
+
+#### the kind of id (dictionary) in each id column of the data files
+ID_COLUMNS = {
+    'accounts': {'id': 'accounts', 'user_id': 'users'},
+    'ledger': {'account_id': 'accounts'},
+    'trades': {'bid_user_id': 'users', 'ask_user_id': 'users'},
+}
+
+#### columns decoded back to the hashes once the trades are worked out
+DECODED_COLUMNS = {'user_id': 'users'}
+
+IdDictionaries = namedtuple('IdDictionaries', ['users', 'accounts'])
+
+##############################################################################################################################################
+#### buildDictionaries #######################################################################################################################
+##############################################################################################################################################
+
+'''
+buildDictionaries - The account dictionary holds every account id in the accounts file and the user dictionary every user id in the
+                    accounts and trades files. For the categorical snapshots only the categories are looked at (not every row), and the
+                    dictionaries come out the same every time the same files are loaded - so separate processes (luno_analysis.py)
+                    or chunks (streamingIngest.py) encode the ids with the same codes.
+'''
+
+def uniqueIds(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories.to_numpy()
+    return series.dropna().unique()
+
+
+def buildDictionaries(accounts, trades):
+
+    users = pd.unique(np.concatenate([uniqueIds(accounts['user_id']), uniqueIds(trades['bid_user_id']), uniqueIds(trades['ask_user_id'])]))
+    account_ids = pd.unique(uniqueIds(accounts['id']))
+
+    return IdDictionaries(pd.Index(users), pd.Index(account_ids))
+
+##############################################################################################################################################
+#### encodeColumn | encodeTable ##############################################################################################################
+##############################################################################################################################################
+
+'''
+encodeColumn - Looks up the code of every id in a column. For a categorical column only its categories are looked up in the dictionary
+               and the row codes are remapped with a numpy take, so the hashes in the rows are never hashed again.
+
+encodeTable - Returns a copy of a data file's dataframe ('accounts' | 'ledger' | 'trades') with its id columns encoded.
+'''
+
+def encodeColumn(series, dictionary):
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        mapping = np.append(dictionary.get_indexer(series.cat.categories), -1)
+        codes = mapping[series.cat.codes.to_numpy()]
+    else:
+        codes = dictionary.get_indexer(series)
+
+    dtype = np.int32 if len(dictionary) < np.iinfo(np.int32).max else np.int64
+
+    return pd.Series(pd.arrays.IntegerArray(codes.astype(dtype), codes < 0), index=series.index, name=series.name)
+
+
+def encodeTable(df, table, dictionaries):
+
+    return df.assign(**{column: encodeColumn(df[column], getattr(dictionaries, kind)) for column, kind in ID_COLUMNS[table].items()})
+
+##############################################################################################################################################
+#### decodeColumn | decodeTable | decodeCohorts ##############################################################################################
+##############################################################################################################################################
+
+'''
+decodeColumn - Integer codes -> a categorical over the dictionary (missing codes come back as NaN). The categorical's categories are the
+               dictionary itself, so the column holds the same integer codes and only looks like the hashes.
+
+decodeTable - Returns df with the given columns decoded (user_id by default).
+
+decodeCohorts - The cohorts with their users decoded back to the hashes (for cohortStatus lookups on decoded tables).
+'''
+
+def decodeColumn(series, dictionary):
+
+    codes = series.to_numpy(dtype=np.int64, na_value=-1)
+
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(dictionary)), index=series.index, name=series.name)
+
+
+def decodeTable(df, dictionaries, columns=DECODED_COLUMNS):
+    return df.assign(**{column: decodeColumn(df[column], getattr(dictionaries, kind)) for column, kind in columns.items()})
+
+
+def decodeCohorts(cohorts, dictionaries):
+    return cohorts._replace(users=pd.Index(dictionaries.users.take(cohorts.users.to_numpy(dtype=np.int64))))
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,503 @@
+#### Import Python Libraries #################################################################################################################
+
+import io
+import os
+import json
+import glob
+import hashlib
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from columnarCache import loadSnapshot, CATEGORICAL_COLUMNS
+from cohortEngine import buildCohorts, updateCohorts, cohortStatus, churnedCustomers
+from aggregateCube import CUBE_DIMENSIONS, CUBE_MEASURES, cubeViews
+from instrumentation import instrumented
+from idEncoding import buildDictionaries, encodeTable, decodeTable
+from dataPipeline import fileFingerprint, cleanLedger, cleanTrades, cleanRates, RATE_TOLERANCE, sortedRates, addChurnedCustomers
+from streamingIngest import TRADE_COLUMNS, foldLedgerChunk, combineTradeStates, rowHashes, seenRows
+
+##############################################################################################################################################
+#### Incremental (Append) Ingest Functions ###################################################################################################
+##############################################################################################################################################
+
+'''
+New ledger entries (with the trades, accounts and rates they need) arrive every month, but every other way of loading the data
+re-processes the whole history. The functions below keep the state of the pipeline on disk, in a .pipeline_state folder next to the
+ledger file, and on each refresh only read the ledger rows appended to the file since the last refresh. The state is split into one
+partition per month for each of its tables:
+
+    ~trades - one row per trade (foreign_id, the month of its earliest leg) - the details of its earliest leg, the sum and count of the
+              absolute usd volume of its legs (the same trade state as the streaming ingest) and its status
+    ~cube - the aggregate cube without the status dimension (trades, priced trades and usd volume per year_month, day, hour,
+            market_pair and user_id) - statuses can change when new months arrive, so they are looked up when the views are built
+    ~activity - the users active in the month, which the cohort matrix (cohortEngine.py) is built from
+    ~hashes - the sorted 64 bit hashes of the month's ledger rows (streamingIngest.rowHashes) - exact duplicate rows have the same
+              timestamp, so a duplicate of a row from an earlier refresh is caught by looking in the hashes of its own month only
+    ~meta - how many bytes of the ledger file have been processed, a hash of the last few kB of them (to check the file was only
+            appended to), the pricing settings, the pricing report so far and the generation each partition was written in
+
+A refresh joins, prices and folds only the new rows (streamingIngest.foldLedgerChunk, on integer coded ids - idEncoding.py) and touches
+only the partitions of the months they fall in:
+
+    ~trades that already had legs in the state are looked up in each month's trades (kept sorted by foreign_id, so it's a binary search
+     for the new trades rather than a hash of the whole history), put back together with their new legs and their old contribution to
+     the cube is swapped for the new one
+    ~the new contributions are grouped into the cube partitions of their months only
+    ~the cohort matrix is kept in the state and only worked out again from the first month with new activity (cohortEngine.updateCohorts)
+     - the trades of the months whose statuses changed (usually the new month and the month before it) are relabelled
+    ~only the partitions that changed are written, so a refresh writes the new month and the month before it, not the whole history
+
+The state is also kept in memory once it has been loaded or saved, so a refresh in a running app starts from it rather than reading the
+partitions back - the state.json generation tells whether it is still the one on disk. Only the dataset handed to the app (one frame of
+all trades, one cube) is put together from every partition.
+
+The whole history is processed again (and the state rewritten) when there is no state yet, the pricing settings changed or the ledger
+file was changed other than by appending rows. The trades, accounts and rates files are read in full (from their snapshots), so they
+should be updated before the new ledger rows are appended - ledger rows whose trade is not in trades.csv yet are dropped by the join.
+
+
+Inventory of Functions:
+
+~statePaths | loadState | saveState - Where the state is kept | reads it (if it is still valid) | writes the partitions that changed
+
+~monthHashes | dropLoggedRows - The hashes of a month's ledger rows | drops the new ledger rows that were already processed
+
+~readLedgerDelta - The complete ledger rows appended since the last refresh, in chunks
+
+~cubeRows - The contribution of a set of trade rows to the (status-less) cube
+
+~applyLedgerDelta - Merges the folded new rows into the state
+
+~statusCube | stateDataset - The cube with statuses and churned customers | the dataset dictionary used by the app
+
+~refreshIncremental - Loads the state, processes the new ledger rows, saves the state and returns the dataset
+
+~loadDatasetIncremental - refreshIncremental memoized on the file fingerprints (same as dataPipeline.loadDataset)
+
+'''
+
+STATE_DIR = '.pipeline_state'
+STATE_VERSION = 2
+TAIL_BYTES = 4096
+STATE_TABLES = ['trades', 'cube', 'activity', 'hashes']
+
+BASE_DIMENSIONS = [dimension for dimension in CUBE_DIMENSIONS if dimension != 'status']
+TRADE_STATE_COLUMNS = TRADE_COLUMNS + ['abs_sum', 'legs']
+
+#### the last state loaded or saved by this process for each ledger file
+_STATES = {}
+
+##############################################################################################################################################
+#### statePaths | loadState | saveState ######################################################################################################
+##############################################################################################################################################
+
+'''
+loadState - Returns the saved state for the ledger file, or a new empty state when there is none, it was written by another version or
+            with other pricing settings, or the ledger file no longer starts with the bytes that were processed (it shrank or the last
+            processed bytes changed). The state in memory is used when it is the generation on disk - otherwise the trades, cube and
+            activity partitions are read and the cohorts built from the activity (the hashes are only read for the months new rows fall in).
+
+saveState - Writes the partitions that changed as feather files tagged with a new generation number and then the state.json file
+            pointing to them (untouched partitions keep pointing to the files of earlier generations), so a refresh that is interrupted
+            half way leaves the previous state intact. Files that are no longer pointed to are removed afterwards.
+'''
+
+def statePaths(ledger_path):
+    folder = os.path.join(os.path.dirname(os.path.abspath(ledger_path)), STATE_DIR)
+    return folder, os.path.join(folder, 'state.json')
+
+
+def partitionPath(folder, table, month, generation):
+    return os.path.join(folder, f'{table}.{month}.{generation}.feather')
+
+
+def tailHash(path, offset):
+    with open(path, 'rb') as f:
+        f.seek(max(offset - TAIL_BYTES, 0))
+        return hashlib.sha256(f.read(min(offset, TAIL_BYTES))).hexdigest()
+
+
+def emptyState(ledger_path, pricing, tolerance, generation=0):
+
+    return {
+        'meta': {'version': STATE_VERSION, 'ledger_path': os.path.abspath(ledger_path), 'ledger_offset': 0, 'ledger_columns': None,
+                 'tail_sha256': None, 'ledger_rows': 0, 'generation': generation, 'pricing': pricing, 'tolerance': tolerance,
+                 'pricing_report': {'priced': 0, 'interpolated': 0, 'unpriced': 0}, 'partitions': {table: {} for table in STATE_TABLES}},
+        'trades': {},
+        'cube': {},
+        'hashes': {},
+        'cohorts': None,
+        'changed': set(),
+    }
+
+
+def loadState(ledger_path, pricing='hourly', tolerance=RATE_TOLERANCE):
+
+    folder, meta_path = statePaths(ledger_path)
+    if not os.path.exists(meta_path):
+        return emptyState(ledger_path, pricing, tolerance)
+
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+
+    offset = meta.get('ledger_offset', 0)
+    if (meta.get('version') != STATE_VERSION or meta.get('pricing') != pricing or meta.get('tolerance') != tolerance
+            or os.path.getsize(ledger_path) < offset or tailHash(ledger_path, offset) != meta.get('tail_sha256')):
+        return emptyState(ledger_path, pricing, tolerance, meta.get('generation', 0))
+
+    cached = _STATES.get(os.path.abspath(ledger_path))
+    if cached is not None and cached['meta']['generation'] == meta['generation']:
+        return cached
+
+    partitions = meta['partitions']
+    read = lambda table, month: feather.read_table(partitionPath(folder, table, month, partitions[table][month])).to_pandas()
+    activity = [read('activity', month).assign(year_month=pd.Period(month, freq='M')) for month in partitions['activity']]
+
+    return {
+        'meta': meta,
+        'trades': {month: read('trades', month).set_index('foreign_id') for month in partitions['trades']},
+        'cube': {month: read('cube', month) for month in partitions['cube']},
+        'hashes': {},
+        'cohorts': buildCohorts(pd.concat(activity, ignore_index=True)) if activity else None,
+        'changed': set(),
+    }
+
+
+def partitionFrame(state, table, month):
+
+    if table == 'trades':
+        return state['trades'][month].reset_index() if month in state['trades'] else None
+    if table == 'cube':
+        return state['cube'].get(month)
+    if table == 'hashes':
+        return pd.DataFrame({'hash': state['hashes'][month]})
+
+    cohorts = state['cohorts']
+    return pd.DataFrame({'user_id': cohorts.users[cohorts.active[:, cohorts.months.get_loc(pd.Period(month, freq='M'))]]})
+
+
+def saveState(state):
+
+    folder, meta_path = statePaths(state['meta']['ledger_path'])
+    os.makedirs(folder, exist_ok=True)
+
+    meta = dict(state['meta'], generation=state['meta']['generation'] + 1)
+    generation = meta['generation']
+    partitions = {table: dict(months) for table, months in meta['partitions'].items()}
+
+    for table, month in sorted(state['changed']):
+        frame = partitionFrame(state, table, month)
+        if frame is None:
+            partitions[table].pop(month, None)
+        else:
+            feather.write_feather(frame, partitionPath(folder, table, month, generation))
+            partitions[table][month] = generation
+
+    meta['partitions'] = partitions
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + '.tmp', meta_path)
+    state['meta'], state['changed'] = meta, set()
+    _STATES[meta['ledger_path']] = state
+
+    current = {partitionPath(folder, table, month, written) for table, months in partitions.items() for month, written in months.items()}
+    for path in glob.glob(os.path.join(folder, '*.feather')):
+        if path not in current:
+            os.remove(path)
+
+##############################################################################################################################################
+#### monthHashes | dropLoggedRows | readLedgerDelta ##########################################################################################
+##############################################################################################################################################
+
+'''
+monthHashes - The sorted hashes of the ledger rows processed so far in a month ('YYYY-MM'), read from its partition the first time.
+
+dropLoggedRows - Drops the new (cleaned, not yet encoded - the integer codes change between refreshes) ledger rows whose hash is in the
+                 hashes of their month and adds the hashes of the rest, so exact duplicate rows are dropped across refreshes and chunks
+                 the same as the in-memory pipeline drops them across the whole file.
+
+readLedgerDelta - Reads the bytes of the ledger file after the processed offset, up to the last complete line (a row that is still
+                  being written is left for the next refresh), and returns the cleaned rows in chunks of chunksize rows along with the
+                  new offset and the column names (taken from the header the first time the file is read).
+'''
+
+def monthHashes(state, month):
+
+    if month not in state['hashes']:
+        generation = state['meta']['partitions']['hashes'].get(month)
+        if generation is None:
+            state['hashes'][month] = np.empty(0, dtype=np.uint64)
+        else:
+            path = partitionPath(statePaths(state['meta']['ledger_path'])[0], 'hashes', month, generation)
+            state['hashes'][month] = feather.read_table(path).column('hash').to_numpy()
+
+    return state['hashes'][month]
+
+
+def dropLoggedRows(state, ledger):
+
+    hashes = rowHashes(ledger)
+    ordinals = ledger['year_month'].array.asi8
+    repeated = np.zeros(len(ledger), dtype=bool)
+
+    for ordinal in np.unique(ordinals):
+        month = str(pd.Period(ordinal=ordinal, freq='M'))
+        rows = ordinals == ordinal
+        repeated[rows], state['hashes'][month] = seenRows(hashes[rows], monthHashes(state, month))
+        state['changed'].add(('hashes', month))
+
+    return ledger[~repeated] if repeated.any() else ledger
+
+
+def readLedgerDelta(ledger_path, offset, columns=None, chunksize=500000):
+
+    with open(ledger_path, 'rb') as f:
+        f.seek(offset)
+        raw = f.read()
+
+    raw = raw[:raw.rfind(b'\n') + 1]
+    if not raw.strip():
+        return [], offset, columns
+
+    if offset == 0:
+        columns = pd.read_csv(io.BytesIO(raw), nrows=0).columns.tolist()
+        chunks = pd.read_csv(io.BytesIO(raw), chunksize=chunksize)
+    else:
+        chunks = pd.read_csv(io.BytesIO(raw), header=None, names=columns, chunksize=chunksize)
+
+    return (cleanLedger(chunk) for chunk in chunks), offset + len(raw), columns
+
+##############################################################################################################################################
+#### cubeRows | applyLedgerDelta #############################################################################################################
+##############################################################################################################################################
+
+'''
+cubeRows - Each trade row's contribution to the status-less cube (1 trade, 1 priced trade if it has a usd volume and its mean absolute
+           usd volume), multiplied by sign - so the old version of a trade that got more legs can be taken back out of the cube.
+
+applyLedgerDelta - Merges the trade rows, activity and pricing report of the new ledger rows into the state (see the description above)
+                   and returns the months whose statuses changed. A trade whose earliest leg moves to another month moves partitions.
+'''
+
+def cubeRows(tradeRows, sign=1):
+
+    usd_volume = tradeRows['abs_sum'].astype(float) / tradeRows['legs'].astype(float)
+
+    return pd.DataFrame({
+        'year_month': tradeRows['year_month'].astype(str).to_numpy(),
+        'day': tradeRows['day'].astype('Int64').to_numpy(),
+        'hour': tradeRows['hour'].astype('Int64').to_numpy(),
+        'market_pair': tradeRows['market_pair'].astype(str).to_numpy(),
+        'user_id': tradeRows['user_id'].astype(str).to_numpy(),
+        'trades': sign,
+        'priced': sign * usd_volume.notna().astype(int).to_numpy(),
+        'usd_volume': sign * usd_volume.fillna(0).to_numpy(),
+    })
+
+
+def sortedPositions(sorted_ids, ids):
+    if not len(sorted_ids):
+        return np.empty(0, dtype=np.intp)
+    positions = np.searchsorted(sorted_ids, ids).clip(max=len(sorted_ids) - 1)
+    return positions[sorted_ids[positions] == ids]
+
+
+@instrumented()
+def applyLedgerDelta(state, delta_trades, delta_activity, delta_report):
+
+    delta_trades = delta_trades.assign(user_id=delta_trades['user_id'].astype(str), market_pair=delta_trades['market_pair'].astype(str))
+
+    #### trades that already had legs in the state are combined with their new legs
+    touched = {month: sortedPositions(trades.index.to_numpy(), delta_trades.index.to_numpy()) for month, trades in state['trades'].items()}
+    touched = {month: positions for month, positions in touched.items() if len(positions)}
+    if touched:
+        old_rows = pd.concat([state['trades'][month].iloc[positions][TRADE_STATE_COLUMNS] for month, positions in touched.items()])
+        merged = combineTradeStates([old_rows, delta_trades])
+        contributions = pd.concat([cubeRows(old_rows, -1), cubeRows(merged, 1)], ignore_index=True)
+    else:
+        merged = delta_trades
+        contributions = cubeRows(merged, 1)
+
+    #### swap the old contribution of the touched trades for the merged trades, in the cube partitions of their months only
+    for month, rows in contributions.groupby('year_month', sort=False):
+        cube = pd.concat([state['cube'][month], rows], ignore_index=True) if month in state['cube'] else rows
+        cube = cube.groupby(BASE_DIMENSIONS, observed=True, dropna=False)[CUBE_MEASURES].sum().reset_index()
+        cube = cube[cube['trades'] != 0].reset_index(drop=True)
+        if len(cube):
+            state['cube'][month] = cube
+        else:
+            state['cube'].pop(month, None)
+        state['changed'].add(('cube', month))
+
+    #### statuses - the cohorts are worked out again from the first month with new activity
+    cohorts, changed = updateCohorts(state['cohorts'], delta_activity.astype({'user_id': str}))
+    changed = set(changed.astype(str))
+    state['cohorts'] = cohorts
+    state['changed'].update(('activity', month) for month in delta_activity['year_month'].astype(str).unique())
+
+    #### the merged trades go into the partition of their (earliest leg's) month, and the months whose statuses changed are relabelled
+    merged = merged.assign(status=cohortStatus(cohorts, merged))
+    new_rows = dict(list(merged.groupby(merged['year_month'].astype(str), sort=False)))
+
+    for month in set(touched) | set(new_rows) | (changed & set(state['trades'])):
+        trades = state['trades'].get(month)
+        if month in touched:
+            trades = trades.take(np.delete(np.arange(len(trades)), touched[month]))
+        if month in changed and trades is not None:
+            trades = trades.assign(status=cohortStatus(cohorts, trades))
+        if month in new_rows:
+            trades = pd.concat([trades, new_rows[month]]).sort_index() if trades is not None else new_rows[month].sort_index()
+
+        if len(trades):
+            state['trades'][month] = trades
+        else:
+            state['trades'].pop(month)
+        state['changed'].add(('trades', month))
+
+    for key, count in delta_report.items():
+        state['meta']['pricing_report'][key] += count
+
+    return sorted(changed)
+
+##############################################################################################################################################
+#### statusCube | stateDataset ###############################################################################################################
+##############################################################################################################################################
+
+'''
+statusCube - Adds the status of each user-month to the status-less cube and a row for each churned customer (1 trade with a zero usd
+             volume and no day, hour or market_pair - the same as grouping updated_df with the churned rows in it).
+
+stateDataset - The same dataset dictionary as dataPipeline.loadDataset (apart from the row level ledger dataframes) from the state -
+               users_combined is the trade partitions with their statuses (in foreign_id order), and the aggregates are rolled up from
+               statusCube over the cube partitions.
+'''
+
+def statusCube(cube, cohorts):
+
+    cube = cube.assign(status=cohortStatus(cohorts, cube))
+
+    churned = churnedCustomers(cohorts)
+    churned_rows = pd.DataFrame({
+        'year_month': churned['year_month'].astype(str),
+        'day': pd.Series(pd.NA, index=churned.index, dtype='Int64'),
+        'hour': pd.Series(pd.NA, index=churned.index, dtype='Int64'),
+        'market_pair': pd.Series(pd.NA, index=churned.index, dtype=object),
+        'status': 'Churned',
+        'user_id': churned['user_id'].astype(str),
+        'trades': 1,
+        'priced': 1,
+        'usd_volume': 0.0,
+    })
+
+    return pd.concat([cube[CUBE_DIMENSIONS + CUBE_MEASURES], churned_rows], ignore_index=True)
+
+
+def stateDataset(state):
+
+    cohorts = state['cohorts']
+
+    users_combined = pd.concat([state['trades'][month] for month in sorted(state['trades'])]).sort_index().reset_index(drop=True)
+    users_combined['usd_volume'] = users_combined['abs_sum'].astype(float) / users_combined['legs'].astype(float)
+    users_combined = users_combined[['timestamp_at', 'year_month', 'day', 'hour', 'user_id', 'status', 'market_pair', 'usd_volume']]
+
+    updated_df = addChurnedCustomers(users_combined, churnedCustomers(cohorts))
+    final_df = updated_df[['timestamp_at', 'year_month', 'user_id', 'status', 'market_pair', 'usd_volume']]
+
+    cube = statusCube(pd.concat([state['cube'][month] for month in sorted(state['cube'])], ignore_index=True), cohorts)
+
+    dataset = {
+        'users_combined': users_combined,
+        'updated_df': updated_df,
+        'final_df': final_df,
+        'pricing_report': dict(state['meta']['pricing_report']),
+        'cohorts': cohorts,
+        'cube': cube,
+    }
+    dataset.update(cubeViews(cube))
+
+    return dataset
+
+##############################################################################################################################################
+#### refreshIncremental | loadDatasetIncremental #############################################################################################
+##############################################################################################################################################
+
+'''
+refreshIncremental - Loads the state for the ledger file, folds the ledger rows appended since the last refresh (chunksize rows at a
+                     time), merges them into the state, saves it and returns the dataset along with a summary of the refresh (new
+                     ledger rows and bytes, whether the whole history was processed, months relabelled). A refresh that fails drops the
+                     state it was applied to from memory, so the next one starts again from the state on disk.
+
+loadDatasetIncremental - refreshIncremental memoized on the file fingerprints, so reruns of the app with unchanged files return the
+                         cached dataset, and appending to the ledger file only costs the new rows.
+'''
+
+@instrumented()
+def refreshIncremental(accounts_path, ledger_path, trades_path, rates_path, pricing='hourly', tolerance=RATE_TOLERANCE, chunksize=500000):
+
+    state = loadState(ledger_path, pricing, tolerance)
+    meta = state['meta']
+    start = meta['ledger_offset']
+    relabelled = []
+
+    try:
+        chunks, offset, columns = readLedgerDelta(ledger_path, start, meta['ledger_columns'], chunksize)
+
+        pending, activity, new_rows = [], [], 0
+        delta_report = {'priced': 0, 'interpolated': 0, 'unpriced': 0}
+        rates_sorted = None
+        for ledger in chunks:
+            if rates_sorted is None:
+                accounts = loadSnapshot(accounts_path, categoricals=CATEGORICAL_COLUMNS['accounts'])
+                trades = loadSnapshot(trades_path, cleanTrades, CATEGORICAL_COLUMNS['trades'])
+                rates_sorted = sortedRates(loadSnapshot(rates_path, cleanRates, CATEGORICAL_COLUMNS['rates']), pricing, rates_path)
+
+                dictionaries = buildDictionaries(accounts, trades)
+                accounts = encodeTable(accounts, 'accounts', dictionaries)
+                trades = encodeTable(trades, 'trades', dictionaries)
+
+            new_rows += len(ledger)
+            ledger = encodeTable(dropLoggedRows(state, ledger), 'ledger', dictionaries)
+            chunk_trades, chunk_activity, chunk_report = foldLedgerChunk(ledger, accounts, trades, rates_sorted, pricing, tolerance)
+
+            #### the state keeps the hashes - the integer codes depend on the accounts and trades files, which change between refreshes
+            pending.append(decodeTable(chunk_trades, dictionaries))
+            activity.append(decodeTable(chunk_activity, dictionaries))
+            for key, count in chunk_report.items():
+                delta_report[key] += count
+
+        if pending:
+            relabelled = applyLedgerDelta(state, combineTradeStates(pending), pd.concat(activity).drop_duplicates(), delta_report)
+            meta.update(ledger_offset=offset, ledger_columns=columns, tail_sha256=tailHash(ledger_path, offset), ledger_rows=meta['ledger_rows'] + new_rows)
+            saveState(state)
+
+    except Exception:
+        _STATES.pop(meta['ledger_path'], None)
+        raise
+
+    summary = {'new_rows': new_rows, 'new_bytes': offset - start, 'full_refresh': start == 0 and new_rows > 0, 'ledger_rows': state['meta']['ledger_rows'],
+               'relabelled': relabelled}
+
+    return stateDataset(state), summary
+
+
+@lru_cache(maxsize=2)
+def _refreshIncrementalCached(accounts_fp, ledger_fp, trades_fp, rates_fp, pricing, tolerance, chunksize):
+    return refreshIncremental(accounts_fp[0], ledger_fp[0], trades_fp[0], rates_fp[0], pricing, tolerance, chunksize)[0]
+
+
+@instrumented()
+def loadDatasetIncremental(accounts_path, ledger_path, trades_path, rates_path, pricing='hourly', tolerance=RATE_TOLERANCE, chunksize=500000):
+    return _refreshIncrementalCached(
+        fileFingerprint(accounts_path),
+        fileFingerprint(ledger_path),
+        fileFingerprint(trades_path),
+        fileFingerprint(rates_path),
+        pricing,
+        tolerance,
+        chunksize
+    )
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,205 @@
+#### Import Python Libraries #################################################################################################################
+
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+import pandas as pd
+
+##############################################################################################################################################
+#### Stage Instrumentation ###################################################################################################################
+##############################################################################################################################################
+
+'''
+When the dashboard is slow it is not obvious whether the time goes on reading the files, one of the merges, the status mapping, the
+groupbys or building the plotly figures. The functions below record, for every pipeline stage and graph function that runs during a
+rerun of the app, its wall time, the rows of the dataframe going in and coming out and the peak memory it allocated (tracemalloc).
+
+Instrumentation is opt-in (see main.py) - until enableInstrumentation is called the instrumented decorator just calls the function, so
+the pipeline, the streaming ingest, the batch CLI and the benchmarks run the same functions without any overhead. Measuring memory
+with tracemalloc slows the instrumented code down noticeably, so it can be switched off with memory=False and only the times are kept.
+
+Stages that did not run on a rerun (e.g. everything inside loadDataset when the dataset came from the cache, or a figure served by the
+figure cache) are not recorded, so the records show exactly which stages a given selection triggered and what they cost. Stages can
+be nested (loadDataset -> mergeLedgerAccounts -> ...) - each record has the depth it ran at. The records are kept per thread (streamlit
+runs each session's reruns in its own thread), so sessions don't mix their records.
+
+tracemalloc's peak is one counter for the whole process, so two sessions measuring stages at the same time would reset and raise each
+other's peaks. While memory is measured, the outermost stage running in a thread holds a process-wide lock (the stages nested in it run
+under the same lock), so the instrumented stages of different sessions run one after the other and every peak belongs to its own stage.
+With memory=False nothing is locked - the times of concurrent sessions are recorded side by side.
+
+
+Inventory of Functions:
+
+~enableInstrumentation | disableInstrumentation - Switches recording on (optionally with a JSONL log file) | off
+
+~startRun | finishRun - Clears the records at the start of a rerun | returns them at the end (and appends them to the JSONL log)
+
+~recordedRun - Context manager that records the block as a run of its own, unless it runs inside a run that is already open
+
+~stage - Context manager that records a block of code as a stage
+
+~instrumented - Decorator that records every call of a function as a stage
+
+'''
+
+_CONFIG = {'enabled': False, 'memory': True, 'log_path': None, 'tracing': False}
+_LOG_LOCK = threading.Lock()
+_STAGE_LOCK = threading.RLock()
+_local = threading.local()
+
+##############################################################################################################################################
+#### enableInstrumentation | disableInstrumentation | startRun | finishRun ###################################################################
+##############################################################################################################################################
+
+def enableInstrumentation(log_path=None, memory=True):
+    _CONFIG.update(enabled=True, memory=memory, log_path=log_path)
+
+
+def disableInstrumentation():
+    #### stop tracemalloc if it was started here, so it doesn't keep slowing everything down
+    if _CONFIG['tracing'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _CONFIG.update(enabled=False, log_path=None, tracing=False)
+
+
+def _runState():
+    if not hasattr(_local, 'records'):
+        _local.records, _local.frames, _local.run = [], [], None
+    return _local
+
+
+def startRun(label=None):
+    state = _runState()
+    state.records, state.frames = [], []
+    state.run = {'label': label, 'started': pd.Timestamp.now(tz='UTC').isoformat()}
+
+
+def finishRun():
+    state = _runState()
+    records, state.records = list(state.records), []
+    run, state.run = state.run, None
+
+    if _CONFIG['log_path'] and records:
+        run = run or {}
+        with _LOG_LOCK, open(_CONFIG['log_path'], 'a') as f:
+            for record in records:
+                f.write(json.dumps(dict(record, run=run.get('started'), label=run.get('label'))) + '\n')
+
+    return records
+
+
+'''
+recordedRun - A streamlit fragment (see main.py) can rerun on its own, without the rest of the script - its stages would then be recorded
+              into a run that was never started or finished. recordedRun starts a run (labelled) when no run is open in the thread and
+              finishes it at the end of the block, filling in the 'records' of the dictionary it yields. Inside an open run (the
+              fragment drawn as part of a full rerun) it yields None and the stages are recorded into that run as before.
+'''
+
+@contextmanager
+def recordedRun(label=None):
+
+    if _runState().run is not None:
+        yield None
+        return
+
+    startRun(label)
+    run = {'label': label, 'records': []}
+    try:
+        yield run
+    finally:
+        run['records'] = finishRun()
+
+##############################################################################################################################################
+#### stage | instrumented ####################################################################################################################
+##############################################################################################################################################
+
+'''
+stage - Records the code in the with block as one stage. The dictionary it yields can be given the rows that came out of the stage
+        (rows_out). For the peak memory of nested stages, tracemalloc's peak is reset when a stage starts and passed up to the stages it
+        is nested in when it ends, so each stage's peak covers everything that ran inside it. With memory on, an outermost stage waits
+        for the stage lock before it starts (and its wait is not part of its time).
+
+instrumented - Decorator version of stage, named after the function. rows_in is the length of the first dataframe argument and rows_out
+               the length of the returned dataframe (or of the largest dataframe in a returned tuple).
+'''
+
+def _frameRows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, tuple):
+        lengths = [len(item) for item in value if isinstance(item, (pd.DataFrame, pd.Series))]
+        return max(lengths) if lengths else None
+    return None
+
+
+@contextmanager
+def stage(name, rows_in=None):
+
+    if not _CONFIG['enabled']:
+        yield {}
+        return
+
+    state = _runState()
+    memory = _CONFIG['memory']
+    locked = memory and not state.frames
+    if locked:
+        _STAGE_LOCK.acquire()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _CONFIG['tracing'] = True
+
+    frame = {'rows_out': None, 'peak': 0, 'start': 0}
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        for outer in state.frames:
+            outer['peak'] = max(outer['peak'], peak)
+        tracemalloc.reset_peak()
+        frame['start'] = current
+    state.frames.append(frame)
+
+    started = time.perf_counter()
+    try:
+        yield frame
+    finally:
+        seconds = time.perf_counter() - started
+        state.frames.pop()
+
+        try:
+            record = {'stage': name, 'depth': len(state.frames), 'seconds': round(seconds, 6), 'rows_in': rows_in, 'rows_out': frame['rows_out']}
+            if memory and tracemalloc.is_tracing():
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                for outer in state.frames:
+                    outer['peak'] = max(outer['peak'], peak)
+                record['peak_mb'] = round(max(peak - frame['start'], 0) / 2 ** 20, 3)
+            state.records.append(record)
+        finally:
+            if locked:
+                _STAGE_LOCK.release()
+
+
+def instrumented(name=None):
+
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _CONFIG['enabled']:
+                return func(*args, **kwargs)
+
+            rows_in = next((len(arg) for arg in args if isinstance(arg, (pd.DataFrame, pd.Series))), None)
+            with stage(stage_name, rows_in) as frame:
+                result = func(*args, **kwargs)
+                frame['rows_out'] = _frameRows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,309 @@
+#### Import Python Libraries #################################################################################################################
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from columnarCache import ensureSnapshot, readSnapshot, loadSnapshot, CATEGORICAL_COLUMNS
+from cohortEngine import statusCounts
+from dataPipeline import cleanLedger, cleanTrades, cleanRates, PRICING_METHODS, RATE_TOLERANCE, sortedRates
+from streamingIngest import foldLedgerChunk, combineTradeStates, finishTradeState
+from incrementalIngest import refreshIncremental
+from idEncoding import buildDictionaries, encodeTable
+
+##############################################################################################################################################
+#### Headless Batch Analysis (CLI) ###########################################################################################################
+##############################################################################################################################################
+
+'''
+The analysis could only be run through the streamlit app, since main.py mixes the dataframes with the st.sidebar/st.columns calls. This
+file runs the same cleaning, join, pricing, status and aggregation stages without streamlit and writes every dashboard table to disk:
+
+    python -m luno_analysis run --data files/ --out out/ [--workers 8] [--pricing hourly] [--tolerance 1h]
+    python -m luno_analysis update --data files/ --out out/ [--pricing hourly] [--tolerance 1h]
+
+The ledger is split by month and each month is joined, priced and folded into per-trade rows in its own process (the same steps the
+streaming ingest runs per chunk - streamingIngest.foldLedgerChunk). Each worker memory-maps the columnar snapshots and only reads its own
+month of the ledger, so the months are processed in parallel without copying the ledger between processes. The per-month trade rows are
+then combined (a trade whose legs fall either side of a month end is put back together by streamingIngest.combineTradeStates) and the
+statuses, churned customers and aggregates are worked out once for all months.
+
+The update command is for a ledger file that new months are appended to - only the rows appended since the last update are processed
+(incrementalIngest.refreshIncremental keeps the pipeline state next to the ledger) before the tables are written again.
+
+Output (--out):
+
+    ~final_clean_df.csv, monthly_pairs_volume.csv, status_volume.csv, customer_volume.csv, client_pairs_count.csv,
+     client_averages.csv, hourly_volumes.csv, daily_volumes.csv, status_counts.csv and pricing_report.json - all months
+    ~<year-month>/ - the month's trades (hourly_trades.csv), hourly | daily volumes, market-pair volumes and returning client averages
+
+
+Inventory of Functions:
+
+~dataPaths - Paths of the 4 data files in the data folder
+
+~ledgerMonths - The months in the ledger and their start/end timestamps
+
+~foldMonth - Joins, prices and folds one month of the ledger (run in the worker processes)
+
+~runAnalysis - Runs the pipeline with the months spread over a process pool and writes the tables
+
+~updateAnalysis - Processes only the ledger rows appended since the last update and writes the tables
+
+~monthTables | writeTables - The dashboard tables for a single month | writes all of the tables to the output folder
+
+~main - Command line entry point
+
+'''
+
+DATA_FILES = {
+    'accounts': 'accounts.csv',
+    'ledger': 'ledger_entries.csv',
+    'trades': 'trades.csv',
+    'rates': 'rates.csv',
+}
+
+#### all-months tables written by writeTables - dataset key: file name (same names as the download buttons in main.py)
+TABLE_FILES = {
+    'final_df': 'final_clean_df.csv',
+    'monthly_pairs_df': 'monthly_pairs_volume.csv',
+    'status_sums': 'status_volume.csv',
+    'client_sums': 'customer_volume.csv',
+    'client_pairs_count': 'client_pairs_count.csv',
+    'clients_combined_avg': 'client_averages.csv',
+    'monthly_hourly_sums': 'hourly_volumes.csv',
+    'monthly_daily_sums': 'daily_volumes.csv',
+}
+
+#### per worker process state, set up once by _initWorker
+_WORKER = {}
+
+##############################################################################################################################################
+#### dataPaths | ledgerMonths ################################################################################################################
+##############################################################################################################################################
+
+def dataPaths(data_dir):
+    return {name: os.path.join(data_dir, file_name) for name, file_name in DATA_FILES.items()}
+
+
+def ledgerMonths(ledger_path):
+
+    timestamps = readSnapshot(ledger_path, columns=['timestamp_at_date'])['timestamp_at_date']
+    tz = timestamps.dt.tz
+    months = timestamps.dt.tz_localize(None).dt.to_period('M').drop_duplicates().sort_values()
+
+    bounds = []
+    for month in months:
+        start, end = month.start_time, (month + 1).start_time
+        if tz is not None:
+            start, end = start.tz_localize(tz), end.tz_localize(tz)
+        bounds.append((str(month), start, end))
+
+    return bounds
+
+##############################################################################################################################################
+#### encodedReferenceFiles | foldMonth #######################################################################################################
+##############################################################################################################################################
+
+'''
+encodedReferenceFiles - The accounts and trades from their snapshots with their ids encoded as integer codes, and the id dictionaries
+                        (idEncoding.py) - built from the same snapshots in every process, so all the workers use the same codes
+
+_initWorker - Runs once in each worker process: loads the encoded accounts and trades and the rates from their snapshots and sorts the
+              rates for pricing
+
+foldMonth - Reads the ledger rows from start (inclusive) to end (exclusive) from the snapshot and returns the per-trade rows, activity
+            and pricing report for the month (streamingIngest.foldLedgerChunk)
+'''
+
+def encodedReferenceFiles(paths):
+
+    accounts = loadSnapshot(paths['accounts'], categoricals=CATEGORICAL_COLUMNS['accounts'])
+    trades = loadSnapshot(paths['trades'], cleanTrades, CATEGORICAL_COLUMNS['trades'])
+    dictionaries = buildDictionaries(accounts, trades)
+
+    return encodeTable(accounts, 'accounts', dictionaries), encodeTable(trades, 'trades', dictionaries), dictionaries
+
+
+def _initWorker(paths, pricing, tolerance):
+    accounts, trades, dictionaries = encodedReferenceFiles(paths)
+    _WORKER['ledger_path'] = paths['ledger']
+    _WORKER['accounts'] = accounts
+    _WORKER['trades'] = trades
+    _WORKER['dictionaries'] = dictionaries
+    _WORKER['rates_sorted'] = sortedRates(loadSnapshot(paths['rates'], cleanRates, CATEGORICAL_COLUMNS['rates']), pricing, paths['rates'])
+    _WORKER['pricing'] = pricing
+    _WORKER['tolerance'] = tolerance
+
+
+def foldMonth(bounds):
+    month, start, end = bounds
+
+    timestamp = ds.field('timestamp_at_date')
+    ledger = readSnapshot(_WORKER['ledger_path'], filter=(timestamp >= pa.scalar(start)) & (timestamp < pa.scalar(end)))
+    ledger = encodeTable(ledger, 'ledger', _WORKER['dictionaries'])
+
+    return foldLedgerChunk(ledger, _WORKER['accounts'], _WORKER['trades'], _WORKER['rates_sorted'], _WORKER['pricing'], _WORKER['tolerance'])
+
+##############################################################################################################################################
+#### runAnalysis | updateAnalysis ############################################################################################################
+##############################################################################################################################################
+
+'''
+runAnalysis - Writes/refreshes the 4 snapshots once (so the workers never race to write them), then folds every month of the ledger in
+              a pool of worker processes (workers=None uses one per CPU, workers=1 runs the months in this process). The results are
+              combined into the same dataset dictionary as streamingIngest.loadDatasetChunked and written to out_dir.
+
+updateAnalysis - Processes the ledger rows appended since the last update (incrementalIngest.refreshIncremental) and writes the tables.
+'''
+
+def runAnalysis(data_dir, out_dir, workers=None, pricing='hourly', tolerance=RATE_TOLERANCE, log=print):
+
+    paths = dataPaths(data_dir)
+
+    started = time.perf_counter()
+    ensureSnapshot(paths['accounts'], categoricals=CATEGORICAL_COLUMNS['accounts'])
+    ensureSnapshot(paths['ledger'], cleanLedger, CATEGORICAL_COLUMNS['ledger'])
+    ensureSnapshot(paths['trades'], cleanTrades, CATEGORICAL_COLUMNS['trades'])
+    ensureSnapshot(paths['rates'], cleanRates, CATEGORICAL_COLUMNS['rates'])
+    months = ledgerMonths(paths['ledger'])
+    log(f"snapshots ready, {len(months)} months in the ledger ({time.perf_counter() - started:.2f}s)")
+
+    started = time.perf_counter()
+    if workers == 1:
+        _initWorker(paths, pricing, tolerance)
+        results = [foldMonth(bounds) for bounds in months]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(paths, pricing, tolerance)) as pool:
+            results = list(pool.map(foldMonth, months))
+    log(f"ledger joined, priced and folded per month ({time.perf_counter() - started:.2f}s)")
+
+    started = time.perf_counter()
+    pricing_report = {'priced': 0, 'interpolated': 0, 'unpriced': 0}
+    for _, _, month_report in results:
+        for key, count in month_report.items():
+            pricing_report[key] += count
+
+    tradeState = combineTradeStates([month_trades for month_trades, _, _ in results])
+    activity = pd.concat([month_activity for _, month_activity, _ in results]).drop_duplicates()
+    dataset = finishTradeState(tradeState, activity, pricing_report, encodedReferenceFiles(paths)[2])
+    log(f"statuses and aggregates worked out ({time.perf_counter() - started:.2f}s)")
+
+    started = time.perf_counter()
+    writeTables(dataset, out_dir)
+    log(f"tables written to {out_dir} ({time.perf_counter() - started:.2f}s)")
+
+    return dataset
+
+
+def updateAnalysis(data_dir, out_dir, pricing='hourly', tolerance=RATE_TOLERANCE, log=print):
+
+    started = time.perf_counter()
+    paths = dataPaths(data_dir)
+
+    dataset, summary = refreshIncremental(paths['accounts'], paths['ledger'], paths['trades'], paths['rates'], pricing, tolerance)
+    log(f"{summary['new_rows']:,} new ledger rows processed ({summary['ledger_rows']:,} in total)"
+        + (' - the whole ledger was processed' if summary['full_refresh'] else ''))
+
+    writeTables(dataset, out_dir)
+    log(f"tables written to {out_dir} ({time.perf_counter() - started:.2f}s)")
+
+    return dataset
+
+##############################################################################################################################################
+#### monthTables | writeTables ###############################################################################################################
+##############################################################################################################################################
+
+'''
+monthTables - The tables the dashboard shows for a selected month (graphs 1 to 5 and 12): the month's trades, the hourly | daily usd
+              volume, the usd volume per market-pair and the returning clients' average usd volume vs. the monthly status average.
+
+writeTables - Writes the all-months tables, the status counts and pricing report, and a folder of monthTables for every month.
+'''
+
+def monthTables(dataset, month):
+
+    users_combined = dataset['users_combined']
+    monthly_hourly_sums = dataset['monthly_hourly_sums']
+    monthly_daily_sums = dataset['monthly_daily_sums']
+    monthly_pairs_df = dataset['monthly_pairs_df']
+    clients_combined_avg = dataset['clients_combined_avg']
+
+    allPairsMonthly_df = monthly_pairs_df[monthly_pairs_df['year_month'] == month].copy()
+    allPairsMonthly_df['usd_percentage'] = allPairsMonthly_df['usd_volume'] / allPairsMonthly_df['usd_volume'].sum()
+
+    allClients_monthlyAverage = clients_combined_avg[clients_combined_avg['year_month'] == month]
+    allClients_monthlyAverage = allClients_monthlyAverage[allClients_monthlyAverage['status'] == 'Returning']
+
+    tables = {
+        'hourly_trades.csv': users_combined[users_combined['year_month'] == month],
+        'hourly_volumes.csv': monthly_hourly_sums[monthly_hourly_sums['year_month'] == month][['hour', 'usd_volume', 'usd_percentage']],
+        'daily_volumes.csv': monthly_daily_sums[monthly_daily_sums['year_month'] == month][['day', 'usd_volume', 'usd_percentage']],
+        'all_mkt_pairs_volume.csv': allPairsMonthly_df,
+        'returning_client_averages.csv': allClients_monthlyAverage,
+    }
+
+    return tables
+
+
+def writeTables(dataset, out_dir):
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    for key, file_name in TABLE_FILES.items():
+        dataset[key].to_csv(os.path.join(out_dir, file_name), index=False)
+
+    statusCounts(dataset['cohorts']).rename_axis('year_month').to_csv(os.path.join(out_dir, 'status_counts.csv'))
+
+    with open(os.path.join(out_dir, 'pricing_report.json'), 'w') as f:
+        json.dump(dataset['pricing_report'], f, indent=2)
+
+    for month in sorted(dataset['users_combined']['year_month'].unique()):
+        month_dir = os.path.join(out_dir, str(month))
+        os.makedirs(month_dir, exist_ok=True)
+        for file_name, table in monthTables(dataset, month).items():
+            table.to_csv(os.path.join(month_dir, file_name), index=False)
+
+##############################################################################################################################################
+#### main ####################################################################################################################################
+##############################################################################################################################################
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='luno_analysis', description='Runs the Luno customer analysis without streamlit')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the pipeline and write every dashboard table')
+    run.add_argument('--data', default='files', help='folder with accounts.csv, ledger_entries.csv, trades.csv and rates.csv')
+    run.add_argument('--out', default='out', help='folder the tables are written to')
+    run.add_argument('--workers', type=int, default=None, help='number of worker processes (default: one per CPU)')
+    run.add_argument('--pricing', choices=PRICING_METHODS, default='hourly', help='how the ledger legs are priced in USD')
+    run.add_argument('--tolerance', default=RATE_TOLERANCE, help='furthest rate snapshot used to price a leg (e.g. 1h, 30min)')
+
+    update = commands.add_parser('update', help='process only the ledger rows appended since the last update and write every dashboard table')
+    update.add_argument('--data', default='files', help='folder with accounts.csv, ledger_entries.csv, trades.csv and rates.csv')
+    update.add_argument('--out', default='out', help='folder the tables are written to')
+    update.add_argument('--pricing', choices=PRICING_METHODS, default='hourly', help='how the ledger legs are priced in USD')
+    update.add_argument('--tolerance', default=RATE_TOLERANCE, help='furthest rate snapshot used to price a leg (e.g. 1h, 30min)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        runAnalysis(args.data, args.out, workers=args.workers, pricing=args.pricing, tolerance=args.tolerance)
+    elif args.command == 'update':
+        updateAnalysis(args.data, args.out, pricing=args.pricing, tolerance=args.tolerance)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -1,15 +1,24 @@
 #### Import Python Libraries #################################################################################################################
 
 import json
+from functools import wraps
 import pandas as pd
 # import numpy as np
 import streamlit as st
-import plotly.express as px
 from PIL import Image
 from streamlit_lottie import st_lottie
 
-#### Import Plotly Graph Functions
-from plotlyGraphs import tradeDistPerMonth, volumeDistPerMonth, pieGraph, marketPairLine, marketPairVolume, clientMonthlyStatusAvg, monthlyClientVolumeNormalised
+#### Import Data Pipeline and Plotly Graph Functions
+from dataPipeline import loadDataset, RATE_TOLERANCE
+from streamingIngest import loadDatasetChunked
+from incrementalIngest import loadDatasetIncremental
+from duckdbPipeline import loadDatasetDuckdb
+from sharedDataset import loadShared
+from clientSearch import searchClients
+from cacheWarmup import startWarmup, warmupStatus, retryWarmup
+from dataExport import downloadArgs, EXPORT_FORMATS
+from instrumentation import enableInstrumentation, disableInstrumentation, startRun, finishRun, recordedRun, instrumented
+from dashboardViews import sectionOptions, monthViews, currencyViews, clientViews, statusViews, clientPairsViews, defaultViewTasks
 
 #### Set Streamlit Page Settings
 st.set_page_config(
@@ -19,11 +28,6 @@ st.set_page_config(
     layout="wide"
 )
 
-#### Function to convert dataframe to csv file for download
-@st.cache_data
-def convert_df(df):
-   return df.to_csv(index=False).encode('utf-8')
-
 # Import Lottie File and Luno Image
 banner = Image.open('./assets/lunoLogo.png')
 url = './assets/analysis1.json'
@@ -31,311 +35,131 @@ with open(url, 'r') as fson:
     res = json.load(fson)
 url_json = res
 
-# Colour Theme for Graphs
-colors = px.colors.qualitative.Vivid
-
-#### Import csv files and read as pandasdataframes ##########################################################################################
-
-accounts_path = "./files/accounts.csv"
-ledger_path = "./files/ledger_entries.csv"
-trades_path = "./files/trades.csv"
-rates_path = "./files/rates.csv"
-
-accounts = pd.read_csv(accounts_path)
-ledger = pd.read_csv(ledger_path)
-trades = pd.read_csv(trades_path)
-rates = pd.read_csv(rates_path)
-
-
-############################################################################################################################################
-#### Data Cleaning ######################################################################################################################### 
-############################################################################################################################################
-
-#### Ledger File ###########################################################################################################################
-comment = '''
-For the ledger File, I converted the timestamp to datetime addded columns for the year-month, day and hour of transaction.
-The timestamp_at file was converted to datetime to make it easier to merge with the rates file - which contained the historical currency/usd values.
-For this I specifically created the hourly column, which contained the transaction hour along with the  date.
-The day and hour columns were added to get a better understanding of the distribution of transactions/trades over the days of the month 
-as well as hours in a day i.e. for each month analysed - which days/hours were the most active. 
-'''
-ledger['timestamp_at_date'] = pd.to_datetime(ledger['timestamp_at'])
-ledger['year_month'] = ledger['timestamp_at_date'].dt.tz_localize(None).dt.to_period('M')
-ledger['day'] = ledger['timestamp_at_date'].dt.day
-ledger['hourly'] = ledger['timestamp_at_date'].dt.round('h')
-ledger['hour'] = ledger['timestamp_at_date'].dt.hour
-
-#### Trades File #########################################################################################################################
-comment = '''
-For this file I concatenated the base_currency with the counter_currency to get a column should the 
-market_pair traded.
-'''
-trades['market_pair'] = trades['base_currency'] +'/'+ trades['counter_currency']
-
-#### Rates File #########################################################################################################################
-comment = '''
-For the rates I converted the reference_at trade to datetime to make it consistent with the legder file timestamp_at column,
-which helped merge the the files and get the hourly average rate for the traded currency pair.
-'''
-rates['reference_at_date'] = pd.to_datetime(rates['reference_at'])
-
-
-#### Joinging/Merging data files #######################################################################################################
+#### Import csv files, clean and merge them into the analysis dataframes ####################################################################
 
 comment = '''
-I first merged the ledger and accounts files based on account id's from the ledger and the id's from the account files.
-By merging these two data files, a link could then be made from the transacting account in the ledger file (account id)
-and the corresponding customer in the account file (user_id) 
-'''
-
-ledgerAccounts = pd.merge(
-    ledger.sort_values('timestamp_at'), 
-    accounts, 
-    left_on='account_id', 
-    right_on='id', 
-    how='left',
-    suffixes=('_ledger', '_account')
-)
-
-ledgerAccounts = ledgerAccounts.drop_duplicates()
-
-comment = '''
-Following this, I then merged this file with the trades file based on the foreign_id (from the accounts file) and the id (from the trades file) fields.
-This allowed essentially gave me a view of those transactions that were due specifically to trading activity from the client or or other transactions namely:
-sending/receiving crypto, withdrawing fiat, placing/cancelling limit orders. I then cleaned up the merged dataframe by dropping any duplicate rows/columns.
-I also removed the transactions which were not due any trading activities. 
+The csv files are read, cleaned, merged and mapped to a client status in dataPipeline.py. loadDataset is memoized on the file fingerprints
+of the 4 files so this only does the heavy lifting the first time (or when one of the files changes) - on every other rerun of the app
+(i.e. a sidebar click) the cached dataframes are returned and only the per-selection filters further down are recomputed.
 
-My reasoning for this was that since Luno operates primarily as an exchange, the primary source of revenue is from trading activity either through the exchange 
-or broker and so with this in mind, I focused my study on analysing and drawing insights specifically from clients trading activities. 
-'''
-
-ledgerTrades = pd.merge(
-    ledgerAccounts, 
-    trades, 
-    left_on='foreign_id', 
-    right_on='id', 
-    how='left',
-    suffixes=('_ledger', '_trade')
-)
+The cached dataset lives once in the server process and is shared by all of the browser sessions - it is loaded through
+sharedDataset.loadShared, so sessions opened while it is being built wait for that build rather than running their own, and each session
+reads the shared dataframes through copy-on-write views (no data is copied unless a session writes to a column).
 
-ledgerTrades = ledgerTrades.drop_duplicates()
-ledgerTrades.dropna(subset=['user_id'], inplace=True)
-ledgerTrades = ledgerTrades.dropna(subset=['market_pair'])
+With background_warmup set to True the dataset is built on a background thread (cacheWarmup.py) along with the views and figures of the
+default selections (dashboardViews.defaultViewTasks) - until it is done, the page shows the warm-up's progress instead of waiting on the
+pipeline. The data files are checked every warmup_watch_seconds and the cache is warmed again as soon as one of them changes.
 
+For very large ledger files, set ledger_chunksize to a number of rows - the ledger is then streamed in chunks of that size 
+(streamingIngest.py) so that the full ledger and its joins are never held in memory at once.
 
-comment = '''
-Lastly, in order to calculate the usd_volume,  I calculated the hourly average rate (usd price) for each currency for each hour. I could have done more
-to get more accurate price in terms of time - like trying to map exact trade/transaction times with the rates from the rates file. However since the times were
-not exact, it would have resulted in a lot trades not coming through with a price and so I decided to use the hourly average - I felt that this would be fine
-and would still provide a fair analysis of the data. 
-
-For this I mapped the hourly column (created earlier) with the trasaction hour + date. This was to ensure that the correct average rates were being mapped
-to the correct date and hour. From this I was able to calculate the usd volume trade by multiplying the balance_delta (ledger file) with the corresponding
-average usd price.
-'''
+When new months are appended to the ledger file, set incremental_ingest to True - the pipeline state (per-trade usd volumes, monthly
+activity and the aggregate cube) is kept in a .pipeline_state folder next to the ledger and each refresh only joins, prices and folds
+the rows appended since the last one (incrementalIngest.py). Update trades.csv, accounts.csv and rates.csv before appending the ledger rows.
 
-#### Calculate hourly average per currency per reference data hour
-hourly_avg = rates.set_index('reference_at_date').groupby(['currency', pd.Grouper(freq='h')])['average_price_per_usd'].mean().reset_index()
-
-#### map ledgerTrades file to the usd rate for the currency for that hour 
-combined_df = pd.merge(
-    ledgerTrades, 
-    hourly_avg, 
-    left_on=['hourly','currency'], 
-    right_on=['reference_at_date', 'currency'], 
-    how='left',
-    suffixes=('_ledger', '_rates')
-)
+Set pipeline_backend to 'duckdb' to run the pipeline as one lazy DuckDB query plan instead of pandas (duckdbPipeline.py) - only the
+needed csv columns are read and the joins, pricing, statuses and groupbys run multithreaded, with the same results. Needs pip install duckdb.
 
-combined_df = combined_df.drop_duplicates()
+rate_pricing sets how each ledger leg is priced in USD - 'hourly' (the default) for the original hourly average rate or 'hourly_ffill'
+for the hourly average rate carried forward over hours with no rate (looked up in a currency x hour grid saved next to rates.csv -
+rateGrid.py), or 'nearest' | 'previous' | 'interpolate' rate snapshot within rate_tolerance (sorted as-of join per currency). The
+figures quoted in the analysis below were worked out with the hourly rates - the other methods price the legs that fall in an hour with
+no rate snapshot as well, so the volumes (and the figures) change slightly. See dataPipeline.priceLedgerTrades.
 
-#### calculate the usd_volumne per trade
-combined_df['usd_volume'] = combined_df['balance_delta'] * combined_df['average_price_per_usd']
+The trade distributions (graphs 1 and 3) are drawn from the trade counts per hour/day of the aggregate cube - set raw_trade_histograms
+to True to send every trade of the month to a plotly histogram instead (only sensible for small data files).
 
+The tables behind the "Show ..." toggles are only worked out when they are switched on, and are shown table_page_rows rows at a time
+(with a page number to move through them) so a big table, e.g. all of a month's trades, is never sent to the browser in one go.
 
-#############################################################################################################################################
-################ Transacting Segments Mapping ###############################################################################################
-#############################################################################################################################################
+Set instrument_stages to True to record the wall time, rows in/out and peak memory of every pipeline stage and graph function that runs
+on a rerun (instrumentation.py) - they are shown in the "Stage Timings" panel at the bottom of the sidebar and, if instrument_log is set
+to a file path, appended to that file as JSON lines. When a section reruns on its own (an input inside it changed), its stages are
+recorded as a run of their own and shown in a "Stage Timings" panel at the bottom of that section.
 
-comment = '''
-Next I had to work out the transacting segment for each customer for each month - ensuring that clients received only one status per month.
-We were given 4 client status to map nemely: New, Returning, Churned and Ractivated. Since we were only given 3 months worth of data (Jan-2020 to March-2020),
-I made the assumption the clients trading in first month would all be classified as returning - without December-2019 data, it was not possible to identify
-New, Churned or Reactivated clients and as such, I made the assumption that all clients traded before and were returning (Luno was established in 2013).
-
-The process I followed was to identify the unique users (based on their user_id's) for each month which were stored as lists and then
-to from this work out the users the either new or missing from monthly lists. The results from this would then help classify those customers
-into ther respective status for the particular month.
-
-Thereafter once I had the customer status for each it then became a matter of mapping these classifications into the data for that client. 
-The steps followed are outlined below:
-'''
-
-################################################################################################################################################
-#### Step 1: Obtain the unique users that traded for each month ################################################################################
-################################################################################################################################################
-
-users_jan_2020 = combined_df[combined_df['year_month'] == '2020-01']['user_id'].unique().tolist()
-users_feb_2020 = combined_df[combined_df['year_month'] == '2020-02']['user_id'].unique().tolist()
-users_mar_2020 = combined_df[combined_df['year_month'] == '2020-03']['user_id'].unique().tolist()
-all_users = combined_df['user_id'].unique().tolist()
-
-################################################################################################################################################
-#### Step 2: Work out customers that are new/missing from either monthly list ##################################################################
-################################################################################################################################################
-
-comment = '''
-Churned customers are those that traded the previous month but are missing from the current month
-For Customers churned for Feb would appear in the January customer list (previous month) BUT NOT in the Feb customer list (current month)
-Similarly for clients churned in March - they would be present in the Feb client list but not in the March list 
-'''
-churned_feb = list(set(users_jan_2020) - set(users_feb_2020))
-churned_mar = list(set(users_feb_2020) - set(users_mar_2020))
-
-#### New Clients would be present in the current month but not in ANY of the preceeding months###############################################
-new_feb = list(set(users_feb_2020) - set(users_jan_2020))
-new_mar = list(set(users_mar_2020) - set(users_feb_2020) - set(users_jan_2020))
-
-#### Reactivated Customers were those clients that appeared in the March Client list AND in the CHURNED Febuary customer list################
-reactivated_mar = list(set(users_mar_2020) & set(churned_feb))
-
-#### Returning Customers were those that traded in both the current and preceeding months - so appeared in both customer lists ##############
-returning_users_feb = list(set(users_feb_2020) & set(users_jan_2020))
-returning_users_mar = list(set(users_mar_2020) & set(users_feb_2020))
-
-################################################################################################################################################
-#### Step 3: After obtaining the customer statuses for each month I then mapped them to our dataframe using teh mask method as below ###########
-################################################################################################################################################
-
-# Initialize status column
-combined_df['status'] = 'Unknown'
-
-# 2020-01: All users are Returning
-combined_df.loc[combined_df['year_month'] == '2020-01', 'status'] = 'Returning'
-
-# 2020-02: Classify based on lists
-feb_mask = combined_df['year_month'] == '2020-02'
-combined_df.loc[feb_mask & combined_df['user_id'].isin(new_feb), 'status'] = 'New'
-combined_df.loc[feb_mask & combined_df['user_id'].isin(returning_users_feb), 'status'] = 'Returning'
-
-# 2020-03: Classify based on lists  
-mar_mask = combined_df['year_month'] == '2020-03'
-combined_df.loc[mar_mask & combined_df['user_id'].isin(new_mar), 'status'] = 'New'
-combined_df.loc[mar_mask & combined_df['user_id'].isin(returning_users_mar), 'status'] = 'Returning'
-combined_df.loc[mar_mask & combined_df['user_id'].isin(reactivated_mar), 'status'] = 'Reactivated'
-
-#### cleaned dataframe to have ONLY the required columns for our analysis ##############################################################
-combined_df = combined_df[['timestamp_at', 'year_month', 'day', 'hour', 'foreign_id', 'user_id', 'status', 'usd_volume', 'market_pair']]
-
-comment = '''
-Finally, since each trade had both a debit and a credit amount, the resulting dataframe produced a positive and negative amount
-for the same trade come through in the usd_volume column.  
-
-First I calculated the average trade volume - using the groubpy function I calculated the |absolute| mean trade volume
-I could have dropped the negative values but picked up that there were some trades that had more than one leg - so to be safe, I 
-grouped trades and calculated the mean usd volume per trade.
-
-Thereafter I merged this newly created dataframe with the previous dataframe, this ensured that only the positive trades volume would
-would be represented for each trade whilst retaining all the information from the previous dataframe.
-'''
-
-#### Calulate the absolute usd volume traded for each trade
-transactions_vol = combined_df.groupby('foreign_id')['usd_volume'].apply(lambda x: x.abs().mean()).reset_index()
-
-#### Merge this dataframe with the previous dataframe 
-users_combined = pd.merge(
-    transactions_vol, 
-    combined_df.sort_values('timestamp_at'), 
-    left_on='foreign_id', 
-    right_on='foreign_id', 
-    how='left',
-    suffixes=('_trans', '_combined')
-)
-
-#### Cleanup dataframe and drop any duplicate rows/columns
-users_combined = users_combined.drop_duplicates(subset=['foreign_id'])
-users_combined['usd_volume'] = users_combined['usd_volume_trans']
-users_combined = users_combined.drop(['foreign_id', 'usd_volume_combined', 'usd_volume_trans'], axis=1)
-
-
-comment = '''
-Next for completeness, I wanted to add back the customers that were identified as churned in February and March.
-These customers would not have traded in these months and so would have had a usd_volume amout of zero BUT
-I want to included them so we could keep track and see the Churned clients.
-
-I first added back the churned customers for Feb by creating a dictionary with the same fields as my dataframe for each Churned client
-Each dictionary was stored in a list and then converted to a dataframe bfore being merged with the main dataframe and a new dataframe
-was created with the complete list of customers per trade and absolute usd volume.
-
-The process was repeated for the Churned customers for March.
+The download buttons export their dataframe (in the format selected in the sidebar - csv, gzip/zstd compressed csv or parquet) only when
+they are clicked, writing it to disk in chunks and keeping the most recent exports in a size bounded cache (dataExport.py).
 '''
 
+accounts_path = "./files/accounts.csv"
+ledger_path = "./files/ledger_entries.csv"
+trades_path = "./files/trades.csv"
+rates_path = "./files/rates.csv"
 
-#### add churned users Feb
-febDate = users_combined[users_combined['year_month'] == '2020-02']['timestamp_at'].max()
-feb_churned_rows = []
-
-#### create dictionary for each churned customer
-for user in churned_feb:
-    feb_churned_rows.append({
-        'timestamp_at': febDate,
-        'year_month': '2020-02',
-        'day':'-',
-        'hour':'-',
-        'user_id': user,
-        'status': 'Churned',
-        'market_pair': '-',
-        'usd_volume': 0,
-    })
-
-#### Convert to DataFrame and add to original
-feb_churned_df = pd.DataFrame(feb_churned_rows)
-updated_df = pd.concat([users_combined, feb_churned_df], ignore_index=True) 
-updated_df = updated_df.drop_duplicates()
-
-
-#### add churned users March
-marDate = users_combined[users_combined['year_month'] == '2020-03']['timestamp_at'].max()
-mar_churned_rows = []
-
-for user in churned_mar:
-    mar_churned_rows.append({
-        'timestamp_at': marDate,
-        'year_month': '2020-03',
-        'day':'-',
-        "hour":'-',
-        'user_id': user,
-        'status': 'Churned',
-        'market_pair': "-",
-        'usd_volume': 0,
-    })
-
-#### Convert to DataFrame and add to original
-mar_churned_df = pd.DataFrame(mar_churned_rows)
-updated_df = pd.concat([updated_df, mar_churned_df], ignore_index=True)   
-updated_df = updated_df.drop_duplicates()
-
-#### Arranged updated_df with complete customer list in ascending order
-updated_df = updated_df.sort_values('timestamp_at')
-
-#### Cleaned updated_df to make it easier to analyse and work with
-updated_df['year_month'] = updated_df['year_month'].astype(str)
-updated_df['day'] = updated_df['day'].astype(str)
-updated_df['hour'] = updated_df['hour'].astype(str)
-churn_mask = updated_df['timestamp_at'] == '-'
-updated_df.loc[updated_df['status'] == "Churned", 'timestamp_at'] = '-'
-
-#############
-comment = '''
-The updated_df was then used as the foundational dataframe and basis from which further analysis was done. Using this dataframe, I was abble
-to aggregate and group data into year-month, client status, market-pairs etc... to produce visualizations and obtain insights into customer 
-behaviour. 
-'''
+ledger_chunksize = None
+incremental_ingest = False
+pipeline_backend = 'pandas'
+rate_pricing = 'hourly'
+rate_tolerance = RATE_TOLERANCE
+raw_trade_histograms = False
+table_page_rows = 100
+client_search_limit = 50
+background_warmup = True
+warmup_watch_seconds = 30
+instrument_stages = False
+instrument_log = None
+
+if instrument_stages:
+    enableInstrumentation(instrument_log)
+else:
+    disableInstrumentation()
+startRun()
+
+# the dataset is built once per server process and shared by every session (each session gets a zero-copy, read-only view of it)
+def loadData():
+    if incremental_ingest:
+        return loadShared(loadDatasetIncremental, accounts_path, ledger_path, trades_path, rates_path, pricing=rate_pricing, tolerance=rate_tolerance)
+    elif ledger_chunksize:
+        return loadShared(loadDatasetChunked, accounts_path, ledger_path, trades_path, rates_path, chunksize=ledger_chunksize, pricing=rate_pricing, tolerance=rate_tolerance)
+    elif pipeline_backend == 'duckdb':
+        return loadShared(loadDatasetDuckdb, accounts_path, ledger_path, trades_path, rates_path, pricing=rate_pricing, tolerance=rate_tolerance)
+    else:
+        return loadShared(loadDataset, accounts_path, ledger_path, trades_path, rates_path, pricing=rate_pricing, tolerance=rate_tolerance)
+
+
+def stageTimings(records, container):
+    with container:
+        if records:
+            stage_df = pd.DataFrame(records)
+            stage_df['stage'] = ['  ' * depth + name for depth, name in zip(stage_df['depth'], stage_df['stage'])]
+            st.write(f"**{len(stage_df)}** stages ran on this rerun, **{stage_df.loc[stage_df['depth'] == 0, 'seconds'].sum():.3f}s** in total")
+            st.dataframe(stage_df.drop(columns=['depth']), hide_index=True)
+        else:
+            st.write("No pipeline stages or graphs were rebuilt on this rerun")
+
+
+@st.fragment(run_every=1)
+def warmupProgress():
+    warmup = warmupStatus()
+    if warmup['ready']:
+        st.rerun()
+    if warmup['state'] == 'failed':
+        st.error(f"Loading the data failed - {warmup['error']}")
+        if st.button("Retry"):
+            retryWarmup()
+    else:
+        st.progress(warmup['progress'], text=f"⏳ Preparing the dashboard - {warmup['step'] or 'starting'} ({warmup['seconds']:.0f}s)")
+
+
+if background_warmup:
+    warmup = startWarmup([accounts_path, ledger_path, trades_path, rates_path], loadData, defaultViewTasks(raw_trade_histograms),
+                         settings=(incremental_ingest, ledger_chunksize, pipeline_backend, rate_pricing, rate_tolerance), watch=warmup_watch_seconds)
+    if not warmup['ready']:
+        st.image(banner, width=100)
+        warmupProgress()
+        st.stop()
+
+dataset = loadData()
+
+# the stages of the warm-up ran on its own thread - they are shown in a panel of their own
+if instrument_stages and background_warmup and warmup['records']:
+    stageTimings(warmup['records'], st.sidebar.expander("⏱️ Warm-up Stage Timings", expanded=False))
 
-#############
 # final dataframe for submission
-final_df = updated_df[['timestamp_at', 'year_month', 'user_id', 'status', 'market_pair', 'usd_volume']]
+final_df = dataset['final_df']
 
+# number of trade legs priced | interpolated | left unpriced by the rate matching
+pricing_report = dataset['pricing_report']
 ############################################################################################################################################
 #### Streamlit Sidebar widgets #############################################################################################################
 ############################################################################################################################################
@@ -357,141 +181,77 @@ with st.sidebar:
             key='Rocket' 
             )
 
-st.sidebar.markdown("<h2 style='text-align: left; padding-left: 0px; font-size: 35px'><b>Graph Inputs<b></h2>", unsafe_allow_html=True)
-
-attribute = st.sidebar.radio("attribute",['Count', 'Percent'], horizontal=True)
-singleCurrency = st.sidebar.selectbox("select market_pair", updated_df['market_pair'].unique())
-singleMonth = st.sidebar.radio("select year-month", updated_df['year_month'].unique(), horizontal=True)
-status = st.sidebar.radio("select customers status",users_combined['status'].unique(), horizontal=True)
+st.sidebar.markdown("<h2 style='text-align: left; padding-left: 0px; font-size: 35px'><b>Downloads<b></h2>", unsafe_allow_html=True)
+download_format = st.sidebar.selectbox("download format", list(EXPORT_FORMATS))
 
-st.sidebar.markdown("<h2 style='text-align: left; padding-left: 0px; font-size: 35px'><b>Select Client<b></h2>", unsafe_allow_html=True)
-client_id = st.sidebar.selectbox("customer id",updated_df['user_id'].unique())
+# options for the section inputs (month | market-pair | status | client)
+options = sectionOptions(dataset)
 
 ############################################################################################################################################
 ############################################################################################################################################
-#### Aggregrating and Grouping Dataframes for analysis #####################################################################################
+#### Dashboard Sections ####################################################################################################################
 ############################################################################################################################################
 ############################################################################################################################################
 
 comment = '''
-Dataframe grouped by market_pair + year_month & aggregated by usd_volume
-'''
-monthly_pairs_df = updated_df.groupby(['market_pair', 'year_month']).agg(usd_volume=('usd_volume', 'sum')).reset_index()
-
-# dataframe filtered on single market-pair
-singleMonthlyPair_df= monthly_pairs_df[monthly_pairs_df['market_pair'] == singleCurrency]
-singleMonthlyPair_df['usd_percentage'] = (singleMonthlyPair_df['usd_volume'] / singleMonthlyPair_df['usd_volume'].sum())
-
-# dataframe filtered on single month
-allPairsMonthly_df = monthly_pairs_df[monthly_pairs_df['year_month'] == singleMonth]
-allPairsMonthly_df = allPairsMonthly_df[allPairsMonthly_df['market_pair'] != '-']
-allPairsMonthly_df['usd_percentage'] = (allPairsMonthly_df['usd_volume'] / allPairsMonthly_df['usd_volume'].sum())
-
-#############
-comment = '''
-Dataframe that first filters on the year_month & then groups by hour/day before aggregating by usd_volume
-'''
-users_combined_monthly = users_combined[users_combined['year_month'] == singleMonth]
-
-# Group by hour and sum the USD amounts + calculate hourly percentage contribution
-hourly_sums = users_combined_monthly.groupby('hour')['usd_volume'].sum().reset_index()
-hourly_sums['usd_percentage'] = (hourly_sums['usd_volume'] / hourly_sums['usd_volume'].sum())
-
-# Group by Day and sum the USD amounts + calculate the day's percentage contribution
-daily_sums = users_combined_monthly.groupby('day')['usd_volume'].sum().reset_index()
-daily_sums['usd_percentage'] = (daily_sums['usd_volume'] / daily_sums['usd_volume'].sum())
-
-
-#############
-comment = '''
-Dataframe grouped by client status + market_pair & aggregated by usd_volume
-'''
-status_sums = updated_df.groupby(['status', 'market_pair'])['usd_volume'].sum().reset_index()
-status_sums['usd_vol_pct'] = status_sums.groupby('status')['usd_volume'].transform(lambda x: (x / x.sum()))
-
-# Dataframe filtered by customer status 
-status_df = status_sums[status_sums['status'] == status]
-
-
-#############
-comment = '''
-Dataframe grouped by user_id + market_pair & aggregated by usd_volume
-'''
-client_sums = updated_df.groupby(['user_id', 'market_pair'])['usd_volume'].sum().reset_index()
-client_sums['usd_vol_pct'] = client_sums.groupby('user_id')['usd_volume'].transform(lambda x: (x / x.sum()))
-
-# Dataframe filtered by customer id (single customer) 
-singleCustomer_df = client_sums[client_sums['user_id'] == client_id]
-
-
-#############
-comment = '''
-Here I wanted to count the number of clients that only trades 1 market_pair, 2 market_pairs, etc...
-To do this I created 2 dataframe, the first dataframe is groupedby user_id and aggregated by market_pair (count).
-Then using the first dataframe, I create a second dataframe (also using the groupby function) that counts the market_pairs traded
-for each customer.
+All of the graph inputs used to sit in the sidebar, so changing any one of them (e.g. the client) reran the whole script and rebuilt every
+graph on the page - even the ones that don't depend on it. The dashboard is now split into sections by the inputs they depend on, and each
+section is a streamlit fragment (st.fragment) with its own inputs at the top of it - changing an input only reruns the section it is in:
+
+    ~static - the summary of the business questions and Graph 6 (no inputs)
+    ~month - Graphs 1-5 and 12 (year-month and Count/Percent attribute)
+    ~currency - Graphs 7 and 8 (market_pair)
+    ~status - Graph 10 (customer status)
+    ~client - Graphs 9 and 11 and the client statistics (customer id)
+
+The inputs can't stay in the sidebar as a fragment can't draw into it. Showing one of the tables only reruns the section it is in, and the
+download buttons don't rerun anything (the export is written when they are clicked - dataExport.py). Changing the download format in the
+sidebar still reruns the whole app, as every download button depends on it.
+
+The groupings that do not depend on the inputs (monthly_pairs_df, status_sums, client_sums, client_pairs_count, clients_combined_avg
+and the hourly/daily sums per month) are rolled up once from the aggregate cube in dataPipeline.buildAggregates and cached along with the 
+rest of the dataset. Each section only filters them for its selected month | market-pair | status | client - the client level tables
+through a per-client index (aggregateCube.clientIndex), so switching clients is a lookup however many clients there are. The filtering and
+graphs of each section are done in dashboardViews.py (so the cache warm-up can build them too) and the sections below just lay them out.
 '''
-client_pairs = client_sums.groupby(['user_id']).agg(pairs=('market_pair', 'count')).reset_index()
-client_pairs_count = client_pairs.groupby(['pairs']).count().reset_index()
-client_pairs_count = client_pairs_count.rename(columns={'user_id': 'customers'})
 
-#############
-comment = '''
-The dataframes produced for the client monthly average vs. overall monthly average vs. monthly status average were a bit more involved and required several steps
-First I created a dataframe groupedby user_id, year_month and status & aggregated by the mean usd volume. I also had to calculate another column that computed the 
-average volume by status per month.
+def sectionRun(label):
 
-I then created a second column that was groupedby just the client status and year_month & also aggregated by the mean usd volume.
+    # a section rerunning on its own records its stages as a run of its own (logged and shown at the bottom of the section) - drawn as
+    # part of a full rerun, they go into the full rerun's records and the sidebar panel
+    def decorator(section):
+        @wraps(section)
+        def wrapper():
+            with recordedRun(label) as run:
+                section()
+            if instrument_stages and run is not None:
+                stageTimings(run['records'], st.expander(f"⏱️ Stage Timings ({label})", expanded=False))
+        return wrapper
 
-Thereafter I merged the two datframes - which gave me final datarame that consisted of each clients average volume as well as
-the average monthly volume and avergae monthly volume for that months clients status - this was used as the base for the grouped bar graph for comparison
-for each selected client.
-'''
+    return decorator
 
-# Dataframe 1 grouped by user_id, year_month and status - aggregated by the mean usd volume - additional column for avg volume by status monthly was also computed 
-client_average = updated_df.groupby(['user_id', 'year_month', 'status'])['usd_volume'].mean().reset_index()
-client_average['avg_monthlyStatus_volume'] = client_average.groupby(['year_month', 'status'])['usd_volume'].transform('mean')
-
-# Dataframe 2 grouped by year_month only and aggregated by mean usd volume
-client_average_month = updated_df.groupby(['year_month'])['usd_volume'].mean().reset_index()
-
-# Dataframe 3 produced by merging dataframe 1 and 2 from above based on year_month
-clients_combined_avg = pd.merge(
-    client_average, 
-    client_average_month, 
-    left_on=['year_month'], 
-    right_on=['year_month'], 
-    how='left',
-    suffixes=('_status', '_monthly')
-)
 
-# Rename columns
-clients_combined_avg = clients_combined_avg.rename(columns={'usd_volume_status': 'avg_client_volume', 'usd_volume_monthly': 'avg_monthly_volume'})
+def sectionHeading(title, container=st):
+    container.markdown(f"<h2 style='text-align: left; color: royalblue; padding-left: 0px; font-size: 35px'><b>{title}<b></h2>", unsafe_allow_html=True)
 
-# Dataframe 3 filtered for a specific client (user_id) with year_month column cleaned up for better visualization
-singleClient_average = clients_combined_avg[client_average['user_id'] == client_id]
-singleClient_average['year_month'] = pd.to_datetime(singleClient_average['year_month'], format='%Y-%m')
-singleClient_average = singleClient_average.sort_values('year_month')
-singleClient_average['year_month'] = singleClient_average['year_month'].dt.strftime('%b %Y')
 
-# Caluclate Statistics for selected client
-currentStatus = singleClient_average['status'].iloc[-1]
-singleAverage = singleClient_average['avg_client_volume'].iloc[-1]
-statusAverage = singleClient_average['avg_monthlyStatus_volume'].iloc[-1]
-monthlyAverage = singleClient_average['avg_monthly_volume'].iloc[-1]
+def showTable(column, label, heading, table, name, key):
 
+    # table is a dataframe or a function returning one - only called once the toggle is switched on
+    if not column.toggle(label):
+        return
 
-# Dataframe 3 filtered on a specific month AND then status for all clients
-allClients_monthlyAverage = clients_combined_avg[clients_combined_avg['year_month'] == singleMonth]
-allClients_monthlyAverage = allClients_monthlyAverage[allClients_monthlyAverage['status'] == 'Returning']
+    df = table() if callable(table) else table
+    column.markdown(f"<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>{heading}<b></h2>", unsafe_allow_html=True)
 
-# Calculate Number of clients that traded below the monthly average
-monthlyMean_value = allClients_monthlyAverage['avg_monthlyStatus_volume'].mean()
-clientsBelow_mean_count = (allClients_monthlyAverage['avg_client_volume'] < monthlyMean_value).sum()
-total_count = allClients_monthlyAverage['avg_client_volume'].count()
+    # only the selected page of rows is sent to the browser (the page number resets when the number of pages changes)
+    pages = max(-(-len(df) // table_page_rows), 1)
+    page = column.number_input(f"page (of {pages:,})", min_value=1, max_value=pages, value=1, key=f'{key}-page-{pages}') if pages > 1 else 1
+    start = (page - 1) * table_page_rows
+    column.dataframe(df.iloc[start:start + table_page_rows])
+    column.caption(f"rows {min(start + 1, len(df)):,} - {min(start + table_page_rows, len(df)):,} of {len(df):,}")
 
-# Calculate percentage
-percentage_below_mean = (clientsBelow_mean_count / total_count) * 100
+    column.download_button("Download", **downloadArgs(df, name, download_format), key=key)
 
 #################################################################################################################################################################
 #### Streamlit Front End App Display ############################################################################################################################
@@ -565,164 +325,236 @@ they re-entered again in March when prices were at more attractive levels to buy
 
 """
 
-#### Display the content in expander
-with st.expander("📊 Summary of Business Analysis Questions", expanded=True):
-    st.markdown("<h1 style='text-align: left; padding-left: 0px; font-size: 40px'><b>Summary of Business Question Answers<b></h1>", unsafe_allow_html=True)
-    st.download_button("Download Final Dataframe",convert_df(final_df),"final_clean_df.csv", "text/csv",key='final_clean_df-csv')
-    st.markdown(markdown_content)
-    
+#### Display the content in expander - only rendered while it is open (collapsing it reruns just this fragment)
+@st.fragment
+def summarySection():
+    summary = st.expander("📊 Summary of Business Analysis Questions", expanded=True, key='summary_open', on_change='rerun')
+    if not summary.open:
+        return
+    with summary:
+        st.markdown("<h1 style='text-align: left; padding-left: 0px; font-size: 40px'><b>Summary of Business Question Answers<b></h1>", unsafe_allow_html=True)
+        st.download_button("Download Final Dataframe", **downloadArgs(final_df, "final_clean_df", download_format),key='final_clean_df-csv')
+        st.caption(f"💡 USD pricing ({rate_pricing} rate within {rate_tolerance}): **{pricing_report['priced']:,}** trade legs priced, "
+                   f"**{pricing_report['interpolated']:,}** interpolated and **{pricing_report['unpriced']:,}** unpriced")
+        st.markdown(markdown_content)
+
+
+summarySection()
+
 #################################################################################################################################################################
+#### Month Section ##############################################################################################################################################
 #### Graphs 1 displays the Hourly Trade Distribution Per Month in Count and Percentage ##########################################################################
 #### Graphs 2 displays the Hourly USD Volume Distribution Per Month in Count and Percentage #####################################################################
+#### Graphs 3 displays the Daily Trade Distribution Per Month in Count and Percentage ###########################################################################
+#### Graphs 4 displays the Daily USD Volume Distribution Per Month in Count and Percentage ######################################################################
+#### Graphs 5 displays the Overall Market-Pair Volume Traded for each Momth #####################################################################################
+#### Graphs 12 displays the distribution of average volume for clients in the status for that month #############################################################
 #################################################################################################################################################################
 
-st.markdown("<h2 style='text-align: left; color: royalblue; padding-left: 0px; font-size: 35px'><b>Hourly Distribution Per Month<b></h2>", unsafe_allow_html=True)
-col1, col2 = st.columns([1,1])
+comment = '''
+The number of trades and USD volume per hour/day for the selected month (with the hourly/daily percentage contribution) - the hourly/daily
+sums are sliced from the per-month roll-ups of the aggregate cube rather than grouping the trades again. The trades themselves are only
+filtered on the year_month when a trades table is opened (or raw_trade_histograms is on).
 
-col1.plotly_chart(tradeDistPerMonth(users_combined_monthly, attribute, 'hour', colors[0], 'Graph 1 - Hourly Trade Distribution Per Month'))
-showHourlyTrades = col1.toggle('Show hourly trades')
-if showHourlyTrades:
-      col2.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Hourly Trades<b></h2>", unsafe_allow_html=True)
-      col1.dataframe(users_combined_monthly)
-      col1.download_button("Download",convert_df(users_combined_monthly),"hourly_trades.csv", "text/csv",key='hourly_trades-csv')
+Dataframe grouped by market_pair + year_month & aggregated by usd_volume, filtered on the single month.
 
-col2.plotly_chart(volumeDistPerMonth(hourly_sums, attribute, 'hour', colors[2], 'Graph 2 - Hourly USD Volume Distribution Per Month'))
-showHourlyVolume = col2.toggle('Show hourly volume')
-if showHourlyVolume:
-      col2.subheader('Hourly Volume')
-      col2.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Hourly Volume<b></h2>", unsafe_allow_html=True)
-      col2.dataframe(hourly_sums)
-      col2.download_button("Download",convert_df(hourly_sums),"hourly_volumes.csv", "text/csv",key='hourly_volume-csv')
+The client averages (see the client section) filtered on the month AND then the Returning status for all clients, along with the number of
+clients that traded below the monthly average.
+'''
 
+@st.fragment
+@sectionRun('month_section')
+@instrumented('month_section')
+def monthSection():
 
-#################################################################################################################################################################
-#### Graphs 3 displays the Daily Trade Distribution Per Month in Count and Percentage ###########################################################################
-#### Graphs 4 displays the Daily USD Volume Distribution Per Month in Count and Percentage ######################################################################
-#################################################################################################################################################################
+    sectionHeading("Monthly Distributions")
+    inputA, inputB = st.columns([3,1])
+    singleMonth = inputA.radio("select year-month", options['months'], horizontal=True, key='singleMonth')
+    attribute = inputB.radio("attribute",['Count', 'Percent'], horizontal=True, key='attribute')
 
-st.markdown("<h2 style='text-align: left; color: royalblue; padding-left: 0px; font-size: 35px'><b>Daily Distribution Per Month<b></h2>", unsafe_allow_html=True)
-col3, col4 = st.columns([1,1])
+    views = monthViews(dataset, singleMonth, attribute, raw=raw_trade_histograms)
 
-col3.plotly_chart(tradeDistPerMonth(users_combined_monthly, attribute, 'day', colors[1], 'Graph 3 - Daily Trade Distribution Per Month'))
-showDailyTrades = col3.toggle('Show daily trades')
-if showDailyTrades:
-      col3.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Daily Trades<b></h2>", unsafe_allow_html=True)
-      col3.dataframe(users_combined_monthly)
-      col3.download_button("Download",convert_df(users_combined_monthly),"daily_trades.csv", "text/csv",key='daily_trades-csv')
+    #### Hourly Distribution Per Month (Graphs 1 and 2)
+    sectionHeading("Hourly Distribution Per Month")
+    col1, col2 = st.columns([1,1])
 
-col4.plotly_chart(volumeDistPerMonth(daily_sums, attribute, 'day', colors[3], 'Graph 4 - Daily USD Volume Distribution Per Month'))
-showHourlyVolume = col4.toggle('Show daily volume')
-if showHourlyVolume:
-      col4.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Daily Volume<b></h2>", unsafe_allow_html=True)
-      col4.dataframe(daily_sums)
-      col4.download_button("Download",convert_df(daily_sums),"daily_volumes.csv", "text/csv",key='daily_volume-csv')
+    col1.plotly_chart(views['graph1'])
+    showTable(col1, 'Show hourly trades', 'Hourly Trades', views['trades'], "hourly_trades", 'hourly_trades-csv')
 
+    col2.plotly_chart(views['graph2'])
+    showTable(col2, 'Show hourly volume', 'Hourly Volume', views['hourly_sums'], "hourly_volumes", 'hourly_volume-csv')
 
-#################################################################################################################################################################
-#### Graphs 5 displays the Overall Market-Pair Volume Traded for each Momth #####################################################################################
-#### Graphs 6 displays the Number (Count) of Market-Pairs traded by Clients #####################################################################################
-#################################################################################################################################################################
+    #### Daily Distribution Per Month (Graphs 3 and 4)
+    sectionHeading("Daily Distribution Per Month")
+    col3, col4 = st.columns([1,1])
 
-st.markdown("<h2 style='text-align: left; color: royalblue; padding-left: 0px; font-size: 35px'><b>Monthly USD Volume Per Market Pair<b></h2>", unsafe_allow_html=True)
-col5, col6 = st.columns([1,1])
-col5.plotly_chart(marketPairVolume(allPairsMonthly_df, attribute, f'Graph 5 - USD Volume Traded for {singleMonth}'))
-showAllPairsVolume = col5.toggle('All Mkt_Pairs Volume')
-if showAllPairsVolume:
-      col5.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>All Mkt_Pairs Volume<b></h2>", unsafe_allow_html=True)
-      col5.dataframe(allPairsMonthly_df)
-      col5.download_button("Download",convert_df(allPairsMonthly_df),"all_mkt_pairs_volume.csv", "text/csv",key='all_mkt_pairs-csv')
-
-col6.markdown(" ")
-col6.markdown(" ")
-col6.plotly_chart(pieGraph(client_pairs_count, label='pairs', value='customers', gap=0.3, title='Graph 6 - Client Pairs Traded'))
-col6.markdown(" ")
-showClientPairsCount = col6.toggle('Show Client Pairs Count')
-if showClientPairsCount:
-      col6.subheader('Client Pairs Count')
-      col6.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Client Pairs Count<b></h2>", unsafe_allow_html=True)
-      col6.dataframe(client_pairs_count)
-      col6.download_button("Download",convert_df(client_pairs_count),"client_pairs_count.csv", "text/csv",key='client_pairs_count-csv')
+    col3.plotly_chart(views['graph3'])
+    showTable(col3, 'Show daily trades', 'Daily Trades', views['trades'], "daily_trades", 'daily_trades-csv')
 
+    col4.plotly_chart(views['graph4'])
+    showTable(col4, 'Show daily volume', 'Daily Volume', views['daily_sums'], "daily_volumes", 'daily_volume-csv')
+
+    #### Monthly USD Volume Per Market Pair (Graph 5) and Returning Client Average Volume (Graph 12)
+    sectionHeading("Monthly Market Pair Volume & Returning Client Averages")
+    col5, col12 = st.columns([1,1])
+
+    col5.plotly_chart(views['graph5'])
+    showTable(col5, 'All Mkt_Pairs Volume', 'All Mkt_Pairs Volume', views['pairs'], "all_mkt_pairs_volume", 'all_mkt_pairs-csv')
+
+    col12.plotly_chart(views['graph12'])
+    col12.write(views['below_mean'])
+    showTable(col12, 'Show Monthly Status Avg Comparison', 'Monthly Status Avg Comparison', views['clients'], "all_client_comp", 'all_client_comp-csv')
+
+
+monthSection()
 
 #################################################################################################################################################################
+#### Currency Section ###########################################################################################################################################
 #### Graphs 7 displays the Monthly Volume traded for a Single Currency Pair #####################################################################################
 #### Graphs 8 displays % contribution/split traded for that single currency for each of the months ##############################################################
 #################################################################################################################################################################
 
-st.markdown("<h2 style='text-align: left; color: royalblue; padding-left: 0px; font-size: 35px'><b>Monthly Currency Split<b></h2>", unsafe_allow_html=True)
-st.markdown(" ")
-st.markdown(" ")
-col7, col8 = st.columns([1,1])
+comment = '''
+Dataframe grouped by market_pair + year_month & aggregated by usd_volume, filtered on the single market-pair
+'''
+
+@st.fragment
+@sectionRun('currency_section')
+@instrumented('currency_section')
+def currencySection():
+
+    sectionHeading("Monthly Currency Split")
+    singleCurrency = st.selectbox("select market_pair", options['market_pairs'], key='singleCurrency')
+
+    views = currencyViews(dataset, singleCurrency)
+
+    col7, col8 = st.columns([1,1])
 
-col7.plotly_chart(marketPairLine(singleMonthlyPair_df, f'Graph 7 - {singleCurrency} Volume Traded per Month'))
-showMonthlyVolTraded = col7.toggle('Show Monthly Volume Traded')
-if showMonthlyVolTraded:
-      col7.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Monthly Volume Traded<b></h2>", unsafe_allow_html=True)
-      col7.dataframe(singleMonthlyPair_df)
-      col7.download_button("Download",convert_df(singleMonthlyPair_df),"monthly_volume_traded.csv", "text/csv",key='monthly_volume_traded-csv')
+    col7.plotly_chart(views['graph7'])
+    showTable(col7, 'Show Monthly Volume Traded', 'Monthly Volume Traded', views['pair'], "monthly_volume_traded", 'monthly_volume_traded-csv')
 
-col8.plotly_chart(pieGraph(singleMonthlyPair_df, label='year_month', value='usd_volume', gap=0, title=f'Graph 8 - {singleCurrency} Split Per Month'))
-showMonthlyCcySplit = col8.toggle('Show Monthly Currency Split')
-if showMonthlyCcySplit:
-      col8.subheader('Monthly Currency Split')
-      col8.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Monthly Currency Split<b></h2>", unsafe_allow_html=True)
-      col8.dataframe(singleMonthlyPair_df)
-      col8.download_button("Download",convert_df(singleMonthlyPair_df),"monthly_currency_split.csv", "text/csv",key='monthly_currency_split-csv')
+    col8.plotly_chart(views['graph8'])
+    showTable(col8, 'Show Monthly Currency Split', 'Monthly Currency Split', views['pair'], "monthly_currency_split", 'monthly_currency_split-csv')
 
 
+currencySection()
+
 #################################################################################################################################################################
+#### Client Section #############################################################################################################################################
 #### Graphs 9 the Total Volume Traded by the selected Client for each Currency Pair #############################################################################
+#### Graphs 11 displays the Avg Monthly Volume Traded by the selected Client vs. Status Monthly Average vs. Overall Monthly Average #############################
+#################################################################################################################################################################
+
+comment = '''
+Dataframe grouped by user_id + market_pair & aggregated by usd_volume, filtered by customer id (single customer) - looked up in the
+per-client index rather than scanning every client's rows.
+
+The customer id is picked from a search - as the id is typed, the ids starting with it are looked up in a sorted prefix index on the server
+(clientSearch.py) and only the top client_search_limit of them by total USD volume are put in the selectbox, so the list sent to the
+browser stays the same size however many clients there are.
+
+The dataframes produced for the client monthly average vs. overall monthly average vs. monthly status average were a bit more involved and required several steps
+First I created a dataframe groupedby user_id, year_month and status & aggregated by the mean usd volume. I also had to calculate another column that computed the 
+average volume by status per month.
+
+I then created a second column that was groupedby just the client status and year_month & also aggregated by the mean usd volume.
+
+Thereafter I merged the two datframes - which gave me final datarame that consisted of each clients average volume as well as
+the average monthly volume and avergae monthly volume for that months clients status - this was used as the base for the grouped bar graph for comparison
+for each selected client.
+'''
+
+@st.fragment
+@sectionRun('client_section')
+@instrumented('client_section')
+def clientSection():
+
+    sectionHeading("USD Volume Traded & Avg Volume Comparison by Client")
+    # the ids are searched on the server (clientSearch.py) - the selectbox only holds the top traders matching the search
+    search = st.text_input("search customer id", key='client_search', type='search', live=True, placeholder="start of a customer id")
+    clients, volumes, matched = searchClients(dataset['client_search'], search, client_search_limit)
+    if matched == 0:
+        st.info(f"No customer id starts with '{search.strip()}'")
+        return
+
+    client_volumes = dict(zip(clients, volumes))
+    client_id = st.selectbox("customer id", clients, key='client_id', format_func=lambda user: f"{user}  (${client_volumes[user]:,.0f})")
+    st.caption(f"Top {len(clients):,} of {matched:,} matching customers by USD volume traded")
+
+    views = clientViews(dataset, client_id)
+    if views['stats'] is None:
+        st.info(f"No trades found for customer {client_id}")
+        return
+
+    for stat, column in zip(views['stats'], st.columns(4)):
+        column.write(stat)
+
+    col9, col11 = st.columns([1,1])
+
+    col9.plotly_chart(views['graph9'])
+    showTable(col9, 'Show Customer Volume', 'Customer Volume Traded', views['customer'], "customer_volume", 'customer_volume-csv')
+
+    col11.plotly_chart(views['graph11'])
+    showTable(col11, 'Show Client Comparison', 'Client Avg Vol Comparison', views['client'], "single_client_comp", 'single_client_comp-csv')
+
+
+clientSection()
+
+#################################################################################################################################################################
+#### Status Section | Static Section ############################################################################################################################
 #### Graphs 10 displays the Volume Traded by Status Only ########################################################################################################
+#### Graphs 6 displays the Number (Count) of Market-Pairs traded by Clients #####################################################################################
 #################################################################################################################################################################
 
-st.markdown("<h2 style='text-align: left; color: royalblue; padding-left: 0px; font-size: 35px'><b>USD Volume Traded Per Month by Client & Status<b></h2>", unsafe_allow_html=True)
-col9, col10 = st.columns([1,1])
+comment = '''
+Dataframe grouped by client status + market_pair & aggregated by usd_volume, filtered by customer status
+
+Here I wanted to count the number of clients that only trades 1 market_pair, 2 market_pairs, etc...
+To do this I created 2 dataframe, the first dataframe is groupedby user_id and aggregated by market_pair (count).
+Then using the first dataframe, I create a second dataframe (also using the groupby function) that counts the market_pairs traded
+for each customer.
+
+Graph 10 (status section) and Graph 6 (no inputs) share a row - each is its own fragment drawn into its column.
+'''
+
+@st.fragment
+@sectionRun('status_section')
+@instrumented('status_section')
+def statusSection():
+
+    status = st.radio("select customers status", options['statuses'], horizontal=True, key='status')
 
-col9.plotly_chart(marketPairVolume(singleCustomer_df, 'usd_volume', 'Graph 9 - USD Volume Traded by Selected Client'))
-showCustomerVol = col9.toggle('Show Customer Volume')
-if showCustomerVol:
-      col9.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Customer Volume Traded<b></h2>", unsafe_allow_html=True)
-      col9.dataframe(singleCustomer_df)
-      col9.download_button("Download",convert_df(singleCustomer_df),"customer_volume.csv", "text/csv",key='customer_volume-csv')
+    views = statusViews(dataset, status)
 
+    st.plotly_chart(views['graph10'])
+    showTable(st, 'Show Status Volume', 'Status Volume Traded', views['status'], "status_volume", 'status_volume-csv')
 
-col10.plotly_chart(marketPairVolume(status_df, 'usd_volume', 'Graph 10 - USD Volume Traded By Status'))
-showStatusVol = col10.toggle('Show Status Volume')
-if showStatusVol:
-      col10.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Status Volume Traded<b></h2>", unsafe_allow_html=True)
-      col10.dataframe(status_df)
-      col10.download_button("Download",convert_df(status_df),"status_volume.csv", "text/csv",key='status_volume-csv')
 
+@st.fragment
+@sectionRun('static_section')
+@instrumented('static_section')
+def clientPairsSection():
 
+    views = clientPairsViews(dataset)
+
+    st.plotly_chart(views['graph6'])
+    showTable(st, 'Show Client Pairs Count', 'Client Pairs Count', views['pairs'], "client_pairs_count", 'client_pairs_count-csv')
+
+
+sectionHeading("USD Volume Traded by Status & Client Pairs Traded")
+col10, col6 = st.columns([1,1])
+with col10:
+    statusSection()
+with col6:
+    clientPairsSection()
 
 #################################################################################################################################################################
-#### Graphs 11 displays the Avg Monthly Volume Traded by the selected Client vs. Status Monthly Average vs. Overall Monthly Average #############################
-#### Graphs 12 displays the distribution of average volume for clients in the status for that month #############################################################
+#### Stage Timings Panel (instrument_stages) ####################################################################################################################
 #################################################################################################################################################################
 
-st.markdown(" ")
-st.markdown(" ")
-st.markdown("<h2 style='text-align: left; color: royalblue; padding-left: 0px; font-size: 35px'><b>Monthly Client Status Avg Volume Comparison<b></h2>", unsafe_allow_html=True)
-col11, col12 = st.columns([1,1])
-
-col11.plotly_chart(clientMonthlyStatusAvg(singleClient_average, title='Graph 11 - Average USD Volume Traded by Client vs. Monthly Average vs. Status Average',))
-st.sidebar.write(f"💡 Current Client Status: **{currentStatus}**")
-st.sidebar.write(f"💡 Latest Client Monthly Average: **${singleAverage:,.2f}**")
-st.sidebar.write(f"💡 Monthly Status Average: **${statusAverage:,.2f}**")
-st.sidebar.write(f"💡 Latest Month Average: **${monthlyAverage:,.2f}**")
-showSingleClientComp= col11.toggle('Show Client Comparison')
-if showSingleClientComp:
-      col11.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Client Avg Vol Comparison<b></h2>", unsafe_allow_html=True)
-      col11.dataframe(singleClient_average)
-      col11.download_button("Download",convert_df(singleClient_average),"single_client_comp.csv", "text/csv",key='single_client_comp-csv')
-
-col12.plotly_chart(monthlyClientVolumeNormalised(allClients_monthlyAverage, title='Graph 12 - Distribution of Monthly Average USD Volume Traded By Returning Clients'))
-col12.write(f"💡 **{clientsBelow_mean_count}** out of **{total_count}** clients ({percentage_below_mean:.2f}%) are below the mean (${monthlyMean_value:,.2f})")
-showAllClientComp= col12.toggle('Show Monthly Status Avg Comparison')
-if showAllClientComp:
-      col12.markdown("<h2 style='text-align: left; color: black; padding-left: 0px; font-size: 20px'><b>Monthly Status Avg Comparison<b></h2>", unsafe_allow_html=True)
-      col12.dataframe(allClients_monthlyAverage)
-      col12.download_button("Download",convert_df(allClients_monthlyAverage),"all_client_comp.csv", "text/csv",key='all_client_comp-csv')
+stage_records = finishRun()
+if instrument_stages:
+    stageTimings(stage_records, st.sidebar.expander("⏱️ Stage Timings", expanded=False))
 
 #################################################################################################################################################################
 #################################################################################################################################################################
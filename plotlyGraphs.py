@@ -1,9 +1,13 @@
 #### Import Python Libraries #################################################################################################################
 
+import numpy as np
 import plotly.figure_factory as ff
 import plotly.express as px
 import plotly.graph_objects as go
 
+from figureCache import cachedFigure
+from instrumentation import instrumented
+
 ##############################################################################################################################################
 #### Graph Functions #########################################################################################################################
 ##############################################################################################################################################
@@ -17,11 +21,17 @@ Another reason for doing it this way is that the graphs become replicable in tha
 a graph, I can simply change the dataframe and the appropriate grape will be displayed. Also its easier to control in that any chages needed
 can be made in one play instead of multiple places throughout the code.
 
+Each graph function is memoized with figureCache.cachedFigure - the figure is only rebuilt when the dataframe or arguments passed to it
+change, so a rerun of the app re-uses the figures whose inputs did not change (the returned figures are shared, so treat them as read-only).
+When instrumentation is switched on (instrumentation.py) only the figures that were actually rebuilt are recorded.
+
 
 Inventory of Graphs:
 
 ~tradeDistPerMonth - Hisogram that plots the trade distribution over the month for hourly | daily trades
 
+~binnedCounts - Number of trades in each hour | day, binned in numpy (used by tradeDistPerMonth)
+
 ~volumeDistPerMonth - Bar graph the plots the USD volume traded over the month for hourly | daily trades
 
 ~pieGraph - Pie chart that plots the monthly split (% traded) for a single currency | split for the number of pairs traded by client
@@ -35,6 +45,8 @@ Inventory of Graphs:
 
 ~monthlyClientVolumeNormalised - Normalised (Density Plot) of customers trading in specific Average USD Volume ranges per month with monthly average line
 
+~kdeBandwidth | binnedKde - Bandwidth selection and binned (FFT) kernel density estimate used by monthlyClientVolumeNormalised for large months
+
 '''
 
 ##############################################################################################################################################
@@ -45,16 +57,47 @@ Inventory of Graphs:
 tradeDistPerMonth - Hisogram that plots the trade distribution over the month for hourly | daily trades - the function is imported into the
                     main.py file, one can then just change the dataframe (df), attribute (count or percentage), timeframe (hour or day), 
                     color and title of the chart. The below function will be called and will display a histogram for the chosen inputs.
+
+                    The trades are binned here (binnedCounts) and the histogram is drawn as a bar per hour | day, so the figure only
+                    carries 24 | 31 bars to the browser however many trades there are in the month. Set raw=True to send the trades
+                    themselves to a plotly histogram and let the browser bin them (fine for small data). The df can also already be
+                    counted per hour | day (e.g. the monthly hourly/daily sums rolled up from the aggregate cube) - weights is then the
+                    name of its trade count column, so the month's trades don't have to be filtered out at all.
+
+binnedCounts - Counts the trades in each whole hour | day from the lowest to the highest value with np.bincount (the same size 1 bins
+               as the plotly histogram), returning the bins and their counts. With weights, each value counts as that many trades.
 '''
 
-def tradeDistPerMonth(df, attribute, timeframe, color, title):
+def binnedCounts(values, weights=None):
+
+    present = values.notna().to_numpy()
+    values = values[present].to_numpy(dtype=np.int64)
+    if len(values) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    start = values.min()
+    if weights is None:
+        counts = np.bincount(values - start)
+    else:
+        counts = np.bincount(values - start, weights=weights[present].to_numpy(dtype=np.float64)).astype(np.int64)
+
+    return np.arange(start, start + len(counts)), counts
+
+
+@cachedFigure()
+@instrumented()
+def tradeDistPerMonth(df, attribute, timeframe, color, title, raw=False, weights=None):
     figTradeDist = go.Figure()
 
     if attribute == "Percent":
         template = '%{y:.2%}'
+    else:
+        template = '%{y:,.0f}'
+
+    if raw:
         figTradeDist.add_trace(go.Histogram(
         x=df[timeframe],
-        histnorm='probability',
+        histnorm='probability' if attribute == "Percent" else None,
         name=timeframe, # name used in legend and hover labels
         texttemplate=template,
         xbins=dict( # bins used for histogram
@@ -67,16 +110,12 @@ def tradeDistPerMonth(df, attribute, timeframe, color, title):
         opacity=0.75
     ))
     else:
-        template='%{y:,.0f}'
-        figTradeDist.add_trace(go.Histogram(
-        x=df[timeframe],
+        bins, counts = binnedCounts(df[timeframe], None if weights is None else df[weights])
+        figTradeDist.add_trace(go.Bar(
+        x=bins,
+        y=counts / (counts.sum() or 1) if attribute == "Percent" else counts,
         name=timeframe, # name used in legend and hover labels
         texttemplate=template,
-        xbins=dict( # bins used for histogram
-            start=df[timeframe].min(),
-            end=df[timeframe].max()+1,
-            size=1
-        ),
         marker_color=color,
         textfont=dict(color='white'),
         opacity=0.75
@@ -116,6 +155,8 @@ volumeDistPerMonth - Bar graph the plots the USD volume traded over the month fo
                     color and title of the chart. The below function will be called and will display a bar graph for the chosen inputs.
 '''
 
+@cachedFigure()
+@instrumented()
 def volumeDistPerMonth(df, attribute, timeframe, color, title):
     figVolDist = go.Figure()
 
@@ -176,6 +217,8 @@ pieGraph - Pie chart that plots the monthly split (% traded) for a single curren
             The below function will be called and will display a pir chart for the chosen inputs.
 '''
 
+@cachedFigure()
+@instrumented()
 def pieGraph(df, label, value, gap, title):
     figPie = go.Figure(data=[go.Pie(labels=df[label], values=df[value],marker_colors=px.colors.sequential.Sunset_r, hole=gap)])
     figPie.update_layout(
@@ -205,6 +248,8 @@ marketPairLine - Line graph the plots the monthly USD volume traded for a chosen
                     The below function will be called and will display a line graph for the monthly currency volume traded.
 '''
 
+@cachedFigure()
+@instrumented()
 def marketPairLine(df, title):
 
     df = df.sort_values('year_month')
@@ -252,6 +297,8 @@ marketPairVolume - Bar graph that plots the USD volume traded per month | monthl
                    to draw insights from.                 
 '''
 
+@cachedFigure()
+@instrumented()
 def marketPairVolume(df, attribute, title):
 
     market_pairs = df['market_pair'].unique()
@@ -328,6 +375,8 @@ clientMonthlyStatusAvg - Grouped Bar graph that plots a single clients average U
                          The below function will be called and will display a grouped bar graph for the chosen inputs.
 '''
 
+@cachedFigure()
+@instrumented()
 def clientMonthlyStatusAvg(df, title):
 
     colors = px.colors.qualitative.Vivid
@@ -399,11 +448,81 @@ def clientMonthlyStatusAvg(df, title):
 monthlyClientVolumeNormalised - Normalised (Density Plot) of customers trading in specific Average USD Volume ranges per month with monthly average line -  
                          the function is imported into the main.py file, one can then just change the dataframe (df).
                          The below function will be called and will display a normailised graph with vertical mean USD Volume line.
+
+                         For up to exact_threshold clients the density is the exact gaussian KDE from ff.create_distplot (as before).
+                         Above that, evaluating a kernel for every client at every point of the curve gets slow (tens of thousands of
+                         returning clients per month), so the density is worked out with binnedKde instead and drawn as a single line
+                         (without the rug of every client underneath). Either way the density and mean are only worked out once.
+
+kdeBandwidth - Kernel bandwidth for the KDE - 'scott' (the rule used by ff.create_distplot), 'silverman' or a number
+
+binnedKde - Binned KDE on a fixed grid of gridsize points between the lowest and highest value. The values are linearly binned onto
+            a grid (np.bincount) and the binned counts are convolved with the gaussian kernel using an FFT - so apart from the
+            binning, the cost depends on the grid size and not on the number of clients. The binning grid is made finer than gridsize
+            where needed so the grid spacing stays within a quarter of the bandwidth (up to KDE_MAX_BINS points), and the density is
+            then interpolated back onto the gridsize points that are plotted.
 '''
 
-def monthlyClientVolumeNormalised(df, title):
+KDE_GRID_SIZE = 500
+KDE_EXACT_THRESHOLD = 2000
+KDE_MAX_BINS = 1 << 16
+
+def kdeBandwidth(values, bandwidth='scott'):
+
+    if bandwidth == 'scott':
+        return values.std(ddof=1) * len(values) ** (-1 / 5)
+
+    if bandwidth == 'silverman':
+        q75, q25 = np.percentile(values, [75, 25])
+        spread = min(values.std(ddof=1), (q75 - q25) / 1.34) or values.std(ddof=1)
+        return 0.9 * spread * len(values) ** (-1 / 5)
+
+    return float(bandwidth)
+
+
+def binnedKde(values, bandwidth='scott', gridsize=KDE_GRID_SIZE):
+
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+
+    low, high = values.min(), values.max()
+    grid = np.linspace(low, high, gridsize)
+    bw = kdeBandwidth(values, bandwidth)
+    if high == low or not bw > 0:
+        return grid, np.zeros(gridsize)
+
+    bins = int(min(max(gridsize, np.ceil(4 * (high - low) / bw) + 1), KDE_MAX_BINS))
+
+    #### linear binning - each value is split between the two grid points either side of it
+    delta = (high - low) / (bins - 1)
+    position = (values - low) / delta
+    left = np.clip(np.floor(position).astype(np.int64), 0, bins - 2)
+    weight = position - left
+    counts = np.bincount(left, weights=1 - weight, minlength=bins) + np.bincount(left + 1, weights=weight, minlength=bins)
+
+    #### gaussian kernel at every grid offset, convolved with the binned counts via FFT
+    offsets = np.arange(-(bins - 1), bins) * delta
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+    size = len(counts) + len(kernel) - 1
+    convolved = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+
+    density = np.maximum(convolved[bins - 1:2 * bins - 1], 0) / len(values)
+
+    return grid, np.interp(grid, np.linspace(low, high, bins), density)
+
+
+@cachedFigure()
+@instrumented()
+def monthlyClientVolumeNormalised(df, title, bandwidth='scott', exact_threshold=KDE_EXACT_THRESHOLD):
+
+    if len(df) <= exact_threshold:
+        figHist = ff.create_distplot([df['avg_client_volume']], group_labels=['avg_client_volume'], curve_type='kde', colors=["#004e9b"], show_hist=False)
+        peak = max(figHist['data'][0]['y'])
+    else:
+        grid, density = binnedKde(df['avg_client_volume'], bandwidth)
+        peak = density.max()
+        figHist = go.Figure(go.Scatter(x=grid, y=density, mode='lines', name='avg_client_volume', marker=dict(color="#004e9b")))
 
-    figHist = ff.create_distplot([df['avg_client_volume']], group_labels=['avg_client_volume'], curve_type='kde', colors=["#004e9b"], show_hist=False)
     figHist.update_layout(title= 'KDE Plot', xaxis_title='Average USD Volume', yaxis_title='Frequency', height=400, width=400, margin=dict(l=50, r=0, b=0,t=100),
     showlegend=False,
         legend=dict(
@@ -414,20 +533,21 @@ def monthlyClientVolumeNormalised(df, title):
         yanchor='bottom'   # Align legend vertically
     ))
 
+    mean = df['avg_monthlyStatus_volume'].mean()
 
     # Add vertical line at mean
     figHist.add_shape(
         type='line',
-        x0=df['avg_monthlyStatus_volume'].mean(), x1=df['avg_monthlyStatus_volume'].mean(),
-        y0=0, y1=max(figHist['data'][0]['y']),
+        x0=mean, x1=mean,
+        y0=0, y1=peak,
         line=dict(color='red', width=2, dash='dash')
     )
 
     # Add annotation for mean
     figHist.add_annotation(
-        x=df['avg_monthlyStatus_volume'].mean(),
-        y=max(figHist['data'][0]['y']) * 0.95,
-        text=f"Mean: {df['avg_monthlyStatus_volume'].mean():.2f}",
+        x=mean,
+        y=peak * 0.95,
+        text=f"Mean: {mean:.2f}",
         showarrow=True,
         arrowhead=2,
         ax=40,
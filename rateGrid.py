@@ -0,0 +1,154 @@
+#### Import Python Libraries #################################################################################################################
+
+import os
+import json
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+from columnarCache import SNAPSHOT_DIR, fileHash, snapshotIsCurrent, snapshotPaths
+
+##############################################################################################################################################
+#### Hourly Rate Grid Functions ##############################################################################################################
+##############################################################################################################################################
+
+'''
+The hourly pricing method grouped the rates into a long table of (currency, hour) averages and then hash merged it onto every ledger
+leg on the hour + currency keys. The functions below lay the hourly averages out as a dense grid instead - a numpy array with one row
+per currency and one column per hour from the first to the last hour of the rates - so pricing a leg is a position lookup:
+
+    ~row - the currency's position in the grid's currency index (looked up once per category for categorical currencies)
+    ~column - the leg's hour (the transaction time rounded to the hour) minus the first hour of the grid
+
+and all of the legs are priced with a single numpy fancy-index into the grid. Hours without a rate for a currency are gaps in the grid,
+which are either:
+
+    ~'none' - left empty, so the legs in that hour stay unpriced (same as the hash merge - pricing method 'hourly')
+    ~'ffill' - filled forward with the currency's last hourly average before the gap (pricing method 'hourly_ffill'); hours before a
+               currency's first rate and legs outside the hours of the grid stay unpriced
+
+Along with the prices the grid keeps the hour each price was taken from (the same hour unless it was forward filled). The grid is saved
+as a .npz file in the .snapshots folder next to rates.csv (columnarCache.py) along with the sha256 hash of the rates file it was built
+from, so later runs load the grid straight away without grouping the rates at all.
+
+
+Inventory of Functions:
+
+~buildRateGrid - Dense currency x hour grid of the hourly average rates, gaps filled or not
+
+~lookupRates - Price and source hour of each leg from the grid (one fancy-index)
+
+~loadRateGrid - The grid for a rates file, loaded from disk or built and saved
+
+'''
+
+GRID_FILLS = {'hourly': 'none', 'hourly_ffill': 'ffill'}
+GRID_VERSION = 1
+
+RateGrid = namedtuple('RateGrid', ['currencies', 'start', 'prices', 'sources', 'fill'])
+
+##############################################################################################################################################
+#### buildRateGrid | lookupRates #############################################################################################################
+##############################################################################################################################################
+
+'''
+buildRateGrid - Builds the grid from the hourly averages (dataPipeline.hourlyAverageRates). start is the first hour of the grid (in hours
+                since the epoch, UTC), prices holds NaN for the gaps and sources the column each price was taken from (-1 for NaN).
+                Forward filling carries the column of the last priced hour along each row with a running maximum.
+
+lookupRates - Looks up the price of every leg from its currency and hour (a datetime series). Returns the prices (an array in the order
+              of the legs) and the hours they were taken from (a UTC datetime series on the legs' index, NaT when unpriced).
+'''
+
+def hourNumbers(times):
+    return pd.Series(times).to_numpy(dtype='datetime64[ns]').astype('datetime64[h]').view(np.int64)
+
+
+def buildRateGrid(hourly_avg, fill='none'):
+
+    if fill not in GRID_FILLS.values():
+        raise ValueError(f"rate grid fill must be one of {list(GRID_FILLS.values())}, got '{fill}'")
+
+    rows, currencies = pd.factorize(hourly_avg['currency'].astype(str), sort=True)
+    hours = hourNumbers(hourly_avg['reference_at_date'])
+    start = int(hours.min()) if len(hours) else 0
+    columns = hours - start
+
+    prices = np.full((len(currencies), int(columns.max()) + 1 if len(columns) else 0), np.nan)
+    prices[rows, columns] = hourly_avg['average_price_per_usd'].to_numpy(dtype=np.float64)
+
+    sources = np.where(np.isnan(prices), -1, np.arange(prices.shape[1]))
+    if fill == 'ffill':
+        sources = np.maximum.accumulate(sources, axis=1)
+        prices = np.where(sources >= 0, np.take_along_axis(prices, np.maximum(sources, 0), axis=1), np.nan)
+
+    return RateGrid(pd.Index(currencies), start, prices, sources.astype(np.int32), fill)
+
+
+def lookupRates(grid, currency, hourly):
+
+    if isinstance(currency.dtype, pd.CategoricalDtype):
+        mapping = np.append(grid.currencies.get_indexer(currency.cat.categories.astype(str)), -1)
+        rows = mapping[currency.cat.codes.to_numpy()]
+    else:
+        rows = grid.currencies.get_indexer(currency.astype(str))
+
+    columns = hourNumbers(hourly) - grid.start
+    hours = grid.prices.shape[1]
+    found = (rows >= 0) & (columns >= 0) & (columns < hours)
+
+    #### one take from the flattened grid, with the legs that are not in the grid pointed at a trailing NaN
+    cells = np.where(found, rows * hours + columns, grid.prices.size)
+    prices = np.append(grid.prices.ravel(), np.nan)[cells]
+    sources = np.append(grid.sources.ravel(), -1)[cells].astype(np.int64)
+
+    source_hours = np.where(sources >= 0, (sources + grid.start) * 3600, np.iinfo(np.int64).min).view('datetime64[s]')
+
+    return prices, pd.Series(source_hours, index=hourly.index).dt.tz_localize('UTC')
+
+##############################################################################################################################################
+#### loadRateGrid ############################################################################################################################
+##############################################################################################################################################
+
+'''
+loadRateGrid - Returns the grid for rates_path from its .npz file if the file was built from the same rates (by sha256 hash - taken from
+               the rates snapshot metadata when the snapshot is current, so the rates file is not hashed again), otherwise calls
+               hourlyRates() for the hourly averages, builds the grid and saves it. The file is written to a temporary name and then
+               renamed, so processes loading the grid at the same time (luno_analysis.py workers) never read a half written file.
+'''
+
+def gridPath(rates_path, fill='none'):
+    folder = os.path.join(os.path.dirname(os.path.abspath(rates_path)), SNAPSHOT_DIR)
+    name = os.path.splitext(os.path.basename(rates_path))[0]
+    return os.path.join(folder, f'{name}.grid-{fill}.npz')
+
+
+def ratesHash(rates_path):
+    if snapshotIsCurrent(rates_path):
+        with open(snapshotPaths(rates_path)[1], 'r') as f:
+            return json.load(f)['sha256']
+    return fileHash(rates_path)
+
+
+def loadRateGrid(rates_path, hourlyRates, fill='none'):
+
+    path = gridPath(rates_path, fill)
+    source = ratesHash(rates_path)
+
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as saved:
+            if int(saved['version']) == GRID_VERSION and str(saved['source']) == source:
+                return RateGrid(pd.Index(saved['currencies']), int(saved['start']), saved['prices'], saved['sources'], fill)
+
+    grid = buildRateGrid(hourlyRates(), fill)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(temp_path, version=GRID_VERSION, source=source, currencies=grid.currencies.to_numpy(dtype=str), start=grid.start,
+             prices=grid.prices, sources=grid.sources)
+    os.replace(temp_path, path)
+
+    return grid
+
+##############################################################################################################################################
+##############################################################################################################################################
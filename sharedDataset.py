@@ -0,0 +1,81 @@
+#### Import Python Libraries #################################################################################################################
+
+import threading
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+
+##############################################################################################################################################
+#### Shared Dataset Functions ################################################################################################################
+##############################################################################################################################################
+
+'''
+Every browser session runs main.py in the same server process, and the dataset loaders (dataPipeline.loadDataset and the chunked,
+incremental and duckdb loaders) are memoized with lru_cache on the file fingerprints - so once the dataset is built, every session is handed
+the same dataframes rather than building its own. Two gaps were left:
+
+    ~the lru_cache only holds a result once it has been built, so sessions that arrive while the cache is cold (the first visitors after
+     a deploy, or after a data file changes) each ran the whole pipeline and held their own copy of every dataframe until they finished
+    ~the sessions were handed the shared dataframes themselves, so a session writing into one of them in place would have changed it for
+     every other session
+
+loadShared builds the dataset behind a lock, so the sessions arriving during a build wait for it and then share its result. Each session
+then gets its own view of the shared dataset (sessionView):
+
+    ~the dataframes are shallow copies - with pandas copy-on-write they share all of their data with the shared dataframes, and a
+     column is only copied (for that session alone) if the session writes to it. Copy-on-write is always on from pandas 3, which is why
+     requirements.txt asks for it - under pandas 2 a shallow copy shares its data blocks, and a write from one session would show up in
+     every other
+    ~numpy arrays are read-only views and the dictionaries are read-only mappings
+
+So a session costs a few dataframe headers on top of the slices it filters for its own selections, however many sessions are open.
+
+
+Inventory of Functions:
+
+~loadShared - Loads the dataset once per server process (behind a lock) and returns a session view of it
+
+~sessionView - Zero-copy, read-only view of a dataset for one session
+
+'''
+
+_BUILD_LOCK = threading.Lock()
+
+##############################################################################################################################################
+#### loadShared | sessionView ################################################################################################################
+##############################################################################################################################################
+
+'''
+loadShared - Calls loader (one of the memoized dataset loaders) with the arguments given while holding the build lock. With the dataset
+             already cached this only costs the loader's file fingerprint checks; otherwise the first session builds it and the rest wait.
+
+sessionView - Dataframes and series are returned as shallow (copy-on-write) copies, numpy arrays as read-only views, dictionaries as
+              read-only mappings and namedtuples (e.g. the cohorts and client indexes) with each of their fields viewed the same way.
+'''
+
+def loadShared(loader, *args, **kwargs):
+    with _BUILD_LOCK:
+        dataset = loader(*args, **kwargs)
+    return sessionView(dataset)
+
+
+def sessionView(value):
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+
+    if isinstance(value, dict):
+        return MappingProxyType({key: sessionView(item) for key, item in value.items()})
+
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        return type(value)(*(sessionView(item) for item in value))
+
+    return value
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,306 @@
+#### Import Python Libraries #################################################################################################################
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+from columnarCache import loadSnapshot, CATEGORICAL_COLUMNS
+from cohortEngine import buildCohorts, cohortStatus, churnedCustomers
+from instrumentation import instrumented
+from idEncoding import buildDictionaries, encodeTable
+from dataPipeline import (fileFingerprint, cleanLedger, cleanTrades, cleanRates, LEDGER_TIME_COLUMNS, mergeLedgerAccounts, mergeLedgerTrades,
+                          RATE_TOLERANCE, sortedRates, priceLedgerTrades, addChurnedCustomers, decodeUsers, buildAggregates)
+
+##############################################################################################################################################
+#### Streaming Ledger Ingest Functions #######################################################################################################
+##############################################################################################################################################
+
+'''
+Reading the whole ledger and then adding the 5 derived columns (timestamp_at_date, year_month, day, hourly, hour) before the joins meant
+that peak memory was several times the size of the ledger file. The functions below read the ledger in fixed size chunks instead - each
+chunk is cleaned, joined to the accounts and trades, priced against the rates and then folded into two small running states before the next chunk
+is read:
+
+    ~trade state - one row per trade (foreign_id) holding the sum and count of the absolute usd volume of its legs and the attributes of
+                   its earliest leg (timestamp_at, year_month, day, hour, user_id, market_pair)
+    ~activity state - the unique (user_id, year_month) pairs, used to work out the client statuses
+
+The trade state is needed because the legs of a trade can land in different chunks, so a trade's volume and month/hour/day/user are
+only known once all its legs have been seen. Both states grow with the number of trades and users, not with the number of ledger rows,
+so peak memory stays bounded by the chunk size plus the trades table that is already held for the join. The trade state is kept as a
+list of frames with no trade in more than one of them - a compaction folds the pending rows, adds the legs of trades that are already
+in the state to their rows in place and keeps the rest as a new frame, so the state is only put together into one frame once at the end.
+
+Once the ledger has been read, the trade state is turned into the same users_combined dataframe as tradeVolumes produces, and the
+status mapping, churned customers and aggregates are worked out with the same functions as the in-memory pipeline (dataPipeline.py).
+Exact duplicate ledger rows are dropped across the whole file, the same as the in-memory pipeline - a sorted array of the 64 bit hashes
+of the rows already read (8 bytes per ledger row) catches a duplicate that lands in a later chunk than the row it repeats. The account and user
+ids are encoded as integer codes (idEncoding.py) with dictionaries built once from the accounts and trades, so every chunk gets the same
+codes, and the user ids are decoded back to the hashes by finishTradeState.
+
+
+Inventory of Functions:
+
+~foldTradeLegs - Reduces a priced chunk of ledger legs to one row per trade
+
+~combineTradeStates - Merges per-chunk trade rows into one row per trade
+
+~mergeTradeState - Adds pending trade rows to the running trade state (a list of frames with disjoint trades) without re-combining it
+
+~tradeStateToUsersCombined - Converts the trade state into users_combined (one row per trade with the mean absolute usd volume)
+
+~rowHashes | seenRows | dropSeenRows - Hashes of ledger rows | which hashes were seen before | drops the ledger rows of a chunk that
+                                       repeat a row from an earlier chunk
+
+~foldLedgerChunk - Joins, prices and folds a chunk of cleaned ledger rows into trade rows and activity
+
+~streamLedger - Reads the ledger in chunks and returns the dataset dictionary used by the app
+
+~finishTradeState - Statuses, churned customers and aggregates from the final trade state (shared by streamLedger and luno_analysis.py)
+
+~loadDatasetChunked - streamLedger memoized on the file fingerprints (same as dataPipeline.loadDataset)
+
+'''
+
+TRADE_COLUMNS = ['timestamp_at', 'year_month', 'day', 'hour', 'user_id', 'market_pair']
+
+##############################################################################################################################################
+#### foldTradeLegs | combineTradeStates | mergeTradeState ###################################################################################
+##############################################################################################################################################
+
+'''
+combineTradeStates - Trade rows from any number of chunks (or months) -> one row per trade, summing the volumes and keeping the earliest
+                     leg (the first one on a tie, so earlier chunks win)
+
+mergeTradeState - tradeStates is a list of trade state frames with no trade in more than one of them. The pending trade rows are combined
+                  and looked up in each frame (the index lookup of a frame is built once, as its index never changes) - trades already
+                  in a frame have their volumes and leg counts added and their earliest leg replaced in place, and the rest are appended
+                  to the list as a new frame. The cost of a compaction depends on the pending rows, not the size of the state.
+'''
+
+def foldTradeLegs(combined_df):
+
+    #### timestamp_at kept as a UTC datetime (same as assignCustomerStatus)
+    legs = combined_df[['foreign_id', 'timestamp_at_date'] + TRADE_COLUMNS[1:]].rename(columns={'timestamp_at_date': 'timestamp_at'})
+    legs['abs_volume'] = combined_df['usd_volume'].abs()
+
+    #### details of the earliest leg of each trade in this chunk along with the sum and count of the absolute usd volume
+    if not legs['timestamp_at'].is_monotonic_increasing:
+        legs = legs.sort_values('timestamp_at', kind='stable')
+
+    aggregations = {column: (column, 'first') for column in TRADE_COLUMNS}
+    aggregations['abs_sum'] = ('abs_volume', 'sum')
+    aggregations['legs'] = ('abs_volume', 'count')
+
+    return legs.groupby('foreign_id', observed=True).agg(**aggregations)
+
+
+def combineTradeStates(tradeStates):
+
+    states = pd.concat(tradeStates)
+    volumes = states.groupby(level=0)[['abs_sum', 'legs']].sum()
+
+    first_legs = states.sort_values('timestamp_at', kind='stable')
+    first_legs = first_legs[~first_legs.index.duplicated(keep='first')][TRADE_COLUMNS]
+
+    return first_legs.join(volumes)
+
+
+def mergeTradeState(tradeStates, tradeRows):
+
+    rows = combineTradeStates(tradeRows)
+    for state in tradeStates:
+        positions = state.index.get_indexer(rows.index)
+        found = positions >= 0
+        if not found.any():
+            continue
+
+        matched, positions = rows[found], positions[found]
+        for column in ['abs_sum', 'legs']:
+            state.iloc[positions, state.columns.get_loc(column)] = state[column].to_numpy()[positions] + matched[column].to_numpy()
+
+        earlier = np.asarray(matched['timestamp_at'].array < state['timestamp_at'].array[positions])
+        if earlier.any():
+            for column in TRADE_COLUMNS:
+                state.iloc[positions[earlier], state.columns.get_loc(column)] = matched[column].array[earlier]
+
+        rows = rows[~found]
+
+    return tradeStates + [rows] if len(rows) else tradeStates
+
+##############################################################################################################################################
+#### tradeStateToUsersCombined ###############################################################################################################
+##############################################################################################################################################
+
+'''
+tradeStateToUsersCombined - mean absolute usd volume per trade (abs_sum / legs, NaN where none of the legs could be priced - same as the
+                            groupby mean in tradeVolumes) with the statuses looked up from the cohorts. The columns and row order
+                            (by foreign_id) match tradeVolumes.
+'''
+
+def tradeStateToUsersCombined(tradeState, cohorts):
+
+    users_combined = tradeState.sort_index().reset_index(drop=True)
+    users_combined['usd_volume'] = users_combined['abs_sum'] / users_combined['legs']
+    users_combined['status'] = cohortStatus(cohorts, users_combined)
+
+    return users_combined[['timestamp_at', 'year_month', 'day', 'hour', 'user_id', 'status', 'market_pair', 'usd_volume']]
+
+
+##############################################################################################################################################
+#### rowHashes | seenRows | dropSeenRows ####################################################################################################
+##############################################################################################################################################
+
+'''
+rowHashes - A 64 bit hash of each ledger row over every column apart from the ones worked out from timestamp_at (the same comparison
+            as dataPipeline.dropDuplicateRows).
+
+seenRows - seen is the sorted array of the hashes of the (de-duplicated) ledger rows read so far. Returns which of the hashes are in seen
+           along with seen with the rest of them added. Duplicates within the hashes themselves are not marked (they are left to the
+           merges).
+
+dropSeenRows - The rows of a chunk whose hash is in seen are dropped (also used by incrementalIngest.py, with the hashes of every month).
+'''
+
+def rowHashes(ledger):
+    compared = [column for column in ledger.columns if column not in LEDGER_TIME_COLUMNS]
+    return pd.util.hash_pandas_object(ledger[compared], index=False).to_numpy()
+
+
+def seenRows(hashes, seen):
+
+    repeated = np.zeros(len(hashes), dtype=bool)
+    if len(seen):
+        repeated = seen[np.searchsorted(seen, hashes).clip(max=len(seen) - 1)] == hashes
+
+    #### both arrays are sorted, so the stable sort only has to merge two runs
+    seen = np.sort(np.concatenate([seen, np.unique(hashes[~repeated])]), kind='stable')
+
+    return repeated, seen
+
+
+def dropSeenRows(ledger, seen):
+    repeated, seen = seenRows(rowHashes(ledger), seen)
+    return (ledger[~repeated] if repeated.any() else ledger), seen
+
+##############################################################################################################################################
+#### foldLedgerChunk | streamLedger | finishTradeState #######################################################################################
+##############################################################################################################################################
+
+'''
+foldLedgerChunk - Cleaned ledger rows -> joined to the accounts and trades, priced against the rates and folded into per-trade rows
+                  (foldTradeLegs), along with the unique (user_id, year_month) activity and the pricing report for those rows
+
+streamLedger - Reads the accounts, trades and rates files in full (from their columnar snapshots) and the ledger file in chunks of
+               chunksize rows. Each chunk goes through the same cleaning, merging and pricing functions as the in-memory pipeline before
+               being folded into the trade and activity states. Pending per-chunk trade rows are compacted into the trade state once they
+               add up to more than chunksize rows (mergeTradeState), so the list of pending rows never holds more than about one chunk.
+               Rows that repeat a row of an earlier chunk are dropped before the chunk is folded (dropSeenRows).
+
+               The returned dictionary has the same keys as dataPipeline.loadDataset apart from the row level ledger dataframes
+               (ledgerAccounts, ledgerTrades, combined_df), which are never held in full.
+
+finishTradeState - Turns the final trade state and activity into the dataset dictionary (statuses, churned customers, decoded user ids
+                   and aggregates).
+                   Also used by luno_analysis.py, which folds the ledger one month per process rather than one chunk at a time.
+'''
+
+def foldLedgerChunk(ledger, accounts, trades, rates_sorted, pricing='hourly', tolerance=RATE_TOLERANCE):
+
+    ledgerAccounts = mergeLedgerAccounts(ledger, accounts)
+    ledgerTrades = mergeLedgerTrades(ledgerAccounts, trades)
+    combined_df, pricing_report = priceLedgerTrades(ledgerTrades, rates_sorted, pricing, tolerance)
+
+    activity = combined_df[['user_id', 'year_month']].drop_duplicates()
+
+    return foldTradeLegs(combined_df), activity, pricing_report
+
+
+@instrumented()
+def streamLedger(accounts_path, ledger_path, trades_path, rates_path, chunksize=500000, pricing='hourly', tolerance=RATE_TOLERANCE):
+
+    accounts = loadSnapshot(accounts_path, categoricals=CATEGORICAL_COLUMNS['accounts'])
+    trades = loadSnapshot(trades_path, cleanTrades, CATEGORICAL_COLUMNS['trades'])
+    rates = loadSnapshot(rates_path, cleanRates, CATEGORICAL_COLUMNS['rates'])
+    rates_sorted = sortedRates(rates, pricing, rates_path)
+
+    dictionaries = buildDictionaries(accounts, trades)
+    accounts = encodeTable(accounts, 'accounts', dictionaries)
+    trades = encodeTable(trades, 'trades', dictionaries)
+    pricing_report = {'priced': 0, 'interpolated': 0, 'unpriced': 0}
+
+    tradeStates = []
+    pending = []
+    pending_rows = 0
+    activity = []
+    seen = np.empty(0, dtype=np.uint64)
+
+    for ledger in pd.read_csv(ledger_path, chunksize=chunksize):
+
+        ledger, seen = dropSeenRows(encodeTable(cleanLedger(ledger), 'ledger', dictionaries), seen)
+        chunk_trades, chunk_activity, chunk_report = foldLedgerChunk(ledger, accounts, trades, rates_sorted, pricing, tolerance)
+        for key, count in chunk_report.items():
+            pricing_report[key] += count
+
+        activity.append(chunk_activity)
+        pending.append(chunk_trades)
+        pending_rows += len(pending[-1])
+
+        if pending_rows > chunksize:
+            tradeStates = mergeTradeState(tradeStates, pending)
+            activity = [pd.concat(activity).drop_duplicates()]
+            pending, pending_rows = [], 0
+
+    if pending:
+        tradeStates = mergeTradeState(tradeStates, pending)
+    tradeState = pd.concat(tradeStates)
+    activity = pd.concat(activity).drop_duplicates()
+
+    return finishTradeState(tradeState, activity, pricing_report, dictionaries)
+
+
+def finishTradeState(tradeState, activity, pricing_report, dictionaries):
+
+    #### statuses from the running activity, then the same steps as the in-memory pipeline
+    cohorts = buildCohorts(activity)
+    users_combined = tradeStateToUsersCombined(tradeState, cohorts)
+    updated_df = addChurnedCustomers(users_combined, churnedCustomers(cohorts))
+    users_combined, updated_df, cohorts = decodeUsers(users_combined, updated_df, cohorts, dictionaries)
+
+    final_df = updated_df[['timestamp_at', 'year_month', 'user_id', 'status', 'market_pair', 'usd_volume']]
+
+    dataset = {
+        'users_combined': users_combined,
+        'updated_df': updated_df,
+        'final_df': final_df,
+        'pricing_report': pricing_report,
+        'cohorts': cohorts,
+        'id_dictionaries': dictionaries,
+    }
+    dataset.update(buildAggregates(updated_df))
+
+    return dataset
+
+##############################################################################################################################################
+#### loadDatasetChunked ######################################################################################################################
+##############################################################################################################################################
+
+@lru_cache(maxsize=2)
+def _streamLedgerCached(accounts_fp, ledger_fp, trades_fp, rates_fp, chunksize, pricing, tolerance):
+    return streamLedger(accounts_fp[0], ledger_fp[0], trades_fp[0], rates_fp[0], chunksize, pricing, tolerance)
+
+
+@instrumented()
+def loadDatasetChunked(accounts_path, ledger_path, trades_path, rates_path, chunksize=500000, pricing='hourly', tolerance=RATE_TOLERANCE):
+    return _streamLedgerCached(
+        fileFingerprint(accounts_path),
+        fileFingerprint(ledger_path),
+        fileFingerprint(trades_path),
+        fileFingerprint(rates_path),
+        chunksize,
+        pricing,
+        tolerance
+    )
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,209 @@
+#### Import Python Libraries #################################################################################################################
+
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+##############################################################################################################################################
+#### Synthetic Data Generator ################################################################################################################
+##############################################################################################################################################
+
+'''
+The repo only ships the small assignment files, so there was no way to see how the pipeline stages scale. The functions below generate a
+consistent set of accounts, ledger_entries, trades and rates csv files - same columns and formats as the assignment files - of any size,
+so the pipeline (and benchmarks.py) can be run at 10k, 1M or 10M ledger rows:
+
+    python syntheticData.py bench_data/1m --rows 1m
+
+The data hangs together the same way as the real files:
+
+    ~accounts - one account per user per currency (64 character hashes for the account and user ids)
+    ~trades - a bid and an ask user who were both active in the month of the trade, a market pair and a volume in the base currency
+    ~ledger_entries - 4 legs per trade (base and counter currency for the bid and the ask user, the ask legs a few ms after the bid legs)
+                      plus about 1 in 5 rows of non-trading activity (deposits, fees, ...) whose foreign_id matches no trade
+    ~rates - a usd price snapshot about every 15 minutes per currency (with gaps) following a random walk
+
+Each user is active in a random subset of the months, so all of the New | Returning | Churned | Reactivated statuses come up. Everything
+is generated with numpy arrays (no loop per row) and the same seed always gives the same files.
+
+
+Inventory of Functions:
+
+~randomHashes - n random 64 character hex ids
+
+~generateDataset - Generates the 4 data files with about ledger_rows rows in the ledger
+
+~parseRows - Reads a row count like 10k | 1m | 10m | 2500000
+
+'''
+
+SIZES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+CURRENCIES = ['XBT', 'ETH', 'ZAR', 'MYR', 'NGN']
+MARKET_PAIRS = [('XBT', 'ZAR'), ('XBT', 'MYR'), ('ETH', 'XBT'), ('ETH', 'ZAR'), ('XBT', 'NGN')]
+COUNTER_PRICES = {'ZAR': 150000.0, 'MYR': 30000.0, 'NGN': 3e6, 'XBT': 0.02}
+USD_PRICES = {'XBT': 8000.0, 'ETH': 150.0, 'ZAR': 0.066, 'MYR': 0.24, 'NGN': 0.0027}
+FIRST_TRADE_ID = 281474976710656
+
+##############################################################################################################################################
+#### randomHashes | parseRows ################################################################################################################
+##############################################################################################################################################
+
+def randomHashes(rng, n):
+    hexed = rng.bytes(32 * n).hex()
+    return np.array([hexed[i * 64:(i + 1) * 64] for i in range(n)], dtype=object)
+
+
+def parseRows(rows):
+    rows = str(rows).lower()
+    if rows in SIZES:
+        return SIZES[rows]
+    if rows[-1] in 'km':
+        return int(float(rows[:-1]) * (1_000 if rows[-1] == 'k' else 1_000_000))
+    return int(rows)
+
+##############################################################################################################################################
+#### generateDataset #########################################################################################################################
+##############################################################################################################################################
+
+'''
+generateDataset - Writes accounts.csv, ledger_entries.csv, trades.csv and rates.csv to out_dir. 4/5 of the ledger rows are trade legs
+                  (ledger_rows / 5 trades) and the rest non-trading activity. users defaults to one user per 200 ledger rows (at least
+                  50). Returns the number of rows written per file.
+'''
+
+def generateDataset(out_dir, ledger_rows=SIZES['10k'], users=None, months=('2020-01', '2020-02', '2020-03'), seed=0):
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    n_users = users or max(50, ledger_rows // 200)
+    n_trades = ledger_rows // 5
+    n_other = ledger_rows - 4 * n_trades
+    periods = pd.PeriodIndex(list(months), freq='M')
+    month_starts = periods.start_time.tz_localize('UTC').as_unit('ns').asi8
+    month_ends = (periods + 1).start_time.tz_localize('UTC').as_unit('ns').asi8
+
+    #### accounts - one per user per currency
+    user_ids = randomHashes(rng, n_users)
+    accounts = pd.DataFrame({
+        'id': randomHashes(rng, n_users * len(CURRENCIES)),
+        'user_id': np.repeat(user_ids, len(CURRENCIES)),
+        'currency': np.tile(CURRENCIES, n_users),
+    })
+    account_ids = accounts['id'].to_numpy().reshape(n_users, len(CURRENCIES))
+
+    #### users active per month (at least 2 per month so there is always a counterparty)
+    active = rng.random((n_users, len(months))) < 0.6
+    active[:, 0] |= rng.random(n_users) < 0.5
+    active[:2, :] = True
+
+    #### trades - month, bid and ask user (two different users active that month), time, market pair and volume
+    trade_months = rng.integers(len(months), size=n_trades)
+    bid_users = np.empty(n_trades, dtype=np.int64)
+    ask_users = np.empty(n_trades, dtype=np.int64)
+    for m in range(len(months)):
+        in_month = np.flatnonzero(trade_months == m)
+        candidates = np.flatnonzero(active[:, m])
+        bid = rng.integers(len(candidates), size=len(in_month))
+        ask = (bid + rng.integers(1, len(candidates), size=len(in_month))) % len(candidates)
+        bid_users[in_month], ask_users[in_month] = candidates[bid], candidates[ask]
+
+    starts, ends = month_starts[trade_months], month_ends[trade_months]
+    trade_ns = starts + (rng.random(n_trades) * (ends - starts)).astype(np.int64)
+    trade_ns = (trade_ns // 1_000_000) * 1_000_000
+    pair_codes = rng.integers(len(MARKET_PAIRS), size=n_trades)
+    base = np.array([CURRENCIES.index(pair[0]) for pair in MARKET_PAIRS])[pair_codes]
+    counter = np.array([CURRENCIES.index(pair[1]) for pair in MARKET_PAIRS])[pair_codes]
+    volume = np.round(rng.gamma(1.0, 0.05, size=n_trades), 6)
+    counter_volume = np.round(volume * np.array([COUNTER_PRICES[pair[1]] for pair in MARKET_PAIRS])[pair_codes], 6)
+    trade_ids = FIRST_TRADE_ID + np.cumsum(rng.integers(1, 1000, size=n_trades))
+
+    trades = pd.DataFrame({
+        'id': trade_ids,
+        'created_at': np.char.add(np.datetime_as_string(trade_ns.astype('datetime64[ns]'), unit='ms'), 'Z'),
+        'base_currency': np.array(CURRENCIES)[base],
+        'counter_currency': np.array(CURRENCIES)[counter],
+        'bid_user_id': user_ids[bid_users],
+        'ask_user_id': user_ids[ask_users],
+        'volume': volume,
+    })
+
+    #### ledger - bid base/counter legs at the trade time, ask legs 1-49ms later, then the non-trading rows
+    ask_ns = trade_ns + rng.integers(1, 50, size=n_trades) * 1_000_000
+    legs = {
+        'account_id': np.concatenate([account_ids[bid_users, base], account_ids[bid_users, counter],
+                                      account_ids[ask_users, base], account_ids[ask_users, counter]]),
+        'timestamp_ns': np.concatenate([trade_ns, trade_ns, ask_ns, ask_ns]),
+        'balance_delta': np.concatenate([volume, -counter_volume, -volume, counter_volume]),
+        'foreign_id': np.tile(trade_ids, 4),
+    }
+
+    other_months = rng.integers(len(months), size=n_other)
+    other_ns = month_starts[other_months] + (rng.random(n_other) * (month_ends - month_starts)[other_months]).astype(np.int64)
+    other = {
+        'account_id': account_ids[rng.integers(n_users, size=n_other), rng.integers(len(CURRENCIES), size=n_other)],
+        'timestamp_ns': other_ns,
+        'balance_delta': np.round(rng.normal(size=n_other), 6),
+        'foreign_id': rng.integers(1, 10 ** 12, size=n_other),
+    }
+
+    order = rng.permutation(4 * n_trades + n_other)
+    timestamps = np.concatenate([legs['timestamp_ns'], other['timestamp_ns']])[order]
+    timestamps = np.char.replace(np.datetime_as_string(timestamps.astype('datetime64[ns]'), unit='us'), 'T', ' ')
+    ledger = pd.DataFrame({
+        'id': np.arange(len(order)) + 1000,
+        'account_id': np.concatenate([legs['account_id'], other['account_id']])[order],
+        'timestamp_at': np.char.add(timestamps, '+00'),
+        'balance_delta': np.concatenate([legs['balance_delta'], other['balance_delta']])[order],
+        'foreign_id': np.concatenate([legs['foreign_id'], other['foreign_id']])[order],
+    })
+
+    #### rates - 15 minute snapshots per currency with about 30% missing and up to a minute of jitter
+    grid = pd.date_range(pd.Timestamp(month_starts[0], tz='UTC'), pd.Timestamp(month_ends[-1], tz='UTC'), freq='15min', inclusive='left').as_unit('ns').asi8
+    rates = []
+    for currency in CURRENCIES:
+        snapshots = grid[rng.random(len(grid)) > 0.3]
+        snapshots = snapshots + rng.integers(0, 60, size=len(snapshots)) * 1_000_000_000
+        rates.append(pd.DataFrame({
+            'currency': currency,
+            'reference_at': np.char.add(np.char.replace(np.datetime_as_string(snapshots.astype('datetime64[ns]'), unit='s'), 'T', ' '), '+00'),
+            'average_price_per_usd': USD_PRICES[currency] * np.exp(np.cumsum(rng.normal(0, 0.002, size=len(snapshots)))),
+        }))
+    rates = pd.concat(rates, ignore_index=True)
+    rates = rates.iloc[rng.permutation(len(rates))]
+
+    accounts.to_csv(os.path.join(out_dir, 'accounts.csv'), index=False)
+    ledger.to_csv(os.path.join(out_dir, 'ledger_entries.csv'), index=False)
+    trades.to_csv(os.path.join(out_dir, 'trades.csv'), index=False)
+    rates.to_csv(os.path.join(out_dir, 'rates.csv'), index=False)
+
+    return {'accounts': len(accounts), 'ledger': len(ledger), 'trades': len(trades), 'rates': len(rates)}
+
+##############################################################################################################################################
+#### main ####################################################################################################################################
+##############################################################################################################################################
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Generates synthetic accounts, ledger_entries, trades and rates csv files')
+    parser.add_argument('out', help='folder the 4 csv files are written to')
+    parser.add_argument('--rows', default='10k', help='ledger rows - 10k | 1m | 10m or a number')
+    parser.add_argument('--users', type=int, default=None, help='number of users (default: one per 200 ledger rows)')
+    parser.add_argument('--months', nargs='+', default=['2020-01', '2020-02', '2020-03'], help='months covered by the data')
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args(argv)
+    counts = generateDataset(args.out, parseRows(args.rows), args.users, tuple(args.months), args.seed)
+    print(', '.join(f'{name}: {count:,} rows' for name, count in counts.items()))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+##############################################################################################################################################
+##############################################################################################################################################
@@ -0,0 +1,30 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+#### the modules live in the repository root (the app is run from there with streamlit run main.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from syntheticData import generateDataset
+
+FILES = ['accounts.csv', 'ledger_entries.csv', 'trades.csv', 'rates.csv']
+
+
+@pytest.fixture(scope='session')
+def dataFiles(tmp_path_factory):
+
+    #### a small synthetic dataset, with some of the first ledger rows repeated at the end of the file (so the duplicates land in later
+    #### chunks than the rows they repeat)
+    folder = tmp_path_factory.mktemp('data')
+    generateDataset(str(folder), ledger_rows=3000, seed=1)
+    ledger = pd.read_csv(folder / 'ledger_entries.csv')
+    pd.concat([ledger, ledger.iloc[:40]]).to_csv(folder / 'ledger_entries.csv', index=False)
+
+    return [str(folder / name) for name in FILES]
+
+
+@pytest.fixture(scope='session')
+def dataset(dataFiles):
+    from dataPipeline import loadDataset
+    return loadDataset(*dataFiles, pricing='hourly')
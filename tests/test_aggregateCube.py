@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from aggregateCube import cubeViews, clientRows
+
+
+def directViews(updated_df):
+
+    #### the views as main.py grouped them from the rows, before the cube
+    monthly_pairs_df = updated_df.groupby(['market_pair', 'year_month'], observed=True).agg(usd_volume=('usd_volume', 'sum')).reset_index()
+
+    status_sums = updated_df.groupby(['status', 'market_pair'], observed=True)['usd_volume'].sum().reset_index()
+    status_sums['usd_vol_pct'] = status_sums.groupby('status')['usd_volume'].transform(lambda x: (x / x.sum()))
+
+    client_sums = updated_df.groupby(['user_id', 'market_pair'], observed=True)['usd_volume'].sum().reset_index()
+    client_sums['usd_vol_pct'] = client_sums.groupby('user_id', observed=True)['usd_volume'].transform(lambda x: (x / x.sum()))
+
+    client_pairs = client_sums.groupby(['user_id'], observed=True).agg(pairs=('market_pair', 'count')).reset_index()
+    client_pairs_count = client_pairs.groupby(['pairs']).count().reset_index().rename(columns={'user_id': 'customers'})
+
+    client_average = updated_df.groupby(['user_id', 'year_month', 'status'], observed=True)['usd_volume'].mean().reset_index()
+    client_average['avg_monthlyStatus_volume'] = client_average.groupby(['year_month', 'status'])['usd_volume'].transform('mean')
+    client_average_month = updated_df.groupby(['year_month'])['usd_volume'].mean().reset_index()
+    clients_combined_avg = pd.merge(client_average, client_average_month, on='year_month', how='left', suffixes=('_status', '_monthly'))
+    clients_combined_avg = clients_combined_avg.rename(columns={'usd_volume_status': 'avg_client_volume', 'usd_volume_monthly': 'avg_monthly_volume'})
+
+    views = {'monthly_pairs_df': monthly_pairs_df, 'status_sums': status_sums, 'client_sums': client_sums,
+             'client_pairs_count': client_pairs_count, 'clients_combined_avg': clients_combined_avg}
+
+    for timeframe in ['hour', 'day']:
+        sums = updated_df.groupby(['year_month', timeframe]).agg(trades=('usd_volume', 'size'), usd_volume=('usd_volume', 'sum')).reset_index()
+        sums['usd_percentage'] = sums['usd_volume'] / sums.groupby('year_month')['usd_volume'].transform('sum')
+        views[f'monthly_{"hourly" if timeframe == "hour" else "daily"}_sums'] = sums
+
+    return views
+
+
+def keyedFrame(df, keys):
+    df = df.astype({key: str for key in keys})
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('name', ['monthly_pairs_df', 'status_sums', 'client_sums', 'client_pairs_count', 'clients_combined_avg',
+                                  'monthly_hourly_sums', 'monthly_daily_sums'])
+def test_cube_views_match_direct_groupbys(dataset, name):
+    expected = directViews(dataset['updated_df'])[name]
+    view = cubeViews(dataset['cube'])[name][expected.columns]
+    keys = [column for column in expected.columns if not pd.api.types.is_float_dtype(expected[column])]
+
+    pd.testing.assert_frame_equal(keyedFrame(expected, keys), keyedFrame(view, keys), check_dtype=False, check_exact=False, rtol=1e-9)
+
+
+def test_client_rows_match_a_filter(dataset):
+    views = cubeViews(dataset['cube'])
+    client_sums = views['client_sums']
+
+    for user_id in client_sums['user_id'].drop_duplicates().iloc[:25]:
+        pd.testing.assert_frame_equal(clientRows(views['client_sums_index'], user_id), client_sums[client_sums['user_id'] == user_id])
+    assert clientRows(views['client_sums_index'], 'no-such-client').empty
@@ -0,0 +1,110 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+
+from dataPipeline import loadDataset
+from streamingIngest import streamLedger
+from duckdbPipeline import loadDatasetDuckdb
+import incrementalIngest
+from incrementalIngest import refreshIncremental
+
+COMPARED = ['users_combined', 'updated_df', 'final_df', 'monthly_pairs_df', 'status_sums', 'client_sums', 'clients_combined_avg',
+            'client_pairs_count', 'monthly_hourly_sums', 'monthly_daily_sums']
+
+
+def sortedFrame(df):
+    df = df.reset_index(drop=not isinstance(df.index, pd.MultiIndex) and df.index.name is None)
+    df = df.astype({column: str for column in df.columns if not pd.api.types.is_numeric_dtype(df[column])})
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def cohortFrame(cohorts):
+    return pd.DataFrame(cohorts.codes, index=cohorts.users.astype(str), columns=[str(month) for month in cohorts.months]).sort_index()
+
+
+def assertSameDataset(expected, dataset, keys=COMPARED):
+    for key in keys:
+        pd.testing.assert_frame_equal(sortedFrame(expected[key]), sortedFrame(dataset[key][expected[key].columns]), check_dtype=False,
+                                      obj=key)
+    pd.testing.assert_frame_equal(cohortFrame(expected['cohorts']), cohortFrame(dataset['cohorts']), check_dtype=False)
+    assert expected['pricing_report'] == dataset['pricing_report']
+
+
+@pytest.mark.parametrize('chunksize', [500, 100000])
+def test_chunked_ingest_matches_in_memory_pipeline(dataFiles, chunksize):
+    expected = loadDataset(*dataFiles, pricing='hourly')
+    assertSameDataset(expected, streamLedger(*dataFiles, chunksize=chunksize, pricing='hourly'))
+
+
+def test_chunked_ingest_drops_duplicates_across_chunks(dataFiles):
+    with_duplicates = streamLedger(*dataFiles, chunksize=500, pricing='hourly')
+
+    folder = os.path.dirname(dataFiles[1])
+    pd.read_csv(dataFiles[1]).iloc[:-40].to_csv(os.path.join(folder, 'unique_ledger.csv'), index=False)
+    without = streamLedger(dataFiles[0], os.path.join(folder, 'unique_ledger.csv'), *dataFiles[2:], chunksize=500, pricing='hourly')
+
+    assertSameDataset(without, with_duplicates)
+
+
+@pytest.mark.parametrize('pricing', ['hourly', 'nearest', 'interpolate'])
+def test_duckdb_backend_matches_in_memory_pipeline(dataFiles, tmp_path, pricing):
+    pytest.importorskip('duckdb')
+
+    #### a quote in the folder name has to be escaped in the queries
+    folder = tmp_path / "o'connor"
+    folder.mkdir()
+    paths = [shutil.copy(path, folder) for path in dataFiles]
+
+    expected = loadDataset(*dataFiles, pricing=pricing)
+    dataset = loadDatasetDuckdb(*paths, pricing=pricing)
+
+    #### same rows in the same order with the same dtypes (user_id categories included)
+    for key in COMPARED + ['cube']:
+        pd.testing.assert_frame_equal(expected[key], dataset[key], check_exact=False, rtol=1e-9, obj=key)
+    for expected_ids, ids in zip(expected['id_dictionaries'], dataset['id_dictionaries']):
+        pd.testing.assert_index_equal(expected_ids, ids)
+    pd.testing.assert_frame_equal(cohortFrame(expected['cohorts']), cohortFrame(dataset['cohorts']))
+    assert expected['pricing_report'] == dataset['pricing_report']
+
+
+def appendInSteps(source, paths, cuts, cold=False, **kwargs):
+    lines = open(source, 'rb').read().splitlines(keepends=True)
+    open(paths[1], 'wb').close()
+
+    for start, stop in zip(cuts, cuts[1:]):
+        with open(paths[1], 'ab') as f:
+            f.write(b''.join(lines[start:stop]))
+        if cold:
+            incrementalIngest._STATES.clear()
+        dataset, summary = refreshIncremental(*paths, pricing='hourly', **kwargs)
+
+    return dataset, summary
+
+
+@pytest.mark.parametrize('cold', [False, True])
+def test_incremental_appends_match_full_run(dataFiles, tmp_path, cold):
+    paths = [shutil.copy(path, tmp_path) for path in dataFiles]
+    rows = len(pd.read_csv(dataFiles[1])) + 1
+
+    #### the last refresh only has the 40 repeated rows, which were processed by the first one
+    dataset, summary = appendInSteps(dataFiles[1], paths, [0, rows // 2, rows - 40, rows], cold, chunksize=500)
+
+    assert (summary['new_rows'], summary['full_refresh']) == (40, False)
+    assertSameDataset(loadDataset(*dataFiles, pricing='hourly'), dataset, COMPARED + ['cube'])
+
+
+def test_incremental_refresh_only_writes_the_months_it_touches(dataFiles, tmp_path):
+    paths = [shutil.copy(path, tmp_path) for path in dataFiles]
+    ledger = pd.read_csv(dataFiles[1]).drop_duplicates()
+    ledger.sort_values('timestamp_at', kind='stable').to_csv(tmp_path / 'sorted.csv', index=False)
+    march = (ledger['timestamp_at'] >= '2020-03').sum()
+
+    #### January and February, then March
+    cuts = [0, len(ledger) - march + 1, len(ledger) + 1]
+    dataset, summary = appendInSteps(tmp_path / 'sorted.csv', paths, cuts)
+
+    partitions = incrementalIngest.loadState(paths[1])['meta']['partitions']
+    assert all(partitions[table]['2020-01'] == 1 for table in incrementalIngest.STATE_TABLES)
+    assert summary['relabelled'] == ['2020-03']
+    assertSameDataset(loadDataset(*paths[:1], str(tmp_path / 'sorted.csv'), *paths[2:], pricing='hourly'), dataset, COMPARED + ['cube'])
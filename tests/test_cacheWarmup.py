@@ -0,0 +1,78 @@
+import time
+import pytest
+
+import cacheWarmup
+from cacheWarmup import startWarmup, warmupStatus, retryWarmup
+from instrumentation import enableInstrumentation, disableInstrumentation, instrumented
+
+
+@pytest.fixture(autouse=True)
+def idleWarmup():
+    cacheWarmup._WARMUP.update(job=None, key=None, thread=None, state='idle', step=None, done=0, steps=1, started=None, finished=None,
+                               error=None, records=[])
+    yield
+    thread = cacheWarmup._WARMUP['thread']
+    if thread is not None:
+        thread.join(5)
+
+
+def waitFor(condition, timeout=5):
+    started = time.time()
+    while not condition() and time.time() - started < timeout:
+        time.sleep(0.01)
+    return condition()
+
+
+@instrumented()
+def loadTestDataset():
+    return {'rows': 1}
+
+
+def test_missing_file_is_reported_as_failed(tmp_path):
+    path = tmp_path / 'ledger_entries.csv'
+
+    status = startWarmup([str(path)], loadTestDataset)
+    assert (status['state'], status['ready']) == ('failed', False)
+    assert 'FileNotFoundError' in status['error']
+    assert warmupStatus()['state'] == 'failed'
+
+    #### once the file is there, the warm-up runs
+    path.write_text('a\n')
+    retryWarmup()
+    assert waitFor(lambda: warmupStatus()['ready'])
+
+
+def test_failed_warmup_waits_for_retry(tmp_path):
+    path = tmp_path / 'rates.csv'
+    path.write_text('a\n')
+    calls = []
+
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ValueError('broken file')
+        return {}
+
+    startWarmup([str(path)], load)
+    assert waitFor(lambda: warmupStatus()['state'] == 'failed')
+    assert 'ValueError: broken file' in warmupStatus()['error']
+
+    startWarmup([str(path)], load)
+    assert len(calls) == 1
+
+    retryWarmup()
+    assert waitFor(lambda: warmupStatus()['ready']) and len(calls) == 2
+
+
+def test_warmup_stages_are_published(tmp_path):
+    path = tmp_path / 'trades.csv'
+    path.write_text('a\n')
+
+    enableInstrumentation(memory=False)
+    try:
+        startWarmup([str(path)], loadTestDataset, [('views', lambda dataset: None)])
+        assert waitFor(lambda: warmupStatus()['ready'])
+    finally:
+        disableInstrumentation()
+
+    assert [record['stage'] for record in warmupStatus()['records']] == ['loadTestDataset']
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohortEngine import buildCohorts, updateCohorts, cohortStatus, NEW, RETURNING, CHURNED, REACTIVATED
+
+
+def randomActivity(rng, rows):
+    return pd.DataFrame({
+        'user_id': [f'user{number:02d}' for number in rng.integers(0, 25, rows)],
+        'year_month': pd.PeriodIndex([f'2020-{month:02d}' for month in rng.integers(1, 9, rows)], freq='M'),
+    })
+
+
+def test_status_rules():
+    activity = pd.DataFrame({'user_id': ['a', 'a', 'a', 'b', 'b'], 'year_month': ['2020-01', '2020-02', '2020-04', '2020-02', '2020-03']})
+    cohorts = buildCohorts(activity)
+
+    assert cohorts.codes.tolist() == [[RETURNING, RETURNING, CHURNED, REACTIVATED], [0, NEW, RETURNING, CHURNED]]
+    assert list(cohortStatus(cohorts, activity)) == ['Returning', 'Returning', 'Reactivated', 'New', 'Returning']
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_update_matches_a_full_build(seed):
+    rng = np.random.default_rng(seed)
+    activity = randomActivity(rng, 60)
+    if seed % 2:
+        activity = activity.sort_values('year_month', kind='stable')
+
+    old, _ = updateCohorts(None, activity.iloc[:30])
+    cohorts, changed = updateCohorts(old, activity.iloc[30:])
+    full = buildCohorts(activity)
+
+    pd.testing.assert_index_equal(cohorts.users, full.users)
+    pd.testing.assert_index_equal(cohorts.months, full.months)
+    assert (cohorts.active == full.active).all() and (cohorts.codes == full.codes).all()
+
+    #### the changed months are exactly the ones whose codes differ from the old cohorts
+    before = pd.DataFrame(old.codes, index=old.users, columns=old.months).reindex(index=full.users, columns=full.months, fill_value=0)
+    assert list(changed) == list(full.months[(before.to_numpy() != full.codes).any(axis=0)])
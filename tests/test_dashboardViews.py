@@ -0,0 +1,21 @@
+from dashboardViews import clientViews, defaultViewTasks
+from clientSearch import searchClients
+
+
+def test_client_views_for_a_known_client(dataset):
+    client_id = searchClients(dataset['client_search'], limit=1)[0][0]
+    views = clientViews(dataset, client_id)
+
+    assert len(views['client']) and views['stats'] is not None
+
+
+def test_client_without_rows_has_no_stats(dataset):
+    views = clientViews(dataset, 'no-such-client')
+
+    assert views['stats'] is None and views['client'].empty and views['customer'].empty
+    assert clientViews(dataset, None)['stats'] is None
+
+
+def test_default_view_tasks_run(dataset):
+    for _, task in defaultViewTasks():
+        task(dataset)
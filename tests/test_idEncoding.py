@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from idEncoding import ID_COLUMNS, buildDictionaries, encodeTable, decodeTable
+
+
+@pytest.fixture(scope='module')
+def dataFrames(dataFiles):
+    accounts, ledger, trades, _ = [pd.read_csv(path) for path in dataFiles]
+    return {'accounts': accounts, 'ledger': ledger, 'trades': trades}
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+@pytest.mark.parametrize('table', ['accounts', 'ledger', 'trades'])
+def test_ids_round_trip(dataFrames, table, categorical):
+    frames = {name: df.astype({column: 'category' for column in ID_COLUMNS[name]}) if categorical else df for name, df in dataFrames.items()}
+    dictionaries = buildDictionaries(frames['accounts'], frames['trades'])
+
+    df = frames[table]
+    encoded = encodeTable(df, table, dictionaries)
+    decoded = decodeTable(encoded, dictionaries, ID_COLUMNS[table])
+
+    for column in ID_COLUMNS[table]:
+        assert pd.api.types.is_integer_dtype(encoded[column])
+        assert decoded[column].astype(object).tolist() == df[column].astype(object).tolist()
+
+
+def test_codes_are_the_same_for_strings_and_categoricals(dataFrames):
+    accounts, trades = dataFrames['accounts'], dataFrames['trades']
+    dictionaries = buildDictionaries(accounts, trades)
+    categorical = buildDictionaries(accounts.astype({'id': 'category', 'user_id': 'category'}), trades)
+
+    for ids, categorical_ids in zip(dictionaries, categorical):
+        assert set(ids) == set(categorical_ids)
+
+    ledger = dataFrames['ledger']
+    pd.testing.assert_series_equal(encodeTable(ledger, 'ledger', dictionaries)['account_id'],
+                                   encodeTable(ledger.astype({'account_id': 'category'}), 'ledger', dictionaries)['account_id'])
+
+
+def test_unknown_ids_are_missing(dataFrames):
+    dictionaries = buildDictionaries(dataFrames['accounts'], dataFrames['trades'])
+    ledger = pd.DataFrame({'account_id': [dictionaries.accounts[0], 'not-an-account', None]})
+
+    for df in [ledger, ledger.astype('category')]:
+        encoded = encodeTable(df, 'ledger', dictionaries)
+        assert encoded['account_id'].isna().tolist() == [False, True, True]
+        assert decodeTable(encoded, dictionaries, {'account_id': 'accounts'})['account_id'].isna().tolist() == [False, True, True]
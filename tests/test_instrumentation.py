@@ -0,0 +1,92 @@
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+
+from instrumentation import enableInstrumentation, disableInstrumentation, startRun, finishRun, recordedRun, stage, instrumented
+
+
+@pytest.fixture
+def recording():
+    enableInstrumentation(memory=True)
+    startRun('test')
+    yield
+    finishRun()
+    disableInstrumentation()
+
+
+@instrumented()
+def doubleRows(df):
+    return pd.concat([df, df])
+
+
+@instrumented('outer_stage')
+def outerStage(df, megabytes, hold=0):
+    with stage('allocate') as frame:
+        block = np.ones(megabytes * 2 ** 20 // 8)
+        frame['rows_out'] = len(block)
+        time.sleep(hold)
+        del block
+    return doubleRows(df)
+
+
+def test_nested_records(recording):
+    df = pd.DataFrame({'a': range(10)})
+    outerStage(df, 8)
+    records = {record['stage']: record for record in finishRun()}
+
+    assert [records[name]['depth'] for name in ['outer_stage', 'allocate', 'doubleRows']] == [0, 1, 1]
+    assert (records['outer_stage']['rows_in'], records['outer_stage']['rows_out']) == (10, 20)
+    assert (records['doubleRows']['rows_in'], records['doubleRows']['rows_out']) == (10, 20)
+    assert records['allocate']['rows_out'] == 2 ** 20
+
+
+def test_nested_peak_is_passed_up(recording):
+    outerStage(pd.DataFrame({'a': range(10)}), 16)
+    records = {record['stage']: record for record in finishRun()}
+
+    #### the 16MB block is freed before the outer stage ends, so the outer peak can only come from the nested stage
+    assert records['allocate']['peak_mb'] >= 15.9
+    assert records['outer_stage']['peak_mb'] >= records['allocate']['peak_mb']
+    assert records['doubleRows']['peak_mb'] < 1
+
+
+def test_concurrent_threads_keep_their_own_peaks(recording):
+    peaks = {}
+
+    def session(megabytes):
+        startRun()
+        for _ in range(3):
+            outerStage(pd.DataFrame({'a': range(10)}), megabytes, hold=0.05)
+        peaks[megabytes] = [record['peak_mb'] for record in finishRun() if record['stage'] == 'allocate']
+
+    threads = [threading.Thread(target=session, args=(megabytes,)) for megabytes in [4, 32]]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    assert all(3.9 <= peak < 8 for peak in peaks[4])
+    assert all(31.9 <= peak < 36 for peak in peaks[32])
+
+
+def test_recorded_run_only_opens_when_no_run_is_open(tmp_path):
+    log_path = tmp_path / 'stages.jsonl'
+    enableInstrumentation(str(log_path), memory=False)
+    try:
+        #### a section rerunning on its own - its own run, logged under its label
+        with recordedRun('section') as run:
+            doubleRows(pd.DataFrame({'a': range(3)}))
+        assert [record['stage'] for record in run['records']] == ['doubleRows']
+
+        #### a section drawn inside a full rerun - recorded into the full rerun
+        startRun('script')
+        with recordedRun('section') as nested:
+            doubleRows(pd.DataFrame({'a': range(3)}))
+        assert nested is None
+        assert [record['stage'] for record in finishRun()] == ['doubleRows']
+    finally:
+        disableInstrumentation()
+
+    labels = [json.loads(line)['label'] for line in log_path.read_text().splitlines()]
+    assert labels == ['section', 'script']
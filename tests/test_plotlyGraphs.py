@@ -0,0 +1,15 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+from plotlyGraphs import tradeDistPerMonth
+
+
+def test_percent_histogram_of_zero_volume_has_no_nans():
+    df = pd.DataFrame({'day': [1, 2, 2], 'usd_volume': [0.0, 0.0, 0.0]})
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        figure = tradeDistPerMonth(df, 'Percent', 'day', 'blue', 'zero volume', weights='usd_volume')
+
+    assert not np.isnan(np.asarray(figure.data[0].y, dtype=float)).any()
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sharedDataset import sessionView
+
+
+def test_session_writes_do_not_reach_the_shared_dataset():
+    shared = {'df': pd.DataFrame({'usd_volume': [1.0, 2.0, 3.0]}), 'codes': np.arange(3)}
+    view = sessionView(shared)
+
+    df = view['df']
+    df.loc[df['usd_volume'] > 1, 'usd_volume'] = 0.0
+    df['usd_volume'] *= 10
+
+    assert shared['df']['usd_volume'].tolist() == [1.0, 2.0, 3.0]
+    with pytest.raises(ValueError):
+        view['codes'][0] = 5
+    with pytest.raises(TypeError):
+        view['df'] = None